@@ -107,7 +107,7 @@ if [ "$1" == "deb" ]; then
 fi
 
 
-cheetah-compile -R ${P}/usr/lib/enigma2/python/Plugins/Extensions/OpenWebif/
+python ${D}/plugin/controllers/viewcompiler.py ${P}/usr/lib/enigma2/python/Plugins/Extensions/OpenWebif/controllers/views || exit 1
 python -O -m compileall ${P}/usr/lib/enigma2/python/Plugins/Extensions/OpenWebif/
 
 if [ "$1" != "deb" ]; then
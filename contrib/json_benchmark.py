@@ -0,0 +1,149 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Compare the JSON backends supported by `controllers/serializer.py` on
+payloads shaped like the `/api/getallservices` and `/api/epgbouquet`
+responses of a big setup.
+
+Run it on the box itself to see what serialization costs there::
+
+	python json_benchmark.py --bouquets 40 --services 60 --events 30
+"""
+from __future__ import print_function
+import time
+import random
+import argparse
+
+#: backends in the order used by the serializer
+BACKENDS = ("orjson", "ujson", "rapidjson", "simplejson", "json")
+
+SAMPLE_NAMES = [
+	u"Das Erste HD", u"ZDF HD", u"RTL Television", u"SAT.1", u"ProSieben",
+	u"arte HD", u"3sat", u"Phoenix", u"BBC One", u"France 2", u"Canal+ Sport",
+	u"ORF1 HD", u"SRF zwei", u"Ελληνική Τηλεόραση", u"Россия 1", u"Kanał Sportowy"
+]
+
+SAMPLE_TEXT = (
+	u"Die Reportage begleitet Menschen, die ihren Alltag neu erfinden müssen. "
+	u"Zwischen Großstadt und Land, zwischen Tradition und Aufbruch – "
+	u"ein Film über Mut, Zweifel und die Frage, was am Ende wirklich zählt. "
+)
+
+
+def sref(i):
+	return "1:0:19:%X:%X:1:C00000:0:0:0:" % (1000 + i, 1 + i % 30)
+
+
+def allServicesPayload(bouquets, services):
+	rnd = random.Random(1)
+	result = []
+	pos = 0
+	for b in range(bouquets):
+		subservices = []
+		for s in range(services):
+			pos += 1
+			subservices.append({
+				"servicereference": sref(pos),
+				"servicename": rnd.choice(SAMPLE_NAMES),
+				"pos": pos,
+				"program": 1000 + pos,
+				"picon": "/picon/%s.png" % sref(pos)[:-1].replace(":", "_")
+			})
+		result.append({
+			"servicereference": '1:7:1:0:0:0:0:0:0:0:FROM BOUQUET "userbouquet.%d.tv" ORDER BY bouquet' % b,
+			"servicename": u"Bouquet %d" % b,
+			"subservices": subservices
+		})
+	return {"result": True, "processingtime": "0:00:01.234567", "services": result}
+
+
+def epgBouquetPayload(services, events):
+	rnd = random.Random(2)
+	now = int(time.time())
+	ret = []
+	for s in range(services):
+		begin = now - 1800
+		for e in range(events):
+			duration = rnd.choice((900, 1800, 2700, 3600, 5400))
+			ret.append({
+				"id": 10000 + s * events + e,
+				"begin_timestamp": begin,
+				"duration_sec": duration,
+				"title": rnd.choice(SAMPLE_NAMES) + u" – Folge %d" % e,
+				"shortdesc": SAMPLE_TEXT[:rnd.randint(20, 120)],
+				"longdesc": SAMPLE_TEXT * rnd.randint(1, 6),
+				"sref": sref(s),
+				"sname": rnd.choice(SAMPLE_NAMES),
+				"now_timestamp": now,
+				"genre": u"Dokumentation",
+				"genreid": 0x23
+			})
+			begin += duration
+	return {"events": ret, "result": True}
+
+
+def loadEncoders():
+	encoders = []
+	for name in BACKENDS:
+		try:
+			if name == "orjson":
+				import orjson
+				encoders.append((name, lambda d, m=orjson: m.dumps(d, option=m.OPT_NON_STR_KEYS)))
+			elif name == "ujson":
+				import ujson
+				encoders.append((name, lambda d, m=ujson: m.dumps(d, escape_forward_slashes=False)))
+			elif name == "rapidjson":
+				import rapidjson
+				encoders.append((name, lambda d, m=rapidjson: m.dumps(d)))
+			elif name == "simplejson":
+				import simplejson
+				encoders.append((name, lambda d, m=simplejson: m.dumps(d, separators=(",", ":"))))
+				encoders.append((name + " (indent=1)", lambda d, m=simplejson: m.dumps(d, indent=1)))
+			else:
+				import json
+				encoders.append((name, lambda d, m=json: m.dumps(d, separators=(",", ":"))))
+				encoders.append((name + " (indent=1)", lambda d, m=json: m.dumps(d, indent=1)))
+		except ImportError:
+			print("%-20s not installed" % name)
+	return encoders
+
+
+def bench(fnc, data, rounds):
+	timings = []
+	size = 0
+	for i in range(rounds):
+		start = time.time()
+		out = fnc(data)
+		timings.append(time.time() - start)
+		size = len(out)
+	timings.sort()
+	return timings[len(timings) // 2], size
+
+
+def main():
+	parser = argparse.ArgumentParser(description="OpenWebif JSON backend benchmark")
+	parser.add_argument("--bouquets", type=int, default=40, help="number of bouquets for getallservices")
+	parser.add_argument("--services", type=int, default=60, help="services per bouquet / services in epgbouquet")
+	parser.add_argument("--events", type=int, default=30, help="events per service for epgbouquet")
+	parser.add_argument("--rounds", type=int, default=7, help="rounds per backend, the median is reported")
+	args = parser.parse_args()
+
+	payloads = [
+		("getallservices", allServicesPayload(args.bouquets, args.services)),
+		("epgbouquet", epgBouquetPayload(args.services, args.events))
+	]
+	encoders = loadEncoders()
+	for label, data in payloads:
+		print("\n%s" % label)
+		print("%-20s %10s %12s" % ("backend", "ms", "bytes"))
+		for name, fnc in encoders:
+			try:
+				took, size = bench(fnc, data, args.rounds)
+			except Exception as e:
+				print("%-20s failed: %s" % (name, e))
+				continue
+			print("%-20s %10.1f %12d" % (name, took * 1000, size))
+
+
+if __name__ == "__main__":
+	main()
@@ -20,6 +20,7 @@ from ServiceReference import ServiceReference
 from Components.ParentalControl import parentalControl
 from re import compile as re_compile
 from Components.NimManager import nimmanager
+from Plugins.Extensions.OpenWebif.controllers.dataversion import dataVersions
 
 
 class BouquetEditor(Source):
@@ -85,6 +86,7 @@ class BouquetEditor(Source):
 			self.result = self.importBouquet(cmd)
 		else:
 			self.result = (False, _("one two three four unknown command"))
+		dataVersions.bump("bouquets")
 
 	def addToBouquet(self, param):
 		print("[WebComponents.BouquetEditor] addToBouquet with param = ", param)
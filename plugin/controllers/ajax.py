@@ -48,6 +48,13 @@ class AjaxController(BaseController):
 	Ajax Web Controller
 	"""
 
+	FRAGMENT_VERSIONS = {
+		"bouquets": ("bouquets", ),
+		"channels": ("epg", "bouquets"),
+		"multiepg": ("epg", "bouquets", "timers"),
+		"timers": ("timers", ),
+	}
+
 	def __init__(self, session, path=""):
 		BaseController.__init__(self, path=path, session=session)
 
@@ -22,32 +22,30 @@
 
 from __future__ import print_function
 import os
-import json
+import time
+import inspect
 import six
-# Python 3.12+ compatibility: imp module removed, use importlib
-try:
-	import importlib.util
-	import importlib.machinery
-	HAS_IMPORTLIB = True
-except ImportError:
-	HAS_IMPORTLIB = False
-	import imp  # Fallback for older Python versions
-
 from twisted.web import server, http, resource
 from twisted.web.resource import EncodingResourceWrapper
 from twisted.web.server import GzipEncoderFactory
 from twisted.internet import defer
+from twisted.internet.interfaces import IPullProducer
 from twisted.protocols.basic import FileSender
 
 from Plugins.Extensions.OpenWebif.controllers.i18n import _
-from Tools.Directories import fileExists
-from Cheetah.Template import Template
-from enigma import eEPGCache
 from Components.config import config
 
 from Plugins.Extensions.OpenWebif.controllers.models.info import getInfo
+from Plugins.Extensions.OpenWebif.controllers.templatecache import templateCache
+from Plugins.Extensions.OpenWebif.controllers.maincontext import mainContext, oscamconfPath
+from Plugins.Extensions.OpenWebif.controllers.serializer import writeJSON, getIndent, encode
+from Plugins.Extensions.OpenWebif.controllers.dataversion import dataVersions
+from Plugins.Extensions.OpenWebif.controllers.fragmentcache import fragmentCache, getContext as getFragmentContext
+from Plugins.Extensions.OpenWebif.controllers.metrics import metrics, addTiming
+from Plugins.Extensions.OpenWebif.controllers.profiler import requestProfiler
+from Plugins.Extensions.OpenWebif.controllers.watchdog import stallWatchdog
 from Plugins.Extensions.OpenWebif.controllers.models.config import getCollapsedMenus, getConfigsSections, getShowName, getCustomName, getBoxName
-from Plugins.Extensions.OpenWebif.controllers.defaults import getPublicPath, getViewsPath, EXT_EVENT_INFO_SOURCE, STB_LANG, getIP, HASAUTOTIMER, TEXTINPUTSUPPORT, _isPluginInstalled
+from Plugins.Extensions.OpenWebif.controllers.defaults import getPublicPath, EXT_EVENT_INFO_SOURCE, STB_LANG, TEXTINPUTSUPPORT
 
 
 def new_getRequestHostname(self):
@@ -67,6 +65,9 @@ http.Request.getRequestHostname = new_getRequestHostname
 
 REMOTE = ''
 
+# coroutines (async def handlers) are not available on python 2
+iscoroutine = getattr(inspect, "iscoroutine", lambda obj: False)
+
 try:
 	from boxbranding import getBoxType, getMachineName
 except:  # nosec # noqa: E722
@@ -80,12 +81,46 @@ except:  # nosec # noqa: E722
 	REMOTE = rc_model().getRcFolder()
 
 
+class RequestContext(object):
+	"""
+	Output flags of a single request.
+
+	A snapshot of the controller's flags taken when the request handler
+	returns, so a handler returning a Deferred or coroutine is rendered
+	correctly even if the controller handles other requests meanwhile.
+	"""
+	__slots__ = ("path", "isJson", "isCustom", "isImage", "isMobile", "withMainTemplate", "suppresslog", "disconnected", "fragmentKey")
+
+	def __init__(self, controller):
+		self.path = controller.path
+		self.isJson = controller.isJson
+		self.isCustom = controller.isCustom
+		self.isImage = controller.isImage
+		self.isMobile = controller.isMobile
+		self.withMainTemplate = controller.withMainTemplate
+		self.suppresslog = getattr(controller, "suppresslog", False)
+		self.disconnected = False
+		self.fragmentKey = None
+
+	def connectionLost(self, failure):
+		self.disconnected = True
+
+
 class BaseController(resource.Resource):
 	"""
 	Web Base Controller
 	"""
 	isLeaf = False
 
+	#: page name -> data versions (see controllers.dataversion) the response
+	#: exclusively depends on; such pages are answered with an ETag
+	ETAG_VERSIONS = {}
+
+	#: page name -> data versions the rendered template exclusively depends
+	#: on besides arguments and settings; such pages are answered from the
+	#: fragment cache (see controllers.fragmentcache) and with an ETag
+	FRAGMENT_VERSIONS = {}
+
 	def __init__(self, path="", **kwargs):
 		"""
 
@@ -124,34 +159,41 @@ class BaseController(resource.Resource):
 		request.write(b"<html><head><title>OpenWebif</title></head><body><h1>Error 404: Not found</h1><br>The requested page doesn't exist.</body></html>")
 		request.finish()
 
+	def isNotModified(self, request, context=None):
+		"""
+		Set the ETag and caching headers for pages listed in
+		:py:attr:`ETAG_VERSIONS` or :py:attr:`FRAGMENT_VERSIONS`.
+
+		Args:
+			request (twisted.web.server.Request): HTTP request object
+			context: settings state of a fragment page, see
+				:py:func:`fragmentcache.getContext`
+		Returns:
+			True if the client's copy is still valid (HTTP 304 has been set)
+		"""
+		versions = self.ETAG_VERSIONS.get(self.path)
+		extra = None
+		if not versions and self.path in self.FRAGMENT_VERSIONS:
+			versions = self.FRAGMENT_VERSIONS[self.path]
+			extra = context
+		if not versions or request.method not in (b"GET", b"HEAD"):
+			return False
+		request.setHeader("cache-control", "private, no-cache")
+		return request.setETag(dataVersions.getETag(request, versions, extra)) == http.CACHED
+
+	def getFragmentKey(self, request, context=None):
+		"""
+		Returns:
+			fragment cache key of *request* or None if the page is not
+			cached
+		"""
+		versions = self.FRAGMENT_VERSIONS.get(self.path)
+		if versions is None or request.method not in (b"GET", b"HEAD"):
+			return None
+		return fragmentCache.getKey(request, self.path, versions, context)
+
 	def loadTemplate(self, path, module, args):
-		if fileExists(getViewsPath(path + ".py")) or fileExists(getViewsPath(path + ".pyo")) or fileExists(getViewsPath(path + ".pyc")):
-			# Python 3.12+ compatibility
-			if HAS_IMPORTLIB:
-				# Use importlib for Python 3.12+
-				if fileExists(getViewsPath(path + ".pyo")):
-					spec = importlib.util.spec_from_file_location(module, getViewsPath(path + ".pyo"))
-				elif fileExists(getViewsPath(path + ".pyc")):
-					spec = importlib.util.spec_from_file_location(module, getViewsPath(path + ".pyc"))
-				else:
-					spec = importlib.util.spec_from_file_location(module, getViewsPath(path + ".py"))
-				template = importlib.util.module_from_spec(spec)
-				spec.loader.exec_module(template)
-			else:
-				# Use imp for older Python versions
-				if fileExists(getViewsPath(path + ".pyo")):
-					template = imp.load_compiled(module, getViewsPath(path + ".pyo"))
-				elif fileExists(getViewsPath(path + ".pyc")):
-					template = imp.load_compiled(module, getViewsPath(path + ".pyc"))
-				else:
-					template = imp.load_source(module, getViewsPath(path + ".py"))
-			mod = getattr(template, module, None)
-			if callable(mod):
-				return str(mod(searchList=args))
-		elif fileExists(getViewsPath(path + ".tmpl")):
-			vp = str(getViewsPath(path + ".tmpl"))
-			return str(Template(file=vp, searchList=[args]))
-		return None
+		return templateCache.render(path, module, args)
 
 	def putChild2(self, path, child):
 		self.putChild(six.ensure_binary(path), child)
@@ -173,32 +215,25 @@ class BaseController(resource.Resource):
 		return {}
 
 	def render(self, request):
+		# the profiler (see /api/profile) only covers the synchronous part
+		handler = "P_" + (self.path.replace(".", "") or "index")
+		uri = six.ensure_str(request.uri)
+		# stalls of the main loop are attributed to the request being rendered
+		stallWatchdog.requestUri = uri
+		try:
+			return requestProfiler.run(handler, uri, self.renderPage, request)
+		finally:
+			stallWatchdog.requestUri = None
 
-		@defer.inlineCallbacks
-		def _showImage(data):
-
-			@defer.inlineCallbacks
-			def _setContentDispositionAndSend(file_path):
-				filename = os.path.basename(file_path)
-				request.setHeader('content-disposition', 'filename="%s"' % filename)
-				request.setHeader('content-type', "image/png")
-				f = None
-				try:
-					f = open(file_path, "rb")
-					yield FileSender().beginFileTransfer(f, request)
-				finally:
-					if f:
-						f.close()
-				defer.returnValue(0)
-
-			if os.path.exists(data):
-				yield _setContentDispositionAndSend(data)
-			else:
-				request.setResponseCode(http.NOT_FOUND)
-
-			request.finish()
-			defer.returnValue(0)
+	def renderPage(self, request):
+		"""
+		Call the P_* handler of *request* and write its result.
 
+		Handlers may return a Deferred or (python 3) a coroutine; their
+		result is written once it is available. A pull producer with a
+		`start()` method as result writes the response itself. Output flags like
+		`isJson` have to be set before the first `yield`/`await`.
+		"""
 		# cache data
 		withMainTemplate = self.withMainTemplate
 		path = self.path
@@ -230,59 +265,32 @@ class BaseController(resource.Resource):
 			if callable(plfunc):
 				plfunc(request)
 
-			data = func(request)
-			if data is None:
-				# if not self.suppresslog:
-					# print "[OpenWebif] page '%s' without content" % request.uri
-				self.error404(request)
-			elif self.isCustom:
-				# if not self.suppresslog:
-					# print "[OpenWebif] page '%s' ok (custom)" % request.uri
-				request.write(six.ensure_binary(data))
-				request.finish()
-			elif self.isImage:
-				_showImage(data)
-			elif self.isJson:
-				request.setHeader("content-type", "application/json; charset=utf-8")
-				try:
-					return six.ensure_binary(json.dumps(data, indent=1))
-				except Exception as exc:
-					request.setResponseCode(http.INTERNAL_SERVER_ERROR)
-					return six.ensure_binary(json.dumps({"result": False, "request": request.path, "exception": repr(exc)}))
-					pass
-			elif isinstance(data, str):
-				# if not self.suppresslog:
-					# print "[OpenWebif] page '%s' ok (simple string)" % request.uri
-				request.setHeader("content-type", "text/plain")
-				request.write(six.ensure_binary(data))
+			metrics.track(request, self.__class__.__name__, func.__name__)
+			# the settings are walked once for the ETag and the fragment key
+			context = getFragmentContext() if self.path in self.FRAGMENT_VERSIONS else None
+			if self.isNotModified(request, context):
 				request.finish()
 			else:
-				# print "[OpenWebif] page '%s' ok (cheetah template)" % request.uri
-				module = six.ensure_text(request.path)
-				if module[-1:] == "/":
-					module += "index"
-				elif module[-5:] != "index" and self.path == "index":
-					module += "/index"
-				module = module.strip("/")
-				module = module.replace(".", "")
-				out = self.loadTemplate(module, self.path, data)
-				if out is None:
-					print("[OpenWebif] ERROR! Template not found for page '%s'" % request.uri)
-					self.error404(request)
-				else:
-					if self.isMobile:
-						head = self.loadTemplate('mobile/head', 'head', [])
-						out = head + out
-					elif self.withMainTemplate:
-						args = self.prepareMainTemplate(request)
-						args["content"] = out
-						nout = self.loadTemplate("main", "main", args)
-						if nout:
-							out = nout
-					elif self.isGZ:
-						return out
-					request.write(six.ensure_binary(out))
+				fragmentKey = self.getFragmentKey(request, context)
+				out = fragmentKey and fragmentCache.get(fragmentKey)
+				if out:
+					# rendered before, skip handler and template
+					request.write(out)
 					request.finish()
+				else:
+					start = time.time()
+					data = func(request)
+					if iscoroutine(data):
+						data = defer.ensureDeferred(data)
+					# handlers set the output flags before they return or yield
+					ctx = RequestContext(self)
+					ctx.fragmentKey = fragmentKey
+					if isinstance(data, defer.Deferred):
+						request.notifyFinish().addErrback(ctx.connectionLost)
+						data.addCallback(self._handlerDone, request, ctx, start)
+						data.addErrback(self._handlerFailed, request, ctx)
+					else:
+						self._handlerDone(data, request, ctx, start)
 
 		else:
 			print("[OpenWebif] page '%s' not found" % request.uri)
@@ -297,38 +305,108 @@ class BaseController(resource.Resource):
 
 		return server.NOT_DONE_YET
 
+	def _handlerDone(self, data, request, ctx, start):
+		addTiming(request, "handler", time.time() - start)
+		if not ctx.disconnected:
+			self.writeResponse(request, ctx, data)
+
+	def _handlerFailed(self, failure, request, ctx):
+		print("[OpenWebif] ERROR! page '%s' failed: %s" % (request.uri, failure.getErrorMessage()))
+		if ctx.disconnected:
+			return
+		request.setResponseCode(http.INTERNAL_SERVER_ERROR)
+		if ctx.isJson:
+			request.setHeader("content-type", "application/json; charset=utf-8")
+			request.write(encode({"result": False, "request": six.ensure_str(request.path), "exception": failure.getErrorMessage()}))
+		else:
+			request.setHeader("content-type", "text/plain")
+			request.write(six.ensure_binary("Error: %s" % failure.getErrorMessage()))
+		request.finish()
+
+	def writeResponse(self, request, ctx, data):
+		"""
+		Write the result *data* of a request handler in the form selected by
+		the request context *ctx*.
+
+		Args:
+			request (twisted.web.server.Request): HTTP request object
+			ctx (RequestContext): output flags of the request
+			data: handler result
+		"""
+		if IPullProducer.providedBy(data):
+			# the handler streams the response, e.g. xmltv.StreamProducer
+			data.start()
+		elif data is None:
+			# if not ctx.suppresslog:
+				# print "[OpenWebif] page '%s' without content" % request.uri
+			self.error404(request)
+		elif ctx.isCustom:
+			# if not ctx.suppresslog:
+				# print "[OpenWebif] page '%s' ok (custom)" % request.uri
+			request.write(six.ensure_binary(data))
+			request.finish()
+		elif ctx.isImage:
+			self._sendImage(request, data)
+		elif ctx.isJson:
+			writeJSON(request, data, getIndent(request))
+		elif isinstance(data, str):
+			# if not ctx.suppresslog:
+				# print "[OpenWebif] page '%s' ok (simple string)" % request.uri
+			request.setHeader("content-type", "text/plain")
+			request.write(six.ensure_binary(data))
+			request.finish()
+		else:
+			# print "[OpenWebif] page '%s' ok (cheetah template)" % request.uri
+			module = six.ensure_text(request.path)
+			if module[-1:] == "/":
+				module += "index"
+			elif module[-5:] != "index" and ctx.path == "index":
+				module += "/index"
+			module = module.strip("/")
+			module = module.replace(".", "")
+			start = time.time()
+			out = self.loadTemplate(module, ctx.path, data)
+			if out is None:
+				print("[OpenWebif] ERROR! Template not found for page '%s'" % request.uri)
+				self.error404(request)
+			else:
+				if ctx.isMobile:
+					head = self.loadTemplate('mobile/head', 'head', [])
+					out = head + out
+				elif ctx.withMainTemplate:
+					args = self.prepareMainTemplate(request)
+					args["content"] = out
+					nout = self.loadTemplate("main", "main", args)
+					if nout:
+						out = nout
+				addTiming(request, "template", time.time() - start)
+				out = six.ensure_binary(out)
+				if ctx.fragmentKey is not None and request.code == http.OK:
+					fragmentCache.set(ctx.fragmentKey, out)
+				request.write(out)
+				request.finish()
+
+	@defer.inlineCallbacks
+	def _sendImage(self, request, data):
+		if os.path.exists(data):
+			filename = os.path.basename(data)
+			request.setHeader('content-disposition', 'filename="%s"' % filename)
+			request.setHeader('content-type', "image/png")
+			f = None
+			try:
+				f = open(data, "rb")
+				yield FileSender().beginFileTransfer(f, request)
+			finally:
+				if f:
+					f.close()
+		else:
+			request.setResponseCode(http.NOT_FOUND)
+
+		request.finish()
+		defer.returnValue(0)
+
 	def oscamconfPath(self):
-		# Find and parse running oscam
-		opath = None
-		owebif = False
-		oport = None
-		variant = "oscam"
-		for file in ["/tmp/.ncam/ncam.version", "/tmp/.oscam/oscam.version"]:
-			if fileExists(file):  # nosec
-				if "ncam" in file:
-					variant = "ncam"
-				else:
-					variant = "oscam"
-
-				conffile = file.split('/')[-1].replace("version", "conf")
-
-				data = open(file, "r").readlines()  # nosec
-				for i in data:
-					if "configdir:" in i.lower():
-						opath = i.split(":")[1].strip() + "/" + conffile
-						if not fileExists(opath):
-							opath = None
-					elif "web interface support:" in i.lower():
-						owebif = i.split(":")[1].strip()
-						if owebif == "yes":
-							owebif = True
-					elif "webifport:" in i.lower():
-						oport = i.split(":")[1].strip()
-						if oport == "0":
-							oport = None
-					else:
-						continue
-		return owebif, oport, opath, variant
+		return oscamconfPath()
 
 	def prepareMainTemplate(self, request):
 		# here will be generated the dictionary for the main template
@@ -337,108 +415,16 @@ class BaseController(resource.Resource):
 		ret['showname'] = getShowName()['showname']
 		ret['customname'] = getCustomName()['customname']
 		ret['boxname'] = getBoxName()['boxname']
+		info = getInfo()
 		if not ret['boxname'] or not ret['customname']:
-			ret['boxname'] = getInfo()['brand'] + " " + getInfo()['model']
+			ret['boxname'] = info['brand'] + " " + info['model']
 		ret['box'] = getBoxType()
 		ret["remote"] = REMOTE
 
-		# Check firewall status
-		ret['firewall_active'] = False
-		try:
-			import subprocess
-			result = subprocess.run("iptables -L INPUT -n | head -1", shell=True, capture_output=True, text=True, timeout=2)
-			if result.returncode == 0 and "policy DROP" in result.stdout:
-				ret['firewall_active'] = True
-		except:
-			pass
-		if hasattr(eEPGCache, 'FULL_DESCRIPTION_SEARCH'):
-			ret['epgsearchcaps'] = True
-		else:
-			ret['epgsearchcaps'] = False
-		extras = [{'key': 'ajax/settings', 'description': _("Settings")}]
-
-		ip = getIP()
-		if ip != None:
-			if _isPluginInstalled("LCD4linux", "WebSite"):
-				lcd4linux_key = "lcd4linux/config"
-				if _isPluginInstalled("WebInterface"):
-					try:
-						lcd4linux_port = "http://" + ip + ":" + str(config.plugins.Webinterface.http.port.value) + "/"
-						lcd4linux_key = lcd4linux_port + 'lcd4linux/config'
-					except:  # nosec # noqa: E722
-						lcd4linux_key = None
-				if lcd4linux_key:
-					extras.append({'key': lcd4linux_key, 'description': _("LCD4Linux Setup"), 'nw': '1'})
-
-		oscamwebif, port, oscamconf, variant = self.oscamconfPath()
-
-		# Assume http until we know better ...
-		proto = "http"
-
-		# config file exists
-		if oscamwebif and oscamconf is not None:
-			# oscam defaults to NOT to start the web interface unless a section for it exists, so reset port to None until we find one
-			port = None
-			data = open(oscamconf, "r").readlines()
-			for i in data:
-				if "httpport" in i.lower():
-					port = i.split("=")[1].strip()
-					if port[0] == '+':
-						proto = "https"
-						port = port[1:]
-
-		if oscamwebif and port is not None:
-			url = "%s://%s:%s" % (proto, request.getRequestHostname(), port)
-			if variant == "oscam":
-				extras.append({'key': url, 'description': _("OSCam Webinterface"), 'nw': '1'})
-			elif variant == "ncam":
-				extras.append({'key': url, 'description': _("NCam Webinterface"), 'nw': '1'})
-
-		if HASAUTOTIMER:
-			extras.append({'key': 'ajax/at', 'description': _('AutoTimers')})
-
-		extras.append({'key': 'ajax/bqe', 'description': _('BouquetEditor')})
-
-		try:
-			from Plugins.Extensions.EPGRefresh.EPGRefresh import epgrefresh  # noqa: F401
-			extras.append({'key': 'ajax/epgr', 'description': _('EPGRefresh')})
-		except ImportError:
-			pass
-
-		try:
-			# this will currenly only works if NO Webiterface plugin installed
-			# TODO: test if webinterface AND openwebif installed
-
-			# 'nw'='1' -> target _blank
-			# 'nw'='2' -> target popup
-			# 'nw'=None -> target _self
-
-			# syntax
-			# addExternalChild( (Link, Resource, Name, Version, HasGUI, WebTarget) )
-			# example addExternalChild( ("webadmin", root, "WebAdmin", 1, True, "_self") )
-
-			from Plugins.Extensions.WebInterface.WebChilds.Toplevel import loaded_plugins
-			for plugins in loaded_plugins:
-				if plugins[0] in ["fancontrol", "iptvplayer"]:
-					try:
-						extras.append({'key': plugins[0], 'description': plugins[2], 'nw': '2'})
-					except KeyError:
-						pass
-				elif len(plugins) > 4:
-					if plugins[4] == True:
-						try:
-							if len(plugins) > 5 and plugins[5] == "_self":
-								extras.append({'key': plugins[0], 'description': plugins[2]})
-							else:
-								extras.append({'key': plugins[0], 'description': plugins[2], 'nw': '1'})
-						except KeyError:
-							pass
-
-		except ImportError:
-			pass
-
-		if os.path.exists('/usr/bin/shellinaboxd'):
-			extras.append({'key': 'ajax/terminal', 'description': _('Terminal')})
+		mainContext.start()
+		ret['firewall_active'] = mainContext.getFirewallActive()
+		ret['epgsearchcaps'] = mainContext.getEPGSearchCaps()
+		extras = mainContext.getExtras(request)
 
 		ret['extras'] = extras
 		theme = 'original'
@@ -451,10 +437,11 @@ class BaseController(resource.Resource):
 				config.OpenWebif.webcache.theme.save()
 		ret['theme'] = theme
 		moviedb = config.OpenWebif.webcache.moviedb.value if config.OpenWebif.webcache.moviedb.value else EXT_EVENT_INFO_SOURCE
-		config.OpenWebif.webcache.moviedb.value = moviedb
-		config.OpenWebif.webcache.moviedb.save()
+		if config.OpenWebif.webcache.moviedb.value != moviedb:
+			config.OpenWebif.webcache.moviedb.value = moviedb
+			config.OpenWebif.webcache.moviedb.save()
 		ret['moviedb'] = moviedb
-		imagedistro = getInfo()['imagedistro']
+		imagedistro = info['imagedistro']
 		ret['vti'] = "1" if imagedistro in ("VTi-Team Image") else "0"
 		ret['webtv'] = os.path.exists(getPublicPath('webtv'))
 		ret['stbLang'] = STB_LANG
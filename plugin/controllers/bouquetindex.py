@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+##########################################################################
+# OpenWebif: BouquetIndex
+##########################################################################
+# Copyright (C) 2011 - 2020 E2OpenPlugins
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston MA 02110-1301, USA.
+##########################################################################
+
+"""
+Membership of the services in the TV bouquets.
+
+Restricting the EPG search to the bouquets needs the references of all
+services in the TV bouquets. Instead of listing every bouquet on each
+search, the set of them is built once and rebuilt when the bouquets
+version changes, i.e. when the bouquets are reloaded, edited with the
+bouquet editor or their files are written.
+"""
+
+from Plugins.Extensions.OpenWebif.controllers.dataversion import dataVersions
+
+
+class BouquetIndex(object):
+	"""
+	See module documentation.
+	"""
+
+	def __init__(self):
+		self.members = frozenset()
+		self.builds = 0
+		self.lookups = 0
+		self._version = None
+
+	def _build(self):
+		# models.services imports this module
+		from Plugins.Extensions.OpenWebif.controllers.models.services import getAllServices
+		members = set()
+		for bouquet in getAllServices('tv', removeNameFromsref=True, showAll=False, nolastscanned=True)['services']:
+			# the bouquet references have always been part of the set
+			members.add(bouquet['servicereference'])
+			members.update(service['servicereference'] for service in bouquet['subservices'])
+		self.members = frozenset(members)
+		self.builds += 1
+
+	def _check(self):
+		version = dataVersions.get("bouquets")
+		if version != self._version:
+			self._build()
+			self._version = version
+
+	def getMembers(self):
+		"""
+		Returns:
+			frozenset of the references of the services in the TV bouquets
+			(names removed, as returned by `getContent("C")`)
+		"""
+		self._check()
+		self.lookups += 1
+		return self.members
+
+	def getStats(self):
+		return {
+			"builds": self.builds,
+			"lookups": self.lookups,
+			"members": len(self.members)
+		}
+
+
+bouquetIndex = BouquetIndex()
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+##########################################################################
+# OpenWebif: DataVersion
+##########################################################################
+# Copyright (C) 2011 - 2020 E2OpenPlugins
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston MA 02110-1301, USA.
+##########################################################################
+
+"""
+Version counters for the data behind the API responses.
+
+A version consists of a counter which is bumped by OpenWebif whenever it
+changes the data itself and of a probe for changes made elsewhere (e.g.
+modification times of the files enigma2 writes). Versions are used to
+build ETags and as cache keys.
+"""
+
+import os
+import time
+import hashlib
+
+import six
+import NavigationInstance
+from Components.config import config
+
+from Plugins.Extensions.OpenWebif.controllers.defaults import OPENWEBIFVER
+
+#: EPG data is considered unchanged for this many seconds
+EPG_VERSION_INTERVAL = 60
+
+#: directory of the bouquets
+BOUQUET_DIR = "/etc/enigma2"
+
+#: files the bouquets version depends on besides the userbouquet.* files
+BOUQUET_FILES = ("/etc/enigma2/lamedb", "/etc/enigma2/lamedb5", "/etc/enigma2/bouquets.tv", "/etc/enigma2/bouquets.radio")
+
+TIMER_FILE = "/etc/enigma2/timers.xml"
+
+
+def _mtime(filename):
+	try:
+		return os.stat(filename).st_mtime
+	except OSError:
+		return None
+
+
+# names of the userbouquet files, listed again when the directory changes
+_userBouquets = {"mtime": None, "files": ()}
+
+
+def _userBouquetFiles():
+	mtime = _mtime(BOUQUET_DIR)
+	if mtime != _userBouquets["mtime"]:
+		try:
+			names = os.listdir(BOUQUET_DIR)
+		except OSError:
+			names = []
+		_userBouquets["files"] = tuple(sorted(os.path.join(BOUQUET_DIR, name) for name in names if name.startswith("userbouquet.")))
+		_userBouquets["mtime"] = mtime
+	return _userBouquets["files"]
+
+
+def _bouquetsProbe(request):
+	# not the directory itself, settings, timers and epg.dat are written there too
+	return tuple((f, _mtime(f)) for f in BOUQUET_FILES + _userBouquetFiles())
+
+
+def _timersProbe(request):
+	dataVersions.watchTimers()
+	return _mtime(TIMER_FILE)
+
+
+def _epgProbe(request):
+	return int(time.time() // EPG_VERSION_INTERVAL)
+
+
+def _moviesProbe(request):
+	dirname = None
+	if request is not None:
+		dirname = request.args.get(b"dirname", [None])[0]
+	if not dirname:
+		try:
+			dirname = config.usage.default_path.value
+		except AttributeError:
+			return None
+	dirname = six.ensure_str(dirname)
+	# size and mtime of every file, recordings grow and cuts are rewritten
+	# without changing the directory
+	try:
+		names = sorted(os.listdir(dirname))
+	except OSError:
+		return None
+	state = hashlib.sha1()  # nosec
+	for name in names:
+		try:
+			st = os.stat(os.path.join(dirname, name))
+		except OSError:
+			continue
+		state.update(six.ensure_binary("%s|%d|%f\n" % (name, st.st_size, st.st_mtime), errors="replace"))
+	return state.hexdigest()
+
+
+def _serviceProbe(request):
+	nav = NavigationInstance.instance
+	ref = nav and nav.getCurrentlyPlayingServiceReference()
+	return ref and ref.toString()
+
+
+class DataVersions(object):
+	"""
+	Registry of the data versions, see module documentation.
+	"""
+
+	def __init__(self):
+		self._counters = {}
+		self._probes = {}
+		self._timersWatched = False
+		# counters start at 0 again after a restart
+		self.startid = "%s:%f" % (OPENWEBIFVER, time.time())
+
+	def register(self, name, probe=None):
+		"""
+		Args:
+			name: version name
+			probe: function called with the request (or None) returning a
+				hashable value which changes along with the data
+		"""
+		self._counters.setdefault(name, 0)
+		if probe is not None:
+			self._probes[name] = probe
+
+	def bump(self, name):
+		self._counters[name] = self._counters.get(name, 0) + 1
+
+	def get(self, name, request=None):
+		"""
+		Returns:
+			current version of *name* (hashable)
+		"""
+		probe = self._probes.get(name)
+		return (self._counters.get(name, 0), probe and probe(request))
+
+	def getCounter(self, name):
+		"""
+		Returns:
+			counter of *name*, without running its probe
+		"""
+		return self._counters.get(name, 0)
+
+	def getETag(self, request, names, extra=None):
+		"""
+		Strong ETag for the response to *request* which only depends on the
+		data versions *names* (and the hashable *extra*).
+		"""
+		key = [self.startid, six.ensure_str(request.uri)]
+		for name in names:
+			key.append(repr(self.get(name, request)))
+		if extra is not None:
+			key.append(repr(extra))
+		return '"%s"' % hashlib.sha1(six.ensure_binary("|".join(key))).hexdigest()[:24]  # nosec
+
+	def watchTimers(self):
+		if self._timersWatched:
+			return
+		nav = NavigationInstance.instance
+		if nav is not None and hasattr(nav.RecordTimer, "on_state_change"):
+			nav.RecordTimer.on_state_change.append(self._timerStateChanged)
+			self._timersWatched = True
+
+	def _timerStateChanged(self, entry):
+		self.bump("timers")
+
+	def getStats(self):
+		return dict((name, self.get(name)[0]) for name in self._counters)
+
+
+dataVersions = DataVersions()
+dataVersions.register("bouquets", _bouquetsProbe)
+dataVersions.register("timers", _timersProbe)
+dataVersions.register("epg", _epgProbe)
+dataVersions.register("movies", _moviesProbe)
+dataVersions.register("service", _serviceProbe)
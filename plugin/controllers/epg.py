@@ -27,8 +27,9 @@ from enigma import eEPGCache, eServiceCenter, eServiceReference
 from ServiceReference import ServiceReference
 from Components.config import config
 
-from Plugins.Extensions.OpenWebif.controllers.epgevent import EPGEvent
-from Plugins.Extensions.OpenWebif.controllers.utilities import debug, error
+from Plugins.Extensions.OpenWebif.controllers.epgevent import EPGEvent, getFieldLayout
+from Plugins.Extensions.OpenWebif.controllers.utilities import debug, error, DEBUG_ENABLED, LRUCache
+from Plugins.Extensions.OpenWebif.controllers.dataversion import dataVersions
 
 
 CASE_SENSITIVE_QUERY = 0
@@ -47,6 +48,7 @@ MULTI_CHANNEL_FIELDS = 'IBTSRND'     # getMultiChannelEvents
 MULTI_NOWNEXT_FIELDS = 'TBDCIESX'    # getMultiChannelNowNextEvents
 SINGLE_CHANNEL_FIELDS = 'IBDTSENCW'   # getChannelEvents;
 SEARCH_FIELDS = 'IBDTSENRW'   # search, findSimilarEvents
+EVENT_CACHE_SIZE = 512  # descriptions and similar event lists kept by eventCache
 
 
 # TODO: load configgy stuff once
@@ -78,6 +80,60 @@ def getServiceDetails(sRef):
 	return value
 
 
+def debugEvents(epgEvents, context="EPG"):
+	# serializing an event is not free, only do it when the output is wanted
+	if DEBUG_ENABLED:
+		debug(epgEvents[-1].toJSON(indent=2) if epgEvents else epgEvents, context)
+
+
+class EventCache(object):
+	"""
+	Event descriptions and similar broadcasts by (service reference, event
+	id), kept in LRU caches until the EPG is loaded or cleared. Similar
+	broadcasts are also keyed on the time bucket of the epg version, as
+	more of them are received from EIT. Empty results are not cached as the
+	events may still be received.
+	"""
+
+	def __init__(self):
+		self.descriptions = LRUCache(maxsize=EVENT_CACHE_SIZE)
+		self.similar = LRUCache(maxsize=EVENT_CACHE_SIZE)
+		self._epgVersion = None
+		self._epgBucket = None
+
+	def _checkVersion(self):
+		epgVersion, self._epgBucket = dataVersions.get("epg")
+		if epgVersion != self._epgVersion:
+			self._epgVersion = epgVersion
+			self.clear()
+
+	def get(self, cache, key, fnc, *args):
+		self._checkVersion()
+		value = cache.get(key)
+		if value is None:
+			value = fnc(*args)
+			if value:
+				cache.set(key, value)
+		return value
+
+	def getSimilar(self, sRef, eventId, fnc, *args):
+		self._checkVersion()
+		return self.get(self.similar, (sRef, eventId, self._epgBucket), fnc, *args)
+
+	def clear(self):
+		self.descriptions.clear()
+		self.similar.clear()
+
+	def getStats(self):
+		return {
+			"descriptions": self.descriptions.stats(),
+			"similar": self.similar.stats()
+		}
+
+
+eventCache = EventCache()
+
+
 # TODO: move to utilities
 class TimedProcess:
 	def __init__(self):
@@ -150,11 +206,13 @@ class EPG():
 
 		criteria = (SEARCH_FIELDS, MAX_RESULTS, eEPGCache.SIMILAR_BROADCASTINGS_SEARCH, sRef, eventId)
 		with TimedProcess() as tp:
-			epgEvents = self._instance.search(criteria)
+			# the raw tuples are cached, events memoize values relative to now
+			epgEvents = eventCache.getSimilar(sRef, eventId, self._instance.search, criteria)
 			if epgEvents is None:
 				epgEvents = []
 			else:
-				epgEvents = [self._transformEventData(SEARCH_FIELDS, evt) for evt in epgEvents]
+				layout = getFieldLayout(SEARCH_FIELDS)
+				epgEvents = [EPGEvent.fromFields(layout, evt) for evt in epgEvents]
 
 		# debug(tp.getTimeTaken(), "EPG")
 
@@ -180,12 +238,14 @@ class EPG():
 
 		criteria.insert(0, fields)
 		epgEvents = self._instance.lookupEvent(criteria)
+		layout = getFieldLayout(fields)
+		fromFields = EPGEvent.fromFields
 		with TimedProcess() as tp:
-			epgEvents = [self._transformEventData(fields, evt) for evt in epgEvents]
+			epgEvents = [fromFields(layout, evt) for evt in epgEvents]
 
 		# debug(tp.getTimeTaken(), "EPG")
 
-		debug(epgEvents[-1].toJSON(indent=2) if epgEvents and len(epgEvents) else epgEvents)
+		debugEvents(epgEvents, "")
 		return epgEvents
 
 	# this function is wrong
@@ -204,7 +264,7 @@ class EPG():
 		with TimedProcess() as tp:
 			epgEvents = self._queryEPG(BOUQUET_NOWNEXT_FIELDS, criteria)
 
-		debug(epgEvents[-1].toJSON(indent=2) if epgEvents and len(epgEvents) else epgEvents, "EPG")
+		debugEvents(epgEvents)
 		return epgEvents
 
 	def getChannelEvents(self, sRef, startTime, endTime=None):
@@ -220,7 +280,7 @@ class EPG():
 		with TimedProcess() as tp:
 			epgEvents = self._queryEPG(SINGLE_CHANNEL_FIELDS, criteria)
 
-		debug(epgEvents[-1].toJSON(indent=2) if epgEvents and len(epgEvents) else epgEvents, "EPG")
+		debugEvents(epgEvents)
 		return epgEvents
 
 	def getChannelNowEvent(self, sRef):
@@ -244,7 +304,7 @@ class EPG():
 		with TimedProcess() as tp:
 			epgEvents = self._queryEPG(fields, criteria)
 
-		debug(epgEvents[-1].toJSON(indent=2) if epgEvents and len(epgEvents) else epgEvents.append, "EPG")
+		debugEvents(epgEvents)
 		return epgEvents
 
 	def getMultiChannelNowNextEvents(self, sRefs, fields=MULTI_NOWNEXT_FIELDS):
@@ -263,7 +323,7 @@ class EPG():
 		with TimedProcess() as tp:
 			epgEvents = self._queryEPG(fields, criteria)
 
-		debug(epgEvents[-1].toJSON(indent=2) if epgEvents and len(epgEvents) else epgEvents, "EPG")
+		debugEvents(epgEvents)
 		return epgEvents
 
 	def getBouquetEvents(self, bqRef, startTime, endTime=None):
@@ -285,7 +345,8 @@ class EPG():
 
 		epgEvent = EPGEvent(epgEvent)
 
-		debug(epgEvent.toJSON(indent=2))
+		if DEBUG_ENABLED:
+			debug(epgEvent.toJSON(indent=2))
 		return epgEvent
 
 	def getEventById(self, sRef, eventId):
@@ -304,7 +365,8 @@ class EPG():
 		epgEvent = EPGEvent(epgEvent)
 		epgEvent.service = getServiceDetails(sRef)
 
-		debug(epgEvent.toJSON(indent=2), "EPG")
+		if DEBUG_ENABLED:
+			debug(epgEvent.toJSON(indent=2), "EPG")
 		return epgEvent
 
 		# ServiceReference(sRef).getServiceName(),
@@ -329,7 +391,8 @@ class EPG():
 		epgEvent = self.getEventById(sRef, eventId)
 		# epgEvent = EPGEvent(epgEvent) # already transformed by `getEventById()`
 
-		debug(epgEvent.toJSON(indent=2), "EPG")
+		if DEBUG_ENABLED:
+			debug(epgEvent.toJSON(indent=2), "EPG")
 		return epgEvent
 
 	def getEventDescription(self, sRef, eventId):
@@ -341,19 +404,20 @@ class EPG():
 			sRef = str(sRef)
 			eventId = int(eventId)
 
-		description = None
-		epgEvent = self.getEventById(sRef, eventId)
-
-		if epgEvent:
-			description = epgEvent.description
-
+		description = eventCache.get(eventCache.descriptions, (sRef, eventId), self._lookupDescription, sRef, eventId)
 		debug(description, "EPG")
 		return description
 
+	def _lookupDescription(self, sRef, eventId):
+		epgEvent = self.getEventById(sRef, eventId)
+		return epgEvent and epgEvent.description
+
 	# /web/loadepg
 
 	def load(self):
 		self._instance.load()
+		dataVersions.bump("epg")
+		eventCache.clear()
 
 	# /web/saveepg
 
@@ -365,3 +429,5 @@ class EPG():
 	def clear(self):
 		self._instance.clearDB()
 		self._instance.save()
+		dataVersions.bump("epg")
+		eventCache.clear()
@@ -21,14 +21,15 @@
 ##########################################################################
 
 from time import time, localtime, gmtime, strftime
-from datetime import datetime, timedelta
-from json import dumps
+from datetime import datetime
 
 from enigma import eServiceCenter, eServiceEvent, eServiceReference
 from ServiceReference import ServiceReference
 from Components.config import config
 
 from Plugins.Extensions.OpenWebif.controllers.utilities import debug, error
+from Plugins.Extensions.OpenWebif.controllers.serializer import dumps
+from Plugins.Extensions.OpenWebif.controllers.timeformat import timeFormats, MINUTE
 
 try:
 	from Components.Converter.genre import getGenreStringLong
@@ -70,25 +71,16 @@ TEXT_TOMORROW = 'Tomorrow, %R'
 # timestamp = 1658008800 #next 00:00:00 Sun, July 17, 2022 12:00:00 AM GMT+02:00 DST
 # timestamp = 1658095199 #next 23:59:59 Sun, July 17, 2022 11:59:59 PM GMT+02:00 DST
 
+FUZZY_DAYS = {-1: TEXT_YESTERDAY, 0: TEXT_TODAY, 1: TEXT_TOMORROW}
+
+
+def _fuzzyDayTime(timestamp, defaultFormat):
+	return strftime(FUZZY_DAYS.get(timeFormats.dayOffset(timestamp), defaultFormat), localtime(timestamp))
+
+
 # TODO: move to utilities
 def getFuzzyDayTime(timestamp, defaultFormat):
-	timeNow = int(time())
-	timeDiff = timestamp - timeNow
-	deltaDays = timedelta(seconds=timeDiff).days
-
-	if -2 <= deltaDays <= 2:
-		dayDiff = localtime(timestamp)[2] - localtime(timeNow)[2]
-		if dayDiff == -1:
-			text = strftime(TEXT_YESTERDAY, (localtime(timestamp)))
-		elif dayDiff == 0:
-			text = strftime(TEXT_TODAY, (localtime(timestamp)))
-		elif dayDiff == 1:
-			text = strftime(TEXT_TOMORROW, (localtime(timestamp)))
-		else:
-			text = strftime(defaultFormat, (localtime(timestamp)))
-	else:
-		text = strftime(defaultFormat, (localtime(timestamp)))
-	return text
+	return timeFormats.memo(("fuzzy", defaultFormat), timeFormats.resolution(defaultFormat), timestamp, _fuzzyDayTime, defaultFormat)
 
 
 def getDisplayday():
@@ -105,17 +97,39 @@ def getTimeShort():
 		return "%R"
 
 
-def getCustomTimeFormats(timestamp):  # TODO: move to utilities
+def _customTimeFormats(timestamp, displayday, timeShort):
+	# the fields which are the same for the whole minute
+	offset = timeFormats.dayOffset(timestamp)
 	return {
-		'timestamp': timestamp,
-		'date': strftime(getDisplayday(), (localtime(timestamp))),
-		'time': strftime(getTimeShort(), (localtime(timestamp))),
-		'dateTime': strftime('%c', (localtime(timestamp))),
-		'fuzzy': getFuzzyDayTime(timestamp, '%c'),
-		'iso': datetime.fromtimestamp(timestamp).isoformat() if timestamp is not None else ''
+		'date': timeFormats.strftime(displayday, timestamp),
+		'time': timeFormats.strftime(timeShort, timestamp),
+		'fuzzy': strftime(FUZZY_DAYS[offset], localtime(timestamp)) if offset in FUZZY_DAYS else None
 	}
 
 
+def getCustomTimeFormats(timestamp):  # TODO: move to utilities
+	if timestamp is None:
+		return {
+			'timestamp': timestamp,
+			'date': strftime(getDisplayday(), localtime()),
+			'time': strftime(getTimeShort(), localtime()),
+			'dateTime': strftime('%c', localtime()),
+			'fuzzy': strftime(TEXT_TODAY, localtime()),
+			'iso': ''
+		}
+	displayday = getDisplayday()
+	timeShort = getTimeShort()
+	resolution = min(MINUTE, timeFormats.resolution(displayday), timeFormats.resolution(timeShort))
+	# callers may modify the returned dict
+	ret = dict(timeFormats.memo(("custom", displayday, timeShort), resolution, timestamp, _customTimeFormats, displayday, timeShort))
+	# the fields showing seconds are not cached
+	ret['timestamp'] = timestamp
+	ret['dateTime'] = strftime('%c', localtime(timestamp))
+	ret['fuzzy'] = ret['fuzzy'] or ret['dateTime']
+	ret['iso'] = datetime.fromtimestamp(timestamp).isoformat()
+	return ret
+
+
 # TODO: move to utilities
 def getFuzzyHoursMinutes(timestamp=0):
 	timeStruct = gmtime(timestamp)
@@ -178,118 +192,237 @@ def convertRating(val):  # TODO convert rating
 	return None
 
 
-class EPGEvent():
-	def __init__(self, evt):
-		eventId = None
-		startTimestamp = None
-		durationSeconds = None
-		title = None
-		shortDescription = None
-		longDescription = None
-		parentalRatingData = None
-		genreData = None
-		currentTimestamp = None
-		service = {}
+#: EPGEvent attribute per lookupEvent/search field
+FIELD_ATTRIBUTES = {
+	'I': 'eventId',
+	'B': '_begin',
+	'D': '_seconds',
+	'T': '_title',
+	'S': '_shortDescription',
+	'E': '_longDescription',
+	'P': '_parentalRatingData',
+	'W': '_genreData',
+	'C': 'currentTimestamp',
+	'M': 'maxResults'
+}
+
+#: service keys per lookupEvent/search field
+FIELD_SERVICE_KEYS = {
+	'R': 'sRef',
+	'n': 'shortName',
+	'N': 'name'
+}
+
+_layouts = {}
+
+
+def getFieldLayout(fields):
+	"""
+	Positions of the EPGEvent attributes and service keys within the
+	tuples returned by eEPGCache for *fields* (computed once per string).
+
+	Returns:
+		((attribute, index), ...), ((service key, index), ...)
+	"""
+	layout = _layouts.get(fields)
+	if layout is None:
+		attributes = tuple((FIELD_ATTRIBUTES[key], index) for index, key in enumerate(fields) if key in FIELD_ATTRIBUTES)
+		serviceKeys = tuple((FIELD_SERVICE_KEYS[key], index) for index, key in enumerate(fields) if key in FIELD_SERVICE_KEYS)
+		layout = _layouts[fields] = (attributes, serviceKeys)
+	return layout
+
+
+class EPGEvent(object):
+	"""
+	EPG event record.
+
+	Only the raw event data is stored on construction; the formatted
+	times, duration, progress and genre are computed on first access and
+	memoized, so callers only pay for what they use.
+	"""
+	__slots__ = (
+		"eventId", "currentTimestamp", "maxResults", "service",
+		"_begin", "_seconds", "_title", "_shortDescription", "_longDescription", "_parentalRatingData", "_genreData",
+		"_start", "_end", "_duration", "_progress", "_remaining", "_genre"
+	)
+
+	def __init__(self, evt=None):
+		self.eventId = None
+		self.currentTimestamp = None
+		self.maxResults = None
+		self.service = None
+		self._begin = None
+		self._seconds = None
+		self._title = None
+		self._shortDescription = None
+		self._longDescription = None
+		self._parentalRatingData = None
+		self._genreData = None
+		self._start = None
+		self._end = None
+		self._duration = None
+		self._progress = None
+		self._remaining = None
+		self._genre = None
 
 		if isinstance(evt, eServiceEvent):
-			eventId = evt.getEventId()
-			startTimestamp = evt.getBeginTime()
-			durationSeconds = evt.getDuration()
-			currentTimestamp = int(time())
-			title = evt.getEventName()
-			shortDescription = evt.getShortDescription()
-			longDescription = evt.getExtendedDescription()
-			parentalRatingData = evt.getParentalData()
-			genreData = evt.getGenreData()
+			self.eventId = evt.getEventId()
+			self._begin = evt.getBeginTime()
+			self._seconds = evt.getDuration()
+			self.currentTimestamp = int(time())
+			self._title = evt.getEventName()
+			self._shortDescription = evt.getShortDescription()
+			self._longDescription = evt.getExtendedDescription()
+			self._parentalRatingData = evt.getParentalData()
+			self._genreData = evt.getGenreData()
 
 		elif isinstance(evt, tuple):
-			eventFields = evt[0]
-			eventData = evt[1]
-
-			for index, value in enumerate(eventData):
-				try:
-					key = eventFields[index]
-					if key == 'I':
-						eventId = value
-					elif key == 'B':
-						startTimestamp = value
-					elif key == 'D':
-						durationSeconds = value
-					elif key == 'T':
-						title = value
-					elif key == 'S':
-						shortDescription = value
-					elif key == 'E':
-						longDescription = value
-					elif key == 'P':
-						parentalRatingData = value
-					elif key == 'W':
-						genreData = value
-					elif key == 'C':
-						currentTimestamp = value
-					elif key == 'R':
-						service['sRef'] = value
-					elif key == 'n':
-						service['shortName'] = value
-					elif key == 'N':
-						service['name'] = value
-					elif key == 'X':
-						pass
-					elif key == 'M':
-						self.maxResults = value
-					# else:
-					# 	eventData[key] = value
-
-				except Exception as err:
-					error(err, "EPGEvent")
-
-		self.eventId = eventId
-		self.title = (title or '').strip()
-		self.shortDescription = (shortDescription or '').strip()
-		self.longDescription = (longDescription or '').strip()
-		self.description = (longDescription or shortDescription or '').strip()
-		self.parentalRating = convertRating(parentalRatingData)
-		self.genre, self.genreId = convertGenre(genreData)
-
-		if len(service) > 0:
-			self.service = service
-
-		if startTimestamp is not None:
-			self.start = getCustomTimeFormats(startTimestamp)
-
-		if durationSeconds is not None:
-			self.duration = {
-				'seconds': durationSeconds,
-				'minutes': int(durationSeconds / 60),
-				'fuzzy': getFuzzyHoursMinutes(durationSeconds),
-			}
-
-		if currentTimestamp is not None:
-			self.currentTimestamp = currentTimestamp
-
-		if startTimestamp and durationSeconds is not None:
-			endTimestamp = startTimestamp + durationSeconds
 			try:
-				self.end = getCustomTimeFormats(endTimestamp)
+				self._setFields(getFieldLayout(evt[0]), evt[1])
 			except Exception as err:
 				error(err, "EPGEvent")
-			if currentTimestamp:
-				remaining = endTimestamp - currentTimestamp if currentTimestamp > startTimestamp else durationSeconds
+
+	def _setFields(self, layout, data):
+		attributes, serviceKeys = layout
+		for name, index in attributes:
+			setattr(self, name, data[index])
+		if serviceKeys:
+			self.service = dict((key, data[index]) for key, index in serviceKeys)
+
+	@classmethod
+	def fromFields(cls, layout, data):
+		"""
+		Fast path for many events of the same *layout* (see
+		:py:func:`getFieldLayout`).
+		"""
+		event = cls()
+		event._setFields(layout, data)
+		return event
+
+	@property
+	def title(self):
+		return (self._title or '').strip()
+
+	@property
+	def shortDescription(self):
+		return (self._shortDescription or '').strip()
+
+	@property
+	def longDescription(self):
+		return (self._longDescription or '').strip()
+
+	@property
+	def description(self):
+		return (self._longDescription or self._shortDescription or '').strip()
+
+	@property
+	def startTimestamp(self):
+		return self._begin
+
+	@property
+	def endTimestamp(self):
+		if self._begin and self._seconds is not None:
+			return self._begin + self._seconds
+		return None
+
+	@property
+	def parentalRating(self):
+		return convertRating(self._parentalRatingData)
+
+	@property
+	def genre(self):
+		if self._genre is None:
+			self._genre = convertGenre(self._genreData)
+		return self._genre[0]
+
+	@property
+	def genreId(self):
+		if self._genre is None:
+			self._genre = convertGenre(self._genreData)
+		return self._genre[1]
+
+	@property
+	def start(self):
+		if self._start is None and self._begin is not None:
+			self._start = getCustomTimeFormats(self._begin)
+		return self._start
+
+	@property
+	def end(self):
+		if self._end is None:
+			endTimestamp = self.endTimestamp
+			if endTimestamp is not None:
 				try:
-					progressPercent = int((100 * (currentTimestamp - startTimestamp) / durationSeconds))
-					progressPercent = progressPercent if progressPercent >= 0 else 0
-					self.progress = {
-						'number': progressPercent,
-						'text': '{0}%'.format(progressPercent),
-					}
-					self.remaining = {
-						'seconds': remaining,
-						'minutes': int(remaining / 60),
-						'text': getFuzzyHoursMinutes(remaining),
-					}
+					self._end = getCustomTimeFormats(endTimestamp)
 				except Exception as err:
 					error(err, "EPGEvent")
-
-	def toJSON(self, **kwargs):
+		return self._end
+
+	@property
+	def duration(self):
+		if self._duration is None and self._seconds is not None:
+			self._duration = {
+				'seconds': self._seconds,
+				'minutes': int(self._seconds / 60),
+				'fuzzy': getFuzzyHoursMinutes(self._seconds),
+			}
+		return self._duration
+
+	def _setProgress(self):
+		startTimestamp = self._begin
+		durationSeconds = self._seconds
+		currentTimestamp = self.currentTimestamp
+		if not startTimestamp or durationSeconds is None or not currentTimestamp:
+			return
+		remaining = startTimestamp + durationSeconds - currentTimestamp if currentTimestamp > startTimestamp else durationSeconds
+		try:
+			progressPercent = int((100 * (currentTimestamp - startTimestamp) / durationSeconds))
+			progressPercent = progressPercent if progressPercent >= 0 else 0
+			self._progress = {
+				'number': progressPercent,
+				'text': '{0}%'.format(progressPercent),
+			}
+			self._remaining = {
+				'seconds': remaining,
+				'minutes': int(remaining / 60),
+				'text': getFuzzyHoursMinutes(remaining),
+			}
+		except Exception as err:
+			error(err, "EPGEvent")
+
+	@property
+	def progress(self):
+		if self._progress is None:
+			self._setProgress()
+		return self._progress
+
+	@property
+	def remaining(self):
+		if self._remaining is None:
+			self._setProgress()
+		return self._remaining
+
+	def toDict(self):
+		"""
+		Returns:
+			all event attributes (those without a value are left out)
+		"""
+		ret = {
+			'eventId': self.eventId,
+			'title': self.title,
+			'shortDescription': self.shortDescription,
+			'longDescription': self.longDescription,
+			'description': self.description,
+			'parentalRating': self.parentalRating,
+			'genre': self.genre,
+			'genreId': self.genreId
+		}
+		for name in ('service', 'start', 'duration', 'currentTimestamp', 'end', 'progress', 'remaining', 'maxResults'):
+			value = getattr(self, name)
+			if value is not None:
+				ret[name] = value
+		return ret
+
+	def toJSON(self, indent=None):
 		# dict keys that are not of a basic type (str, int, float, bool, None) will raise a TypeError.
-		return dumps(self.__dict__, **kwargs)
+		return dumps(self.toDict(), indent=indent)
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+
+##########################################################################
+# OpenWebif: EPGSearch
+##########################################################################
+# Copyright (C) 2011 - 2020 E2OpenPlugins
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston MA 02110-1301, USA.
+##########################################################################
+
+"""
+Full text search over the EPG of the bouquet services.
+
+The index (see :py:mod:`searchindex`) is built on the first search and
+then updated one service at a time every :py:data:`REFRESH_INTERVAL`
+seconds. The events of a service are read from the EPG cache in the main
+loop and tokenized in a thread. It is dropped when the EPG is loaded or
+cleared. Until the first pass is complete, searches return None and the
+caller falls back to `eEPGCache.search`.
+
+The index holds at most :py:data:`MAX_EVENTS` events, the nearest ones of
+each service first. When there has been no search for
+:py:data:`IDLE_TIME` seconds, the updates stop and the index is dropped
+until the next search.
+"""
+
+from __future__ import print_function
+import time
+
+from enigma import eEPGCache
+from twisted.internet import reactor, threads
+
+from Plugins.Extensions.OpenWebif.controllers.searchindex import SearchIndex, prepareDocuments
+from Plugins.Extensions.OpenWebif.controllers.epgsnapshot import getBouquetServices
+from Plugins.Extensions.OpenWebif.controllers.dataversion import dataVersions
+from Plugins.Extensions.OpenWebif.controllers.utilities import error
+
+#: seconds between two update passes
+REFRESH_INTERVAL = 900
+
+#: minutes of EPG data indexed
+INDEX_MINUTES = 14 * 24 * 60
+
+#: max. number of indexed events
+MAX_EVENTS = 150000
+
+#: seconds without searches after which the index is dropped
+IDLE_TIME = 3600
+
+#: fields read for indexing
+INDEX_FIELDS = 'IBDTSE'
+
+#: fields of the returned events, same as `EPG.search`
+SEARCH_FIELDS = 'IBDTSENRW'
+
+#: lookupEvent type for a lookup by event id
+MATCH_EVENT_ID = 2
+
+
+class EPGSearchIndex(object):
+	"""
+	See module documentation.
+	"""
+
+	def __init__(self):
+		self.index = SearchIndex()
+		self.ready = False
+		self.building = False
+		self.epgVersion = None
+		self.passes = 0
+		self.lastPassTime = 0
+		self.lastSearch = 0
+		self.capped = 0
+		self._next = None
+		self._generation = 0
+
+	def _checkVersion(self):
+		epgVersion = dataVersions.get("epg")[0]
+		if epgVersion != self.epgVersion:
+			self.epgVersion = epgVersion
+			self.index.clear()
+			self.ready = False
+			# abandon a running pass
+			self._generation += 1
+			self.building = False
+			if self._next is not None and self._next.active():
+				self._next.cancel()
+			self._next = None
+
+	def update(self):
+		"""
+		Start an update pass unless one is running.
+		"""
+		self._checkVersion()
+		if self.building:
+			return
+		self.building = True
+		self._next = None
+		generation = self._generation
+		started = time.time()
+		try:
+			services = [sRef for sRef, name in getBouquetServices()]
+		except Exception as e:
+			error("cannot list the bouquet services: %s" % e, "EPGSearch")
+			self.building = False
+			return
+		wanted = set(services)
+		for sRef in self.index.groups():
+			if sRef not in wanted:
+				self.index.removeGroup(sRef)
+		epgcache = eEPGCache.getInstance()
+
+		def failed(err):
+			error(err.getErrorMessage(), "EPGSearch")
+			if generation == self._generation:
+				self.building = False
+
+		def apply(documents, sRef):
+			if generation != self._generation:
+				return
+			self.index.setPreparedGroup(sRef, documents)
+			reactor.callLater(0, indexNext)
+
+		def indexNext():
+			if generation != self._generation:
+				return
+			if not services:
+				self.building = False
+				self.passes += 1
+				self.lastPassTime = time.time() - started
+				if time.time() - self.lastSearch > IDLE_TIME:
+					self.drop()
+					return
+				self.ready = True
+				print("[OpenWebif] [EPGSearch] %d events indexed in %.1fs" % (len(self.index), self.lastPassTime))
+				self._next = reactor.callLater(REFRESH_INTERVAL, self.update)
+				return
+			sRef = services.pop(0)
+			events = epgcache.lookupEvent([INDEX_FIELDS, (sRef, 0, -1, INDEX_MINUTES)]) or []
+			documents = [(e[0], e[1], e[2], e[3], "%s %s" % (e[4] or "", e[5] or "")) for e in events if e[0]]
+			room = MAX_EVENTS - len(self.index) + self.index.groupSize(sRef)
+			if len(documents) > room:
+				# events are in order of begin, keep the nearest ones
+				self.capped += 1
+				documents = documents[:max(0, room)]
+			d = threads.deferToThread(prepareDocuments, documents)
+			d.addCallback(apply, sRef)
+			d.addErrback(failed)
+		indexNext()
+
+	def drop(self):
+		"""
+		Drop the index and stop the updates until the next search.
+		"""
+		self._generation += 1
+		self.building = False
+		if self._next is not None and self._next.active():
+			self._next.cancel()
+		self._next = None
+		self.index.clear()
+		self.ready = False
+		print("[OpenWebif] [EPGSearch] index dropped, no searches for %ds" % IDLE_TIME)
+
+	def search(self, query, fulltext=False, accept=None, offset=0, limit=None):
+		"""
+		Args:
+			query: search words, see :py:meth:`searchindex.SearchIndex.search`
+			fulltext: also search the short and extended descriptions
+			accept: optional function called with (service reference, event
+				id, begin) returning whether a hit is wanted
+			offset: number of hits skipped
+			limit: max. number of events returned
+		Returns:
+			None if the index is not ready, otherwise total number of hits,
+			list of the events of the requested page as tuples of
+			:py:data:`SEARCH_FIELDS` in rank order and whether hits are
+			missing (see :py:meth:`searchindex.SearchIndex.search`)
+		"""
+		self._checkVersion()
+		self.lastSearch = time.time()
+		if not self.ready:
+			self.update()
+			return None
+		total, hits, truncated = self.index.search(query, fulltext, accept, offset, limit)
+		if not hits:
+			return total, [], truncated
+		# lookupEvent answers in the order of the criteria
+		criteria = [SEARCH_FIELDS] + [(sRef, MATCH_EVENT_ID, eventId) for sRef, eventId in hits]
+		return total, [e for e in eEPGCache.getInstance().lookupEvent(criteria) or [] if e[0]], truncated
+
+	def getStats(self):
+		ret = self.index.getStats()
+		ret.update({
+			"ready": self.ready,
+			"building": self.building,
+			"passes": self.passes,
+			"passtime": round(self.lastPassTime, 1),
+			"capped": self.capped
+		})
+		return ret
+
+
+epgSearchIndex = EPGSearchIndex()
@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+
+##########################################################################
+# OpenWebif: EPGSnapshot
+##########################################################################
+# Copyright (C) 2011 - 2020 E2OpenPlugins
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston MA 02110-1301, USA.
+##########################################################################
+
+"""
+Snapshot of the EPG of all bouquet services.
+
+The events of each service are stored column wise in parallel arrays
+(begin, duration, event id, title and short description as ids into a
+table of interned strings shared by all services), sorted by begin time.
+Time window queries of the multi EPG and the EPG grid are answered by
+bisecting the arrays of a service.
+
+The snapshot is built on the first query and covers the hours from the
+build the multi EPG views have asked for, :py:data:`SNAPSHOT_HOURS` at
+first and up to :py:data:`SNAPSHOT_MAX_HOURS`; a query beyond is left to
+the EPG cache and widens the next build. While the snapshot is in use,
+the next :py:data:`NEAR_MINUTES` minutes of every service, where EIT
+updates arrive, are looked up again every :py:data:`NEAR_INTERVAL`
+seconds and replaced in place. The whole snapshot is only rebuilt every
+:py:data:`REBUILD_INTERVAL` seconds, when the bouquets have been changed
+and when the EPG has been loaded or cleared.
+
+Builds and refreshes query the EPG cache for :py:data:`CHUNK_SIZE`
+services per reactor iteration; a build replaces the previous snapshot
+once it is complete. Queries the current snapshot cannot answer return
+None and are left to the EPG cache.
+"""
+
+from __future__ import print_function
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from enigma import eEPGCache, eServiceCenter, eServiceReference
+from twisted.internet import reactor
+from Screens.ChannelSelection import service_types_tv, service_types_radio
+
+from Plugins.Extensions.OpenWebif.controllers.epgevent import EPGEvent, getFieldLayout
+from Plugins.Extensions.OpenWebif.controllers.dataversion import dataVersions
+from Plugins.Extensions.OpenWebif.controllers.utilities import error
+
+#: hours of EPG data kept from the time of the build at first (the multi
+#: EPG shows until 6:00 of the next day)
+SNAPSHOT_HOURS = 36
+
+#: upper limit of the hours kept when queries ask for more
+SNAPSHOT_MAX_HOURS = 8 * 24
+
+#: minutes from now which are refreshed in place
+NEAR_MINUTES = 180
+
+#: seconds between two refreshes of the near events
+NEAR_INTERVAL = 120
+
+#: seconds after which the snapshot is rebuilt
+REBUILD_INTERVAL = 3600
+
+#: services queried per reactor iteration during a build or refresh
+CHUNK_SIZE = 20
+
+#: fields of the eEPGCache queries of a build
+SNAPSHOT_FIELDS = 'IBDTS'
+
+#: fields of the tuples returned by :py:meth:`EPGSnapshot.getMultiChannelEvents`
+MULTI_CHANNEL_FIELDS = 'IBTSRND'
+
+BOUQUET_ROOTS = (
+	'%s FROM BOUQUET "bouquets.tv" ORDER BY bouquet' % service_types_tv,
+	'%s FROM BOUQUET "bouquets.radio" ORDER BY bouquet' % service_types_radio
+)
+
+
+def isMarker(sRef):
+	try:
+		return int(sRef.split(":")[1]) & 64 != 0
+	except (IndexError, ValueError):
+		return True
+
+
+def getBouquetServices():
+	"""
+	Returns:
+		list of (service reference, name) of all services in the tv and
+		radio bouquets, without duplicates
+	"""
+	serviceHandler = eServiceCenter.getInstance()
+	seen = set()
+	services = []
+	for root in BOUQUET_ROOTS:
+		bouquets = serviceHandler.list(eServiceReference(root))
+		for bqRef in (bouquets and bouquets.getContent('S', True)) or []:
+			content = serviceHandler.list(eServiceReference(bqRef))
+			for sRef, name in (content and content.getContent('SN', True)) or []:
+				if sRef not in seen and not isMarker(sRef):
+					seen.add(sRef)
+					services.append((sRef, name))
+	return services
+
+
+class ServiceEvents(object):
+	"""
+	Columns of the events of one service sorted by begin.
+	"""
+	__slots__ = ("begin", "duration", "eventId", "title", "shortDescription")
+
+	def __init__(self):
+		self.begin = array('l')
+		self.duration = array('l')
+		self.eventId = array('l')
+		self.title = array('i')
+		self.shortDescription = array('i')
+
+	def __len__(self):
+		return len(self.begin)
+
+	def splice(self, begin, end, events, intern):
+		"""
+		Replace the events beginning from *begin* to *end* by *events*
+		(tuples of :py:data:`SNAPSHOT_FIELDS`).
+		"""
+		events = sorted((e for e in events if e[0] and e[1] is not None), key=lambda e: e[1])
+		lo = bisect_left(self.begin, begin)
+		hi = bisect_left(self.begin, end, lo)
+		self.begin[lo:hi] = array('l', [e[1] for e in events])
+		self.duration[lo:hi] = array('l', [e[2] or 0 for e in events])
+		self.eventId[lo:hi] = array('l', [e[0] for e in events])
+		self.title[lo:hi] = array('i', [intern(e[3]) for e in events])
+		self.shortDescription[lo:hi] = array('i', [intern(e[4]) for e in events])
+
+
+class Snapshot(object):
+	"""
+	Column store of the events of a list of services.
+	"""
+	__slots__ = ("services", "names", "events", "strings", "builtAt", "until", "refreshedAt", "epgVersion", "bouquetsVersion", "_stringIds")
+
+	def __init__(self, builtAt, epgVersion, bouquetsVersion, hours=SNAPSHOT_HOURS):
+		self.services = []
+		self.names = {}
+		self.events = {}
+		self.strings = []
+		self.builtAt = builtAt
+		self.until = builtAt + hours * 3600
+		self.refreshedAt = builtAt
+		self.epgVersion = epgVersion
+		self.bouquetsVersion = bouquetsVersion
+		self._stringIds = {}
+
+	def __len__(self):
+		return sum(len(events) for events in self.events.values())
+
+	def _intern(self, value):
+		value = value or ''
+		if self._stringIds is None:
+			self._stringIds = dict((string, sid) for sid, string in enumerate(self.strings))
+		sid = self._stringIds.get(value)
+		if sid is None:
+			sid = self._stringIds[value] = len(self.strings)
+			self.strings.append(value)
+		return sid
+
+	def addService(self, sRef, name, events):
+		"""
+		Add the events (tuples of :py:data:`SNAPSHOT_FIELDS`) of a service.
+		"""
+		self.services.append(sRef)
+		self.names[sRef] = name
+		serviceEvents = self.events[sRef] = ServiceEvents()
+		serviceEvents.splice(0, 0, events, self._intern)
+
+	def replace(self, sRef, begin, end, events):
+		"""
+		Replace the events of *sRef* beginning from *begin* to *end*.
+		"""
+		self.events[sRef].splice(begin, end, events, self._intern)
+
+	def finish(self):
+		# the reverse map of the string table is only needed while adding
+		self._stringIds = None
+
+	def window(self, sRef, begin, end):
+		"""
+		Returns:
+			positions of the events of *sRef* overlapping the time span from
+			*begin* to *end*
+		"""
+		events = self.events[sRef]
+		starts = events.begin
+		hi = len(starts)
+		i = bisect_right(starts, begin) - 1
+		if i < 0 or starts[i] + events.duration[i] <= begin:
+			i += 1
+		ret = []
+		while i < hi and starts[i] < end:
+			ret.append(i)
+			i += 1
+		return ret
+
+	def row(self, sRef, i):
+		"""
+		Returns:
+			event *i* of *sRef* as tuple of :py:data:`MULTI_CHANNEL_FIELDS`
+		"""
+		events = self.events[sRef]
+		strings = self.strings
+		return (events.eventId[i], events.begin[i], strings[events.title[i]], strings[events.shortDescription[i]], sRef, self.names[sRef], events.duration[i])
+
+
+class EPGSnapshot(object):
+	"""
+	See module documentation.
+	"""
+
+	def __init__(self):
+		self.current = None
+		self.building = False
+		# hours asked for since the last build
+		self.hours = SNAPSHOT_HOURS
+		self.builds = 0
+		self.refreshes = 0
+		self.lastBuildTime = 0
+		self.lastRefreshTime = 0
+		self.hits = 0
+		self.misses = 0
+
+	def _versions(self):
+		return dataVersions.get("epg")[0], dataVersions.get("bouquets")
+
+	def _run(self, sRefs, lookup, done):
+		# calls lookup for CHUNK_SIZE services per reactor iteration
+		epgVersion = self._versions()[0]
+
+		def runNext():
+			if self._versions()[0] != epgVersion:
+				# EPG loaded or cleared meanwhile
+				self.building = False
+				return
+			chunk = sRefs[:CHUNK_SIZE]
+			del sRefs[:CHUNK_SIZE]
+			try:
+				for sRef in chunk:
+					lookup(sRef)
+			except Exception as e:
+				error("update failed: %s" % e, "EPGSnapshot")
+				self.building = False
+				return
+			if sRefs:
+				reactor.callLater(0, runNext)
+				return
+			self.building = False
+			done()
+		runNext()
+
+	def rebuild(self):
+		"""
+		Start a build unless one is running.
+		"""
+		if self.building:
+			return
+		self.building = True
+		started = time.time()
+		epgVersion, bouquetsVersion = self._versions()
+		try:
+			services = getBouquetServices()
+		except Exception as e:
+			error("cannot list the bouquet services: %s" % e, "EPGSnapshot")
+			self.building = False
+			return
+		names = dict(services)
+		hours = self.hours
+		self.hours = SNAPSHOT_HOURS
+		snapshot = Snapshot(int(started), epgVersion, bouquetsVersion, hours)
+		epgcache = eEPGCache.getInstance()
+		minutes = hours * 60
+
+		def lookup(sRef):
+			snapshot.addService(sRef, names[sRef], epgcache.lookupEvent([SNAPSHOT_FIELDS, (sRef, 0, -1, minutes)]) or [])
+
+		def done():
+			snapshot.finish()
+			self.current = snapshot
+			self.builds += 1
+			self.lastBuildTime = time.time() - started
+			print("[OpenWebif] [EPGSnapshot] %d events of %d services in %.2fs" % (len(snapshot), len(snapshot.services), self.lastBuildTime))
+		self._run([sRef for sRef, name in services], lookup, done)
+
+	def refresh(self):
+		"""
+		Look up the next :py:data:`NEAR_MINUTES` of all services of the
+		current snapshot again unless a build or refresh is running.
+		"""
+		snapshot = self.current
+		if self.building or snapshot is None:
+			return
+		self.building = True
+		started = time.time()
+		now = int(started)
+		end = min(now + NEAR_MINUTES * 60, snapshot.until)
+		epgcache = eEPGCache.getInstance()
+
+		def lookup(sRef):
+			events = epgcache.lookupEvent([SNAPSHOT_FIELDS, (sRef, 0, now, NEAR_MINUTES)]) or []
+			begins = [e[1] for e in events if e[0] and e[1] is not None]
+			# includes the event running now
+			snapshot.replace(sRef, min(begins + [now]), end, [e for e in events if e[1] is not None and e[1] < end])
+
+		def done():
+			# replaced strings stay in the table until the next build
+			snapshot.finish()
+			snapshot.refreshedAt = now
+			self.refreshes += 1
+			self.lastRefreshTime = time.time() - started
+		self._run(list(snapshot.services), lookup, done)
+
+	def get(self):
+		"""
+		Returns:
+			current snapshot or None if it is outdated; starts a build or
+			refresh if needed
+		"""
+		snapshot = self.current
+		epgVersion, bouquetsVersion = self._versions()
+		now = time.time()
+		if snapshot is None or snapshot.epgVersion != epgVersion:
+			self.current = snapshot = None
+			self.rebuild()
+		elif snapshot.bouquetsVersion != bouquetsVersion or now - snapshot.builtAt > REBUILD_INTERVAL or snapshot.until < snapshot.builtAt + self.hours * 3600:
+			# the old snapshot is still fine for the services it knows
+			self.rebuild()
+		elif now - snapshot.refreshedAt > NEAR_INTERVAL:
+			self.refresh()
+		return snapshot
+
+	def _widen(self, end):
+		# hours needed by the next build to answer up to *end* until it is rebuilt
+		hours = int((end - time.time() + REBUILD_INTERVAL) // 3600) + 1
+		self.hours = min(SNAPSHOT_MAX_HOURS, max(self.hours, hours))
+
+	def getMultiChannelEvents(self, sRefs, begintime, minutes):
+		"""
+		Events of the services *sRefs* overlapping *minutes* from
+		*begintime* (-1 for now), like
+		:py:meth:`Plugins.Extensions.OpenWebif.controllers.epg.EPG.getMultiChannelEvents`.
+
+		Returns:
+			list of EPGEvent or None if the snapshot cannot answer the query
+		"""
+		begin = int(time.time()) if begintime is None or begintime < 0 else int(begintime)
+		end = begin + int(minutes or 0) * 60
+		if minutes and end > time.time():
+			self._widen(end)
+		snapshot = self.get()
+		if snapshot is None or not minutes or begin < snapshot.builtAt or end > snapshot.until:
+			self.misses += 1
+			return None
+		events = snapshot.events
+		rows = []
+		for sRef in sRefs:
+			sRef = str(sRef)
+			if sRef not in events:
+				if isMarker(sRef):
+					continue
+				self.misses += 1
+				return None
+			rows.extend((sRef, i) for i in snapshot.window(sRef, begin, end))
+		self.hits += 1
+		layout = getFieldLayout(MULTI_CHANNEL_FIELDS)
+		fromFields = EPGEvent.fromFields
+		row = snapshot.row
+		return [fromFields(layout, row(sRef, i)) for sRef, i in rows]
+
+	def getStats(self):
+		snapshot = self.current
+		ret = {
+			"builds": self.builds,
+			"refreshes": self.refreshes,
+			"building": self.building,
+			"hours": self.hours,
+			"buildtime": round(self.lastBuildTime, 3),
+			"refreshtime": round(self.lastRefreshTime, 3),
+			"hits": self.hits,
+			"misses": self.misses
+		}
+		if snapshot is not None:
+			ret.update({
+				"services": len(snapshot.services),
+				"events": len(snapshot),
+				"strings": len(snapshot.strings),
+				"age": int(time.time() - snapshot.builtAt)
+			})
+		return ret
+
+
+epgSnapshot = EPGSnapshot()
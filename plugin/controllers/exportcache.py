@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+
+##########################################################################
+# OpenWebif: ExportCache
+##########################################################################
+# Copyright (C) 2011 - 2020 E2OpenPlugins
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston MA 02110-1301, USA.
+##########################################################################
+
+"""
+On-disk cache of the XMLTV and M3U exports of the tv bouquets.
+
+The files are written to :py:data:`EXPORT_PATH` in the background and
+served below `/export/` by :py:class:`ExportFile`, which handles
+`If-Modified-Since`, byte ranges and the gzip variant like the other
+static files. The exporter is started by the first request to `/export/`
+and then checks the data versions every :py:data:`CHECK_INTERVAL`
+seconds: the files are regenerated once the EPG or the bouquets have been
+changed and stayed unchanged for one interval, and at the latest after
+:py:data:`MAX_AGE` seconds, as the EPG is filled continuously.
+
+A file is written to a temporary name in slices of
+:py:data:`SLICE_TIME` seconds per reactor iteration and then renamed, so
+clients never see a partial file.
+"""
+
+from __future__ import print_function
+import os
+import time
+import zlib
+
+import six
+from six.moves.urllib.parse import unquote
+from enigma import eServiceCenter, eServiceReference
+from twisted.internet import reactor, defer
+from twisted.web import http, resource
+from Components.config import config
+
+from Plugins.Extensions.OpenWebif.controllers.xmltv import xmltvChunks, XMLTV_DAYS
+from Plugins.Extensions.OpenWebif.controllers.staticfile import PrecompressedFile
+from Plugins.Extensions.OpenWebif.controllers.epgsnapshot import isMarker
+from Plugins.Extensions.OpenWebif.controllers.dataversion import dataVersions
+from Plugins.Extensions.OpenWebif.controllers.defaults import getIP
+from Plugins.Extensions.OpenWebif.controllers.utilities import error
+
+#: directory of the exported files
+EXPORT_PATH = "/tmp/openwebif-export"  # nosec
+
+#: seconds between two version checks; changes must be stable this long
+CHECK_INTERVAL = 60
+
+#: seconds after which the files are regenerated anyway
+MAX_AGE = 3600
+
+#: seconds of work per reactor iteration while writing
+SLICE_TIME = 0.05
+
+#: Retry-After sent while the first export is written
+RETRY_AFTER = 60
+
+XMLTV_FILE = "epg.xml"
+M3U_FILE = "tv.m3u"
+
+
+def _tvBouquets():
+	from Plugins.Extensions.OpenWebif.controllers.models.services import getBouquets
+	return getBouquets("tv")["bouquets"]
+
+
+def m3uChunks(bouquets, host, port):
+	"""
+	Generate a M3U playlist of the services of *bouquets*.
+
+	Args:
+		bouquets: list of (bouquet reference, name)
+		host: address of the box
+		port: streaming port
+	Yields:
+		unicode strings
+	"""
+	yield u"#EXTM3U\n"
+	serviceHandler = eServiceCenter.getInstance()
+	for bRef, bName in bouquets:
+		content = serviceHandler.list(eServiceReference(bRef))
+		group = six.ensure_text(bName, errors="ignore").replace(u'"', u"'")
+		parts = []
+		for sRef, name in (content and content.getContent('SN', True)) or []:
+			if isMarker(sRef) or int(sRef.split(":")[1]) & 512:  # hidden
+				continue
+			name = six.ensure_text(name, errors="ignore")
+			fields = sRef.split(":", 10)
+			tvgId = u":".join(fields[:10]) + u":"
+			# stream URL of an IPTV service, without the trailing ":name"
+			stream = fields[10].split(":")[0] if len(fields) > 10 else u""
+			if u"//127.0.0.1%3" in stream:
+				# relay running on the box, like servicesm3u.tmpl
+				url = u"http://%s:%s" % (host, unquote(stream.split(u"//127.0.0.1%3")[-1])[1:])
+			elif stream:
+				# streamed through the box like the other services
+				url = u"http://%s:%d/%s%s" % (host, port, tvgId, stream)
+			else:
+				url = u"http://%s:%d/%s" % (host, port, tvgId)
+			parts.append(u'#EXTINF:-1 tvg-id="%s" tvg-name="%s" group-title="%s",%s\n%s\n' % (tvgId, name.replace(u'"', u"'"), group, name, url))
+		if parts:
+			yield u"".join(parts)
+
+
+class ExportCache(object):
+	"""
+	See module documentation.
+	"""
+
+	def __init__(self, path=EXPORT_PATH):
+		self.path = path
+		self.started = False
+		self.building = False
+		self.versions = None
+		self.exports = {}
+		self.failures = 0
+		self._seen = None
+		self._timer = None
+
+	def _versions(self):
+		return dataVersions.get("epg")[0], dataVersions.get("bouquets")
+
+	def start(self):
+		"""
+		Start the exporter unless it is running.
+		"""
+		if self.started:
+			return
+		self.started = True
+		try:
+			if not os.path.isdir(self.path):
+				os.makedirs(self.path)
+		except OSError as e:
+			error("cannot create '%s': %s" % (self.path, e), "ExportCache")
+		self.check()
+
+	def check(self):
+		self._timer = reactor.callLater(CHECK_INTERVAL, self.check)
+		versions = self._versions()
+		seen, self._seen = self._seen, versions
+		if self.building:
+			return
+		if self.versions is None:
+			self.export(versions)
+		elif versions != self.versions:
+			if versions == seen:
+				self.export(versions)
+			# else: still changing, wait for the next check
+		elif time.time() - min(e["generated"] for e in self.exports.values()) >= MAX_AGE:
+			self.export(versions)
+
+	def _writeFile(self, name, chunks, compress=False):
+		"""
+		Write the text chunks of a generator to *name* (and *name*.gz) in
+		slices.
+
+		Returns:
+			Deferred firing with the size of the file
+		"""
+		filename = os.path.join(self.path, name)
+		d = defer.Deferred()
+		out = open(filename + ".tmp", "wb")
+		gz = open(filename + ".gz.tmp", "wb") if compress else None
+		compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+		state = {"size": 0}
+
+		def cleanup():
+			for f in (out, gz):
+				if f is not None:
+					f.close()
+					try:
+						os.remove(f.name)
+					except OSError:
+						pass
+
+		def step():
+			deadline = time.time() + SLICE_TIME
+			try:
+				for part in chunks:
+					part = six.ensure_binary(part)
+					out.write(part)
+					state["size"] += len(part)
+					if compressor is not None:
+						gz.write(compressor.compress(part))
+					if time.time() > deadline:
+						reactor.callLater(0, step)
+						return
+				out.close()
+				if gz is not None:
+					gz.write(compressor.flush())
+					gz.close()
+					# the variant must not be older than the file
+					os.rename(gz.name, filename + ".gz")
+				os.rename(out.name, filename)
+			except Exception as e:
+				cleanup()
+				d.errback(e)
+				return
+			d.callback(state["size"])
+		step()
+		return d
+
+	@defer.inlineCallbacks
+	def export(self, versions):
+		"""
+		Regenerate all files.
+		"""
+		self.building = True
+		try:
+			bouquets = _tvBouquets()
+			lang = config.osd.language.value.split("_")[0]
+			jobs = [(XMLTV_FILE, xmltvChunks([bRef for bRef, bName in bouquets], lang, XMLTV_DAYS), True)]
+			if config.OpenWebif.auth_for_streaming.value:
+				# the credentials cannot be part of a shared file
+				self.exports.pop(M3U_FILE, None)
+				self._remove(M3U_FILE)
+			else:
+				jobs.append((M3U_FILE, m3uChunks(bouquets, getIP() or "127.0.0.1", config.OpenWebif.streamport.value), False))
+			for name, chunks, compress in jobs:
+				started = time.time()
+				size = yield self._writeFile(name, chunks, compress)
+				self.exports[name] = {
+					"generated": int(time.time()),
+					"duration": round(time.time() - started, 2),
+					"size": size
+				}
+				print("[OpenWebif] [ExportCache] %s: %d bytes in %.2fs" % (name, size, self.exports[name]["duration"]))
+			self.versions = versions
+		except Exception as e:
+			self.failures += 1
+			error("export failed: %s" % e, "ExportCache")
+			if self.versions is None:
+				# retry at the next check
+				self._seen = None
+		self.building = False
+
+	def _remove(self, name):
+		for filename in (name, name + ".gz"):
+			try:
+				os.remove(os.path.join(self.path, filename))
+			except OSError:
+				pass
+
+	def getStats(self):
+		return {
+			"started": self.started,
+			"building": self.building,
+			"failures": self.failures,
+			"files": dict((name, dict(e)) for name, e in self.exports.items())
+		}
+
+
+exportCache = ExportCache()
+
+
+class ExportPending(resource.Resource):
+	"""
+	Answer for an export which is not written yet.
+	"""
+	isLeaf = True
+
+	def render(self, request):
+		request.setResponseCode(http.SERVICE_UNAVAILABLE)
+		request.setHeader(b"retry-after", b"%d" % RETRY_AFTER)
+		request.setHeader(b"content-type", b"text/plain")
+		return b"Export pending"
+
+
+class ExportFile(PrecompressedFile):
+	"""
+	:py:class:`staticfile.PrecompressedFile` for :py:data:`EXPORT_PATH`;
+	starts the exporter and asks clients to revalidate.
+	"""
+	maxAge = 0
+
+	def getChild(self, path, request):
+		exportCache.start()
+		self.restat(False)
+		child = PrecompressedFile.getChild(self, path, request)
+		if child is self.childNotFound and exportCache.building and six.ensure_str(path) in (XMLTV_FILE, M3U_FILE, XMLTV_FILE + ".gz"):
+			return ExportPending()
+		return child
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+##########################################################################
+# OpenWebif: FragmentCache
+##########################################################################
+# Copyright (C) 2011 - 2020 E2OpenPlugins
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston MA 02110-1301, USA.
+##########################################################################
+
+"""
+Cache of rendered HTML fragments.
+
+Pages listed in `FRAGMENT_VERSIONS` of a controller only depend on the
+request arguments, the OpenWebif settings (theme, interface options), the
+language and the listed data versions. Their rendered output is kept
+under a key of all of these, so repeated requests skip both the data
+gathering of the handler and the template. The cache holds at most
+:py:data:`FRAGMENT_CACHE_BYTES` bytes and drops the least recently used
+fragments first.
+"""
+
+from Components.config import config
+
+from Plugins.Extensions.OpenWebif.controllers.dataversion import dataVersions
+from Plugins.Extensions.OpenWebif.controllers.utilities import LRUCache
+
+#: max. number of cached fragments
+FRAGMENT_CACHE_SIZE = 256
+
+#: max. summed size of the cached fragments
+FRAGMENT_CACHE_BYTES = 4 * 1024 * 1024
+
+
+def _sectionState(section):
+	state = []
+	for name, item in sorted(section.dict().items()):
+		if hasattr(item, "value"):
+			state.append((name, repr(item.value)))
+		elif hasattr(item, "dict"):
+			state.append((name, _sectionState(item)))
+	return tuple(state)
+
+
+def getContext():
+	"""
+	Returns:
+		hashable state of the settings and the language a fragment may
+		depend on
+	"""
+	return config.osd.language.value, _sectionState(config.OpenWebif)
+
+
+class FragmentCache(object):
+	"""
+	See module documentation.
+	"""
+
+	def __init__(self):
+		self.fragments = LRUCache(maxsize=FRAGMENT_CACHE_SIZE, maxweight=FRAGMENT_CACHE_BYTES, weigh=len)
+
+	def getKey(self, request, page, versions, context):
+		"""
+		Returns:
+			cache key of the fragment *page* for *request*
+		"""
+		args = tuple(sorted((key, tuple(values)) for key, values in request.args.items()))
+		return page, args, tuple(dataVersions.get(name, request) for name in versions), context
+
+	def get(self, key):
+		return self.fragments.get(key)
+
+	def set(self, key, out):
+		self.fragments.set(key, out)
+
+	def clear(self):
+		self.fragments.clear()
+
+	def getStats(self):
+		return self.fragments.stats()
+
+
+fragmentCache = FragmentCache()
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+
+##########################################################################
+# OpenWebif: MainContext
+##########################################################################
+# Copyright (C) 2011 - 2020 E2OpenPlugins
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston MA 02110-1301, USA.
+##########################################################################
+
+from __future__ import print_function
+import os
+import time
+
+from twisted.internet.utils import getProcessOutput
+from enigma import eEPGCache
+from Components.config import config
+from Tools.Directories import fileExists
+
+from Plugins.Extensions.OpenWebif.controllers.i18n import _
+from Plugins.Extensions.OpenWebif.controllers.defaults import getIP, HASAUTOTIMER, _isPluginInstalled
+from Plugins.Extensions.OpenWebif.controllers.utilities import error
+
+#: seconds the list of installed plugins and tools is kept
+EXTRAS_TTL = 300
+
+#: seconds the firewall state is kept, it is probed again on the next use
+FIREWALL_TTL = 60
+
+#: oscam / ncam version files, first match wins for the variant
+OSCAM_VERSION_FILES = ("/tmp/.ncam/ncam.version", "/tmp/.oscam/oscam.version")
+
+
+def _mtime(filename):
+	try:
+		return os.stat(filename).st_mtime
+	except OSError:
+		return None
+
+
+class MainContext(object):
+	"""
+	Cache for the parts of the main template context which are expensive
+	to determine.
+
+	Each item is kept until its TTL expires, its key changes or it is
+	invalidated explicitly. The oscam data is keyed by the modification
+	times of the oscam files. The firewall state is probed in the
+	background when it is used after its TTL expired; the previous state
+	is returned until the probe is done.
+	"""
+
+	def __init__(self):
+		self._items = {}
+		self._oscam = None
+		self._firewallChecked = 0
+		self._firewallProbing = False
+		self.firewallActive = False
+		self._notifiersAdded = False
+
+	def get(self, name, ttl, fnc, key=None):
+		"""
+		Return the cached item *name* or compute it with *fnc*.
+
+		Args:
+			name: item name
+			ttl: seconds the item is valid, None for no expiry
+			fnc: function without arguments computing the item
+			key: hashable value the item depends on (e.g. the language)
+		"""
+		now = time.time()
+		item = self._items.get(name)
+		if item is not None and item[1] == key and (item[0] is None or item[0] > now):
+			return item[2]
+		value = fnc()
+		self._items[name] = (None if ttl is None else now + ttl, key, value)
+		return value
+
+	def invalidate(self, name=None):
+		if name is None:
+			self._items.clear()
+			self._oscam = None
+		else:
+			self._items.pop(name, None)
+
+	def start(self):
+		"""
+		Register the config notifiers.
+		"""
+		if not self._notifiersAdded:
+			self._notifiersAdded = True
+			try:
+				config.plugins.Webinterface.http.port.addNotifier(self._configChanged, initial_call=False)
+			except (AttributeError, KeyError):
+				pass
+
+	def _configChanged(self, configElement=None):
+		self.invalidate("extras")
+
+	def getFirewallActive(self):
+		"""
+		Returns:
+			last known firewall state; starts a probe if it is older than
+			:py:data:`FIREWALL_TTL`
+		"""
+		if not self._firewallProbing and time.time() - self._firewallChecked > FIREWALL_TTL:
+			self._probeFirewall()
+		return self.firewallActive
+
+	def _probeFirewall(self):
+		def done(output):
+			self.firewallActive = b"policy DROP" in output
+
+		def failed(err):
+			self.firewallActive = False
+
+		def finished(result):
+			self._firewallProbing = False
+			self._firewallChecked = time.time()
+
+		self._firewallProbing = True
+		d = getProcessOutput("/bin/sh", ("-c", "iptables -L INPUT -n 2>/dev/null | head -1"), env=os.environ)
+		d.addCallbacks(done, failed)
+		d.addBoth(finished)
+		return d
+
+	def getEPGSearchCaps(self):
+		return self.get("epgsearchcaps", None, lambda: hasattr(eEPGCache, 'FULL_DESCRIPTION_SEARCH'))
+
+	def _getLcd4linuxExtra(self):
+		ip = getIP()
+		if ip is None or not _isPluginInstalled("LCD4linux", "WebSite"):
+			return None
+		lcd4linux_key = "lcd4linux/config"
+		if _isPluginInstalled("WebInterface"):
+			try:
+				lcd4linux_port = "http://" + ip + ":" + str(config.plugins.Webinterface.http.port.value) + "/"
+				lcd4linux_key = lcd4linux_port + 'lcd4linux/config'
+			except:  # nosec # noqa: E722
+				lcd4linux_key = None
+		if lcd4linux_key:
+			return {'key': lcd4linux_key, 'description': _("LCD4Linux Setup"), 'nw': '1'}
+		return None
+
+	def _getPluginExtras(self):
+		extras = []
+		if HASAUTOTIMER:
+			extras.append({'key': 'ajax/at', 'description': _('AutoTimers')})
+
+		extras.append({'key': 'ajax/bqe', 'description': _('BouquetEditor')})
+
+		try:
+			from Plugins.Extensions.EPGRefresh.EPGRefresh import epgrefresh  # noqa: F401
+			extras.append({'key': 'ajax/epgr', 'description': _('EPGRefresh')})
+		except ImportError:
+			pass
+
+		try:
+			# this will currenly only works if NO Webiterface plugin installed
+			# TODO: test if webinterface AND openwebif installed
+
+			# 'nw'='1' -> target _blank
+			# 'nw'='2' -> target popup
+			# 'nw'=None -> target _self
+
+			# syntax
+			# addExternalChild( (Link, Resource, Name, Version, HasGUI, WebTarget) )
+			# example addExternalChild( ("webadmin", root, "WebAdmin", 1, True, "_self") )
+
+			from Plugins.Extensions.WebInterface.WebChilds.Toplevel import loaded_plugins
+			for plugins in loaded_plugins:
+				if plugins[0] in ["fancontrol", "iptvplayer"]:
+					try:
+						extras.append({'key': plugins[0], 'description': plugins[2], 'nw': '2'})
+					except KeyError:
+						pass
+				elif len(plugins) > 4:
+					if plugins[4] == True:
+						try:
+							if len(plugins) > 5 and plugins[5] == "_self":
+								extras.append({'key': plugins[0], 'description': plugins[2]})
+							else:
+								extras.append({'key': plugins[0], 'description': plugins[2], 'nw': '1'})
+						except KeyError:
+							pass
+
+		except ImportError:
+			pass
+
+		if os.path.exists('/usr/bin/shellinaboxd'):
+			extras.append({'key': 'ajax/terminal', 'description': _('Terminal')})
+		return extras
+
+	def _computeExtras(self):
+		lcd4linux = self._getLcd4linuxExtra()
+		return (lcd4linux, self._getPluginExtras())
+
+	def getExtras(self, request):
+		"""
+		Return the list of extra menu entries for the given request.
+
+		The oscam / ncam entry depends on the host name used by the
+		client, the other entries are taken from the cache.
+		"""
+		# the descriptions are translated
+		lcd4linux, plugins = self.get("extras", EXTRAS_TTL, self._computeExtras, config.osd.language.value)
+		extras = [{'key': 'ajax/settings', 'description': _("Settings")}]
+		if lcd4linux:
+			extras.append(lcd4linux)
+
+		oscamwebif, port, variant = self.getOscam()
+		if oscamwebif and port is not None:
+			proto, port = port
+			url = "%s://%s:%s" % (proto, request.getRequestHostname(), port)
+			if variant == "oscam":
+				extras.append({'key': url, 'description': _("OSCam Webinterface"), 'nw': '1'})
+			elif variant == "ncam":
+				extras.append({'key': url, 'description': _("NCam Webinterface"), 'nw': '1'})
+
+		return extras + plugins
+
+	def getOscam(self):
+		"""
+		Parse the oscam / ncam version and config file unless they did
+		not change since the last call.
+
+		Returns:
+			(web interface enabled, (protocol, port) or None, variant)
+		"""
+		mtimes = tuple(_mtime(f) for f in OSCAM_VERSION_FILES)
+		if self._oscam is not None:
+			key, conffile, result, confmtime = self._oscam
+			if key == mtimes and (conffile is None or _mtime(conffile) == confmtime):
+				return result
+
+		conffile = None
+		try:
+			result, conffile = self._parseOscam()
+		except (IOError, OSError, IndexError) as e:
+			error("cannot parse oscam config: %s" % e, "MainContext")
+			result = (False, None, "oscam")
+		self._oscam = (mtimes, conffile, result, conffile and _mtime(conffile))
+		return result
+
+	def _parseOscam(self):
+		owebif, port, conffile, variant = oscamconfPath()
+
+		# Assume http until we know better ...
+		proto = "http"
+
+		# config file exists
+		if owebif and conffile is not None:
+			# oscam defaults to NOT to start the web interface unless a section for it exists, so reset port to None until we find one
+			port = None
+			with open(conffile, "r") as f:
+				for i in f.readlines():
+					if "httpport" in i.lower():
+						port = i.split("=")[1].strip()
+						if port[0] == '+':
+							proto = "https"
+							port = port[1:]
+
+		return (owebif, None if port is None else (proto, port), variant), conffile
+
+
+def oscamconfPath():
+	# Find and parse running oscam
+	opath = None
+	owebif = False
+	oport = None
+	variant = "oscam"
+	for file in OSCAM_VERSION_FILES:
+		if fileExists(file):  # nosec
+			if "ncam" in file:
+				variant = "ncam"
+			else:
+				variant = "oscam"
+
+			conffile = file.split('/')[-1].replace("version", "conf")
+
+			data = open(file, "r").readlines()  # nosec
+			for i in data:
+				if "configdir:" in i.lower():
+					opath = i.split(":")[1].strip() + "/" + conffile
+					if not fileExists(opath):
+						opath = None
+				elif "web interface support:" in i.lower():
+					owebif = i.split(":")[1].strip()
+					if owebif == "yes":
+						owebif = True
+				elif "webifport:" in i.lower():
+					oport = i.split(":")[1].strip()
+					if oport == "0":
+						oport = None
+				else:
+					continue
+	return owebif, oport, opath, variant
+
+
+mainContext = MainContext()
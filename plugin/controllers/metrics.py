@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+##########################################################################
+# OpenWebif: Metrics
+##########################################################################
+# Copyright (C) 2011 - 2020 E2OpenPlugins
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston MA 02110-1301, USA.
+##########################################################################
+
+"""
+Per handler request metrics in fixed bucket histograms, exported in the
+Prometheus text exposition format (version 0.0.4).
+
+Timings of a request are collected on the request object (see
+:py:func:`addTiming`) and recorded once the request has finished.
+"""
+
+import time
+from bisect import bisect_left
+
+#: upper bounds (seconds) of the latency buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+#: upper bounds (bytes) of the response size buckets
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+#: timings collected per request, see :py:func:`addTiming`
+TIMINGS = ("handler", "template", "serialization")
+
+METRIC_PREFIX = "openwebif_"
+
+
+class Histogram(object):
+	__slots__ = ("bounds", "counts", "sum", "count")
+
+	def __init__(self, bounds):
+		self.bounds = bounds
+		self.counts = [0] * (len(bounds) + 1)
+		self.sum = 0
+		self.count = 0
+
+	def observe(self, value):
+		self.counts[bisect_left(self.bounds, value)] += 1
+		self.sum += value
+		self.count += 1
+
+	def exposition(self, name, labels):
+		lines = []
+		cumulative = 0
+		for bound, count in zip(self.bounds, self.counts):
+			cumulative += count
+			lines.append('%s_bucket{%s,le="%s"} %d' % (name, labels, bound, cumulative))
+		lines.append('%s_bucket{%s,le="+Inf"} %d' % (name, labels, self.count))
+		lines.append('%s_sum{%s} %s' % (name, labels, repr(self.sum)))
+		lines.append('%s_count{%s} %d' % (name, labels, self.count))
+		return lines
+
+
+class HandlerMetrics(object):
+	def __init__(self):
+		self.timings = dict((kind, Histogram(LATENCY_BUCKETS)) for kind in TIMINGS)
+		self.duration = Histogram(LATENCY_BUCKETS)
+		self.size = Histogram(SIZE_BUCKETS)
+		self.status = {}
+
+
+class Metrics(object):
+	"""
+	Registry of the request metrics keyed by controller and handler.
+	"""
+
+	def __init__(self):
+		self._handlers = {}
+		self.started = time.time()
+
+	def _get(self, controller, handler):
+		key = (controller, handler)
+		m = self._handlers.get(key)
+		if m is None:
+			m = self._handlers[key] = HandlerMetrics()
+		return m
+
+	def track(self, request, controller, handler):
+		"""
+		Record the metrics of *request* once it has been finished.
+
+		Args:
+			request (twisted.web.server.Request): HTTP request object
+			controller: controller label, e.g. `ApiController`
+			handler: handler label, e.g. `getservices`
+		"""
+		if getattr(request, "owifMetrics", None) is not None:
+			return
+		request.owifMetrics = (controller, handler, time.time())
+		request.notifyFinish().addBoth(self._finished, request)
+
+	def _finished(self, result, request):
+		controller, handler, start = request.owifMetrics
+		m = self._get(controller, handler)
+		m.duration.observe(time.time() - start)
+		timings = getattr(request, "owifTimings", {})
+		for kind in TIMINGS:
+			if kind in timings:
+				m.timings[kind].observe(timings[kind])
+		m.size.observe(request.sentLength)
+		code = request.code
+		m.status[code] = m.status.get(code, 0) + 1
+
+	def exposition(self):
+		"""
+		Returns:
+			all metrics in Prometheus text format
+		"""
+		lines = [
+			"# HELP %suptime_seconds Seconds since the metrics have been started." % METRIC_PREFIX,
+			"# TYPE %suptime_seconds gauge" % METRIC_PREFIX,
+			"%suptime_seconds %d" % (METRIC_PREFIX, time.time() - self.started)
+		]
+		items = sorted(self._handlers.items())
+
+		name = METRIC_PREFIX + "requests_total"
+		lines.append("# HELP %s Finished requests by status code." % name)
+		lines.append("# TYPE %s counter" % name)
+		for (controller, handler), m in items:
+			for code in sorted(m.status):
+				lines.append('%s{controller="%s",handler="%s",code="%s"} %d' % (name, controller, handler, code, m.status[code]))
+
+		histograms = [
+			("request_duration_seconds", "Time from handler call until the response has been finished.", lambda m: m.duration),
+			("handler_seconds", "Time spent in the P_* handler.", lambda m: m.timings["handler"]),
+			("template_seconds", "Time spent rendering templates.", lambda m: m.timings["template"]),
+			("serialization_seconds", "Time spent encoding JSON.", lambda m: m.timings["serialization"]),
+			("response_bytes", "Bytes sent (after content encoding).", lambda m: m.size),
+		]
+		for suffix, text, get in histograms:
+			name = METRIC_PREFIX + suffix
+			lines.append("# HELP %s %s" % (name, text))
+			lines.append("# TYPE %s histogram" % name)
+			for (controller, handler), m in items:
+				h = get(m)
+				if h.count:
+					lines.extend(h.exposition(name, 'controller="%s",handler="%s"' % (controller, handler)))
+		return "\n".join(lines) + "\n"
+
+	def reset(self):
+		self._handlers.clear()
+		self.started = time.time()
+
+
+def addTiming(request, kind, seconds):
+	"""
+	Add *seconds* to the timing *kind* (one of :py:data:`TIMINGS`) of
+	*request*.
+	"""
+	timings = getattr(request, "owifTimings", None)
+	if timings is None:
+		timings = request.owifTimings = {}
+	timings[kind] = timings.get(kind, 0) + seconds
+
+
+metrics = Metrics()
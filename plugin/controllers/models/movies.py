@@ -36,6 +36,8 @@ from Tools.Directories import fileExists
 from Screens.MovieSelection import defaultMoviePath
 from Plugins.Extensions.OpenWebif.controllers.i18n import _
 from Plugins.Extensions.OpenWebif.controllers.utilities import getUrlArg2, PY3
+from Plugins.Extensions.OpenWebif.controllers.dataversion import dataVersions
+from Plugins.Extensions.OpenWebif.controllers.timeformat import timeFormats, MINUTE
 
 try:
 	from Components.MovieList import moviePlayState as _moviePlayState
@@ -49,14 +51,15 @@ except ImportError:
 	pass
 
 
-def FuzzyTime2(t):
+def _fuzzyTime2(t):
 	d = localtime(t)
 	n = localtime()
+	offset = timeFormats.dayOffset(t)
 	dayOfWeek = (_("Mon"), _("Tue"), _("Wed"), _("Thu"), _("Fri"), _("Sat"), _("Sun"))
 
-	if d[:3] == n[:3]:
+	if offset == 0:
 		day = _("Today")
-	elif d[0] == n[0] and d[7] == n[7] - 1:
+	elif offset == -1:
 		day = _("Yesterday")
 	else:
 		day = dayOfWeek[d[6]]
@@ -71,6 +74,10 @@ def FuzzyTime2(t):
 	return date + ", " + timeres
 
 
+def FuzzyTime2(t):
+	return timeFormats.memo("FuzzyTime2", MINUTE, t, _fuzzyTime2)
+
+
 MOVIETAGFILE = "/etc/enigma2/movietags"
 TRASHDIRNAME = "movie_trash"
 
@@ -438,6 +445,7 @@ def getAllMovies():
 
 
 def removeMovie(session, sRef, Force=False):
+	dataVersions.bump("movies")
 	service = ServiceReference(sRef)
 	result = False
 	deleted = False
@@ -526,6 +534,7 @@ def removeMovie(session, sRef, Force=False):
 
 
 def _moveMovie(session, sRef, destpath=None, newname=None):
+	dataVersions.bump("movies")
 	service = ServiceReference(sRef)
 	result = True
 	errText = 'unknown Error'
@@ -643,6 +652,8 @@ def renameMovie(session, sRef, newname):
 
 
 def getMovieInfo(sRef=None, addtag=None, deltag=None, title=None, cuts=None, description=None, NewFormat=False):
+	if (addtag, deltag, title, cuts, description) != (None, None, None, None, None):
+		dataVersions.bump("movies")
 
 	if sRef is not None:
 		sRef = unquote(sRef)
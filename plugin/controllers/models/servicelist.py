@@ -12,6 +12,7 @@ from six.moves.urllib.parse import unquote
 from enigma import eDVBDB
 from Components.NimManager import nimmanager
 import Components.ParentalControl
+from Plugins.Extensions.OpenWebif.controllers.dataversion import dataVersions
 
 
 def reloadLameDB(self):
@@ -57,6 +58,8 @@ def reloadServicesLists(self, mode):
 		res = True
 		msg = "reloaded parentalcontrol white-/blacklist"
 
+	if res is True:
+		dataVersions.bump("bouquets")
 	return {
 		"result": res,
 		"message": msg
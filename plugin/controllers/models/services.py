@@ -31,7 +31,6 @@ from enigma import eServiceCenter, eServiceReference, iServiceInformation
 from Components.ParentalControl import parentalControl
 from Components.config import config
 from Components.NimManager import nimmanager
-import NavigationInstance
 from ServiceReference import ServiceReference
 from Screens.ChannelSelection import service_types_tv, service_types_radio, FLAG_SERVICE_NEW_FOUND
 from Screens.InfoBar import InfoBar
@@ -40,8 +39,14 @@ from Tools.Directories import fileExists
 from Plugins.Extensions.OpenWebif.controllers.models.info import GetWithAlternative, getOrbitalText, getOrb
 from Plugins.Extensions.OpenWebif.controllers.utilities import parse_servicereference, SERVICE_TYPE_LOOKUP, NS_LOOKUP, PY3
 from Plugins.Extensions.OpenWebif.controllers.i18n import _, tstrings
-from Plugins.Extensions.OpenWebif.controllers.defaults import PICON_PATH
 from Plugins.Extensions.OpenWebif.controllers.epg import EPG
+from Plugins.Extensions.OpenWebif.controllers.timeformat import timeFormats, DATE_RESOLUTION
+from Plugins.Extensions.OpenWebif.controllers.epgsnapshot import epgSnapshot, isMarker
+from Plugins.Extensions.OpenWebif.controllers.epgsearch import epgSearchIndex
+from Plugins.Extensions.OpenWebif.controllers.timerindex import timerIndex
+from Plugins.Extensions.OpenWebif.controllers.piconindex import piconIndex
+from Plugins.Extensions.OpenWebif.controllers.nownext import nowNextTracker
+from Plugins.Extensions.OpenWebif.controllers.bouquetindex import bouquetIndex
 
 try:
 	from Components.Converter.genre import getGenreStringLong
@@ -53,6 +58,14 @@ try:
 except ImportError:
 	from Plugins.Extensions.OpenWebif.backport.OrderedDict import OrderedDict
 
+#: default viewport of :py:func:`getEpgGrid`
+GRID_CHANNELS = 20
+GRID_MINUTES = 180
+
+#: max. viewport of :py:func:`getEpgGrid`
+GRID_MAX_CHANNELS = 100
+GRID_MAX_MINUTES = 24 * 60
+
 # The fields fetched by filterName() and convertDesc() all need to be
 # html-escaped, so do it there.
 #
@@ -748,37 +761,34 @@ def getTimerEventStatus(epgEvent, sRef, timers=None):
 	# does not necessarily have one belonging to an epg event id.
 
 	#catch ValueError
-	startTime = epgEvent.start['timestamp']
-	endTime = epgEvent.end['timestamp'] - 120  # TODO: find out what this 120 means
-	timerlist = {}
-	if not timers:
-		timers = NavigationInstance.instance.RecordTimer.timer_list
-	for timer in timers:
-		if str(timer.service_ref) not in timerlist:
-			timerlist[str(timer.service_ref)] = []
-		timerlist[str(timer.service_ref)].append(timer)
-	if sRef in timerlist:
-		for timer in timerlist[sRef]:
-			timerDetails = {}
-			if timer.begin <= startTime and timer.end >= endTime:
-				if timer.disabled:
-					timerDetails = {
-						'isEnabled': 0,
-						'basicStatus': 'timer disabled'
-					}
-				else:
-					timerDetails = {
-						'isEnabled': 1,
-						'isZapOnly': int(timer.justplay),
-						'basicStatus': 'timer'
-					}
-				try:
-					timerDetails['isAutoTimer'] = timer.isAutoTimer
-				except AttributeError:
-					timerDetails['isAutoTimer'] = 0
-				return timerDetails
-
-	return None
+	startTime = epgEvent.startTimestamp
+	endTime = epgEvent.endTimestamp - 120  # TODO: find out what this 120 means
+	if timers:
+		timer = None
+		for candidate in timers:
+			if str(candidate.service_ref) == sRef and candidate.begin <= startTime and candidate.end >= endTime:
+				timer = candidate
+				break
+	else:
+		timer = timerIndex.covering(sRef, startTime, endTime)
+	if timer is None:
+		return None
+	if timer.disabled:
+		timerDetails = {
+			'isEnabled': 0,
+			'basicStatus': 'timer disabled'
+		}
+	else:
+		timerDetails = {
+			'isEnabled': 1,
+			'isZapOnly': int(timer.justplay),
+			'basicStatus': 'timer'
+		}
+	try:
+		timerDetails['isAutoTimer'] = timer.isAutoTimer
+	except AttributeError:
+		timerDetails['isAutoTimer'] = 0
+	return timerDetails
 
 
 def getEvent(sRef, eventId, encode=True):
@@ -790,7 +800,7 @@ def getEvent(sRef, eventId, encode=True):
 	if epgEvent:
 		info['id'] = epgEvent.eventId
 		info['begin_str'] = epgEvent.start['time']
-		info['begin'] = epgEvent.start['timestamp']
+		info['begin'] = epgEvent.startTimestamp
 		info['end'] = epgEvent.end['time']
 		info['duration'] = epgEvent.duration['seconds']
 		info['title'] = filterName(epgEvent.title, encode)
@@ -841,7 +851,7 @@ def getChannelEpg(ref, begintime=-1, endtime=-1, encode=True, eventId=None):
 				if eventId:
 					ev['date'] = epgEvent.start['date']
 					ev['begin'] = epgEvent.start['time']
-					ev['begin_timestamp'] = epgEvent.start['timestamp']
+					ev['begin_timestamp'] = epgEvent.startTimestamp
 					ev['duration'] = epgEvent.duration['minutes']
 					ev['duration_sec'] = epgEvent.duration['seconds']
 					ev['end'] = epgEvent.end['time']
@@ -964,6 +974,38 @@ def getMultiChannelNowNextEpg(sList, encode=False):
 	return {"events": ret, "result": True}
 
 
+def getNowNextChanges(bqRef, since=0, encode=False):
+	"""
+	Now and next events of the services of the bouquet *bqRef* changed
+	since the tracker version *since*, and the progress of all now events.
+	"""
+	services = eServiceCenter.getInstance().list(eServiceReference(unquote(bqRef)))
+	if not services:
+		return {"events": [], "progress": {}, "result": False}
+	sRefs = [sRef for sRef in services.getContent('S') if not isMarker(sRef)]
+	version, changes = nowNextTracker.getChanges(sRefs, since)
+
+	def describe(event):
+		if event is None:
+			return None
+		return {
+			'id': event[0],
+			'begin_timestamp': event[1],
+			'duration_sec': event[2],
+			'title': filterName(event[3], encode),
+			'shortdesc': convertDesc(event[4], encode)
+		}
+
+	events = [{'sref': sRef, 'now': describe(current), 'next': describe(following)} for sRef, current, following in changes]
+	now = time()
+	progress = {}
+	for sRef in sRefs:
+		current = nowNextTracker.getNow(sRef)
+		if current is not None and current[2]:
+			progress[sRef] = min(100, int((now - current[1]) * 100 / current[2]))
+	return {"events": events, "progress": progress, "version": version, "result": True}
+
+
 def getBouquetNowNextEpg(bqRef, nowOrNext, encode=False):
 	bqRef = unquote(bqRef)
 	ret = []
@@ -1068,7 +1110,7 @@ def _getNowNextEpg(sRef, nowOrNext, encode=False):
 		}
 
 		if eventId:
-			ev['begin_timestamp'] = epgEvent.start['timestamp']
+			ev['begin_timestamp'] = epgEvent.startTimestamp
 			ev['duration_sec'] = epgEvent.duration['seconds']
 			ev['title'] = filterName(epgEvent.title, encode)
 			ev['shortdesc'] = convertDesc(epgEvent.shortDescription, encode)
@@ -1093,36 +1135,50 @@ def _getNowNextEpg(sRef, nowOrNext, encode=False):
 	return {"events": ret, "result": True}
 
 
+def _searchDate(t):
+	return "%s %s" % (tstrings[("day_" + strftime("%w", (localtime(t))))], strftime(_("%d.%m.%Y"), (localtime(t))))
+
+
 # TODO: add sort options
-def getSearchEpg(sstr, endtime=None, fulldesc=False, bouquetsonly=False, encode=False):
+def getSearchEpg(sstr, endtime=None, fulldesc=False, bouquetsonly=False, encode=False, offset=0, limit=None):
 	ret = []
-	epg = EPG()
-	epgEvents = epg.search(sstr, fulldesc)
+	if bouquetsonly:
+		# service references from TV bouquets
+		bsref = bouquetIndex.getMembers()
+
+	total = None
+	truncated = False
+	epgEvents = None
+	if bouquetsonly:
+		# ranked search in the index of the bouquet services, the EPG cache
+		# search covers all services
+		def accept(sRef, eventId, begin):
+			return sRef in bsref and (not endtime or begin <= endtime)
+
+		result = epgSearchIndex.search(sstr, fulldesc, accept, offset, limit)
+		if result is not None:
+			total, epgEvents, truncated = result
+
+	paged = total is not None
+	if epgEvents is None:
+		epg = EPG()
+		epgEvents = epg.search(sstr, fulldesc)
 
 	if epgEvents is not None:
 		# TODO : discuss #677
 		# events.sort(key = lambda x: (x[1],x[6])) # sort by date,sname
 		# events.sort(key = lambda x: x[1]) # sort by date
-		if bouquetsonly:
-			# collect service references from TV bouquets
-			bsref = {}
-			for service in getAllServices('tv', removeNameFromsref=True, showAll=False, nolastscanned=True)['services']:
-				for service2 in service['subservices']:
-					bsref[service2['servicereference']] = True
-				else:
-					bsref[service['servicereference']] = True
-
 		for epgEvent in epgEvents:
 			if bouquetsonly and not epgEvent[7] in bsref:
 				continue
 			ev = {}
 			ev['id'] = epgEvent[0]
-			ev['date'] = "%s %s" % (tstrings[("day_" + strftime("%w", (localtime(epgEvent[1]))))], strftime(_("%d.%m.%Y"), (localtime(epgEvent[1]))))
+			ev['date'] = timeFormats.memo("searchdate", DATE_RESOLUTION, epgEvent[1], _searchDate)
 			ev['begin_timestamp'] = epgEvent[1]
-			ev['begin'] = strftime("%H:%M", (localtime(epgEvent[1])))
+			ev['begin'] = timeFormats.strftime("%H:%M", epgEvent[1])
 			ev['duration_sec'] = epgEvent[2]
 			ev['duration'] = int(epgEvent[2] / 60)
-			ev['end'] = strftime("%H:%M", (localtime(epgEvent[1] + epgEvent[2])))
+			ev['end'] = timeFormats.strftime("%H:%M", epgEvent[1] + epgEvent[2])
 			ev['title'] = filterName(epgEvent[3], encode)
 			ev['shortdesc'] = convertDesc(epgEvent[4], encode)
 			ev['longdesc'] = convertDesc(epgEvent[5], encode)
@@ -1148,37 +1204,119 @@ def getSearchEpg(sstr, endtime=None, fulldesc=False, bouquetsonly=False, encode=
 			else:
 				ev['ns'] = ns
 
-	return {"events": ret, "result": True}
+	if not paged:
+		total = len(ret)
+		if limit is not None:
+			ret = ret[offset:offset + limit]
+	return {"events": ret, "result": True, "total": total, "truncated": truncated}
+
+
+# Fill out details for a timer matching an event
+def getTimerDetails(timer):
+	basicStatus = 'timer'
+	isEnabled = 1
+	isAutoTimer = -1
+	if hasattr(timer, "isAutoTimer"):
+		isAutoTimer = timer.isAutoTimer
+	if timer.disabled:
+		basicStatus = 'timer disabled'
+		isEnabled = 0
+	txt = "REC" if timer.justplay == 0 else "ZAP"
+	if timer.justplay == 1 and timer.always_zap == 1:
+		txt = "R+Z"
+	if isAutoTimer == 1:
+		txt = "AT"
+	if hasattr(timer, "ice_timer_id"):
+		if timer.ice_timer_id:
+			txt = "Ice"
+	timerDetails = {
+			'isEnabled': isEnabled,
+			'isZapOnly': int(timer.justplay),
+			'basicStatus': basicStatus,
+			'isAutoTimer': isAutoTimer,
+			'text': txt
+		}
+	return timerDetails
+
+
+def getEventTimer(sRef, epgEvent):
+	"""
+	Returns:
+		details of the (pending or processed) timer covering *epgEvent* or
+		None
+	"""
+	# Cut description
+	f = sRef.rfind("::")
+	if f != -1:
+		sRef = sRef[:f + 1]
+	timer = timerIndex.covering(sRef, epgEvent.startTimestamp, epgEvent.endTimestamp - 120, processed=True)
+	return timer and getTimerDetails(timer)
+
+
+def getEpgGrid(bRef, first=0, count=GRID_CHANNELS, begintime=-1, minutes=GRID_MINUTES):
+	"""
+	Cells of the multi EPG grid visible in a viewport.
+
+	Args:
+		bRef: bouquet reference
+		first: position of the first channel in the bouquet (markers not
+			counted)
+		count: number of channels
+		begintime: begin of the time window (-1 for now)
+		minutes: length of the time window
+	Returns:
+		channels of the viewport with the events overlapping the time
+		window, total number of channels of the bouquet
+	"""
+	services = eServiceCenter.getInstance().list(eServiceReference(bRef))
+	if not services:
+		return {"result": False, "channels": [], "total": 0}
+	sRefs = []
+	names = {}
+	for sRef, name in services.getContent('SN', True):
+		if not isMarker(sRef):
+			sRefs.append(sRef)
+			names[sRef] = name
+	total = len(sRefs)
+	sRefs = sRefs[first:first + count]
+	if begintime is None or begintime < 0:
+		begintime = int(time())
+	channels = OrderedDict()
+	for sRef in sRefs:
+		channels[sRef] = {
+			"sref": sRef,
+			"name": filterName(names[sRef]),
+			"picon": getPicon(sRef),
+			"events": []
+		}
+	epgEvents = epgSnapshot.getMultiChannelEvents(sRefs, begintime, minutes) if sRefs else []
+	if epgEvents is None:
+		epgEvents = EPG().getMultiChannelEvents(sRefs, begintime, minutes)
+	for epgEvent in epgEvents or []:
+		channel = channels.get(epgEvent.service['sRef'])
+		if channel is None or not epgEvent.eventId:
+			continue
+		timer = getEventTimer(channel["sref"], epgEvent)
+		channel["events"].append({
+			"id": epgEvent.eventId,
+			"begin_timestamp": epgEvent.startTimestamp,
+			"duration_sec": epgEvent.endTimestamp - epgEvent.startTimestamp,
+			"title": epgEvent.title,
+			"shortdesc": convertDesc(epgEvent.description),
+			"timer": timer,
+			"timerStatus": timer["basicStatus"] if timer else ""
+		})
+	return {
+		"result": True,
+		"channels": list(channels.values()),
+		"first": first,
+		"total": total,
+		"begin": begintime,
+		"end": begintime + minutes * 60
+	}
 
 
 def getMultiEpg(self, ref, begintime=-1, endtime=None, Mode=1):
-	# Fill out details for a timer matching an event
-	def getTimerDetails(timer):
-		basicStatus = 'timer'
-		isEnabled = 1
-		isAutoTimer = -1
-		if hasattr(timer, "isAutoTimer"):
-			isAutoTimer = timer.isAutoTimer
-		if timer.disabled:
-			basicStatus = 'timer disabled'
-			isEnabled = 0
-		txt = "REC" if timer.justplay == 0 else "ZAP"
-		if timer.justplay == 1 and timer.always_zap == 1:
-			txt = "R+Z"
-		if isAutoTimer == 1:
-			txt = "AT"
-		if hasattr(timer, "ice_timer_id"):
-			if timer.ice_timer_id:
-				txt = "Ice"
-		timerDetails = {
-				'isEnabled': isEnabled,
-				'isZapOnly': int(timer.justplay),
-				'basicStatus': basicStatus,
-				'isAutoTimer': isAutoTimer,
-				'text': txt
-			}
-		return timerDetails
-
 	ret = OrderedDict()
 	channelnames = {}
 	services = eServiceCenter.getInstance().list(eServiceReference(ref))
@@ -1186,8 +1324,10 @@ def getMultiEpg(self, ref, begintime=-1, endtime=None, Mode=1):
 		return {"events": ret, "channelnames": channelnames, "result": False, "slot": None}
 
 	sRefs = services.getContent('S')
-	epg = EPG()
-	epgEvents = epg.getMultiChannelEvents(sRefs, begintime, endtime)
+	epgEvents = epgSnapshot.getMultiChannelEvents(sRefs, begintime, endtime)
+	if epgEvents is None:
+		epg = EPG()
+		epgEvents = epg.getMultiChannelEvents(sRefs, begintime, endtime)
 	offset = None
 	picons = {}
 
@@ -1204,43 +1344,14 @@ def getMultiEpg(self, ref, begintime=-1, endtime=None, Mode=1):
 			offset = mktime((bt.tm_year, bt.tm_mon, bt.tm_mday, bt.tm_hour - bt.tm_hour % 2, 0, 0, -1, -1, -1))
 			lastevent = offset + 86399
 
-		# We want to display if an event is covered by a timer.
-		# To keep the costs low for a nested loop against the timer list, we
-		# partition the timers by service reference. For an event we then only
-		# have to check the part of the timers that belong to that specific
-		# service reference. Partition is generated here.
-		timerlist = {}
-		timers = self.session.nav.RecordTimer.timer_list + self.session.nav.RecordTimer.processed_timers
-		for timer in timers:
-			if timer.end >= begintime and timer.begin <= lastevent:
-				if str(timer.service_ref) not in timerlist:
-					timerlist[str(timer.service_ref)] = []
-				timerlist[str(timer.service_ref)].append(timer)
-
 		for epgEvent in epgEvents:
-			sref = epgEvent.service['sRef']
-			# Cut description
-			f = sref.rfind("::")
-			if f != -1:
-				sref = sref[:f + 1]
-			# If we can expect that events and timerlist are sorted by begin time,
-			# we should be able to always pick the first timer from the timers list
-			# and check if it belongs to the currently processed event.
-			# Unfortunately it's not that simple: timers might overlap, so we
-			# loop over the timers for the service reference of the event processed.
-			# Here we can eliminate the head of the list, when we find a matching timer:
-			# it only can contain timer entries older than the currently processed event.
-			timer = None
-			if sref in timerlist and len(timerlist[sref]) > 0:
-				for i, first in enumerate(timerlist[sref]):
-					if first.begin <= epgEvent.start['timestamp'] and epgEvent.end['timestamp'] - 120 <= first.end:
-						timer = getTimerDetails(first)
-						timerlist[sref] = timerlist[sref][i:]
-						break
+			# We want to display if an event is covered by a timer, the timer
+			# index answers this per service by bisection.
+			timer = getEventTimer(epgEvent.service['sRef'], epgEvent)
 
 			ev = {
 				'id': epgEvent.eventId,
-				'begin_timestamp': epgEvent.start['timestamp'],
+				'begin_timestamp': epgEvent.startTimestamp,
 				'title': epgEvent.title,
 				'shortdesc': convertDesc(epgEvent.description),
 				'ref': epgEvent.service['sRef'],
@@ -1267,100 +1378,102 @@ def getMultiEpg(self, ref, begintime=-1, endtime=None, Mode=1):
 				channelnames[channel] = filterName(epgEvent.service['name'])
 
 			if Mode == 1:
-				slot = int((epgEvent.start['timestamp'] - offset) / 7200)
+				slot = int((epgEvent.startTimestamp - offset) / 7200)
 
 				if slot < 0:
 					slot = 0
-				if slot < 12 and epgEvent.start['timestamp'] < lastevent:
+				if slot < 12 and epgEvent.startTimestamp < lastevent:
 					ret[channel][slot].append(ev)
 			else:
 				ret[channel][0].append(ev)
 	return {"events": ret, "channelnames": channelnames, "result": True, "picons": picons}
 
 
-def getPicon(sname, pp=None, defaultpicon=True):
-
-	if pp is None:
-		pp = PICON_PATH
-	if pp is not None:
-		# remove URL part
-		if ("://" in sname) or ("%3a//" in sname) or ("%3A//" in sname):
-			cname = unquote(sname.split(":")[-1])
-			sname = unquote(sname)
-			# sname = ":".join(sname.split(":")[:10]) -> old way
-			sname = ":".join(sname.split("://")[:1])
-			sname = GetWithAlternative(sname)
-			if PY3:
-				cname = normalize('NFKD', cname)
-			else:
-				cname = normalize('NFKD', six.text_type(cname, 'utf_8', errors='ignore')).encode('ASCII', 'ignore')
-			cname = re.sub('[^a-z0-9]', '', cname.replace('&', 'and').replace('+', 'plus').replace('*', 'star').replace(':', '').lower())
-			# picon by channel name for URL
-			if len(cname) > 0 and fileExists(pp + cname + ".png"):
-				return "/picon/" + cname + ".png"
-			if len(cname) > 2 and cname.endswith('hd') and fileExists(pp + cname[:-2] + ".png"):
-				return "/picon/" + cname[:-2] + ".png"
-			if len(cname) > 5:
-				series = re.sub(r's[0-9]*e[0-9]*$', '', cname)
-				if fileExists(pp + series + ".png"):
-					return "/picon/" + series + ".png"
-
+def _findPicon(sname, exists):
+	# remove URL part
+	if ("://" in sname) or ("%3a//" in sname) or ("%3A//" in sname):
+		cname = unquote(sname.split(":")[-1])
+		sname = unquote(sname)
+		# sname = ":".join(sname.split(":")[:10]) -> old way
+		sname = ":".join(sname.split("://")[:1])
 		sname = GetWithAlternative(sname)
-		if sname is not None:
-			pos = sname.rfind(':')
+		if PY3:
+			cname = normalize('NFKD', cname)
 		else:
-			return "/images/default_picon.png"
-		cname = None
-		if pos != -1:
-			cname = ServiceReference(sname[:pos].rstrip(':')).getServiceName()
-			sname = sname[:pos].rstrip(':').replace(':', '_') + ".png"
-		filename = pp + sname
-		if fileExists(filename):
-			return "/picon/" + sname
-		fields = sname.split('_', 8)
-		if len(fields) > 7 and not fields[6].endswith("0000"):
-			# remove "sub-network" from namespace
-			fields[6] = fields[6][:-4] + "0000"
-			sname = '_'.join(fields)
-			filename = pp + sname
-			if fileExists(filename):
-				return "/picon/" + sname
-		if len(fields) > 1 and fields[0] != '1':
-			# fallback to 1 for other reftypes
-			fields[0] = '1'
-			sname = '_'.join(fields)
-			filename = pp + sname
-			if fileExists(filename):
-				return "/picon/" + sname
-		if len(fields) > 3 and fields[2] != '1':
-			# fallback to 1 for tv services with nonstandard servicetypes
-			fields[2] = '1'
-			sname = '_'.join(fields)
-			filename = pp + sname
-			if fileExists(filename):
-				return "/picon/" + sname
-		if cname is not None:  # picon by channel name
-			cname1 = filterName(cname).replace('/', '_')
-			if not PY3:
-				cname1 = cname1.encode('utf-8', 'ignore')
-
-			if fileExists(pp + cname1 + ".png"):
-				return "/picon/" + cname1 + ".png"
-			if PY3:
-				cname = normalize('NFKD', cname)
-			else:
-				cname = normalize('NFKD', six.text_type(cname, 'utf_8', errors='ignore')).encode('ASCII', 'ignore')
-			cname = re.sub('[^a-z0-9]', '', cname.replace('&', 'and').replace('+', 'plus').replace('*', 'star').lower())
-			if len(cname) > 0:
-				filename = pp + cname + ".png"
-			if fileExists(filename):
-				return "/picon/" + cname + ".png"
-			if len(cname) > 2 and cname.endswith('hd') and fileExists(pp + cname[:-2] + ".png"):
-				return "/picon/" + cname[:-2] + ".png"
-	if defaultpicon:
-		return "/images/default_picon.png"
+			cname = normalize('NFKD', six.text_type(cname, 'utf_8', errors='ignore')).encode('ASCII', 'ignore')
+		cname = re.sub('[^a-z0-9]', '', cname.replace('&', 'and').replace('+', 'plus').replace('*', 'star').replace(':', '').lower())
+		# picon by channel name for URL
+		if len(cname) > 0 and exists(cname + ".png"):
+			return "/picon/" + cname + ".png"
+		if len(cname) > 2 and cname.endswith('hd') and exists(cname[:-2] + ".png"):
+			return "/picon/" + cname[:-2] + ".png"
+		if len(cname) > 5:
+			series = re.sub(r's[0-9]*e[0-9]*$', '', cname)
+			if exists(series + ".png"):
+				return "/picon/" + series + ".png"
+
+	sname = GetWithAlternative(sname)
+	if sname is not None:
+		pos = sname.rfind(':')
 	else:
 		return None
+	cname = None
+	if pos != -1:
+		cname = ServiceReference(sname[:pos].rstrip(':')).getServiceName()
+		sname = sname[:pos].rstrip(':').replace(':', '_') + ".png"
+	if exists(sname):
+		return "/picon/" + sname
+	fields = sname.split('_', 8)
+	if len(fields) > 7 and not fields[6].endswith("0000"):
+		# remove "sub-network" from namespace
+		fields[6] = fields[6][:-4] + "0000"
+		sname = '_'.join(fields)
+		if exists(sname):
+			return "/picon/" + sname
+	if len(fields) > 1 and fields[0] != '1':
+		# fallback to 1 for other reftypes
+		fields[0] = '1'
+		sname = '_'.join(fields)
+		if exists(sname):
+			return "/picon/" + sname
+	if len(fields) > 3 and fields[2] != '1':
+		# fallback to 1 for tv services with nonstandard servicetypes
+		fields[2] = '1'
+		sname = '_'.join(fields)
+		if exists(sname):
+			return "/picon/" + sname
+	if cname is not None:  # picon by channel name
+		cname1 = filterName(cname).replace('/', '_')
+		if not PY3:
+			cname1 = cname1.encode('utf-8', 'ignore')
+
+		if exists(cname1 + ".png"):
+			return "/picon/" + cname1 + ".png"
+		if PY3:
+			cname = normalize('NFKD', cname)
+		else:
+			cname = normalize('NFKD', six.text_type(cname, 'utf_8', errors='ignore')).encode('ASCII', 'ignore')
+		cname = re.sub('[^a-z0-9]', '', cname.replace('&', 'and').replace('+', 'plus').replace('*', 'star').lower())
+		if len(cname) > 0 and exists(cname + ".png"):
+			return "/picon/" + cname + ".png"
+		if len(cname) > 2 and cname.endswith('hd') and exists(cname[:-2] + ".png"):
+			return "/picon/" + cname[:-2] + ".png"
+	return None
+
+
+def getPicon(sname, pp=None, defaultpicon=True):
+	"""
+	Returns:
+		URL of the picon of the service *sname*, the default picon (or None
+		if *defaultpicon* is False) if there is none
+	"""
+	if pp is None or pp == piconIndex.path:
+		url = piconIndex.path and piconIndex.memo(sname, _findPicon, sname, piconIndex.exists)
+	else:
+		url = _findPicon(sname, lambda name: fileExists(pp + name))
+	if url is None and defaultpicon:
+		return "/images/default_picon.png"
+	return url
 
 
 def getParentalControlList():
@@ -35,29 +35,30 @@ from Plugins.Extensions.OpenWebif.controllers.models.info import GetWithAlternat
 from Plugins.Extensions.OpenWebif.controllers.i18n import _
 from Plugins.Extensions.OpenWebif.controllers.utilities import removeBad
 from Plugins.Extensions.OpenWebif.controllers.epg import EPG
+from Plugins.Extensions.OpenWebif.controllers.dataversion import dataVersions
+from Plugins.Extensions.OpenWebif.controllers.timeformat import timeFormats, MINUTE
 
 
 def adjustStartEndTimes(event):
-	begin = event.start['timestamp']
-	end = event.end['timestamp']
+	begin = event.startTimestamp
+	end = event.endTimestamp
 	begin -= config.recording.margin_before.value * 60
 	end += config.recording.margin_after.value * 60
 	return (begin, end)  # We should also report the margins!
 
 
-def FuzzyTime(t, inPast=False):
+def _fuzzyTime(t, inPast):
 	d = localtime(t)
-	nt = time()
 	n = localtime()
+	offset = timeFormats.dayOffset(t)
 	dayOfWeek = (_("Mon"), _("Tue"), _("Wed"), _("Thu"), _("Fri"), _("Sat"), _("Sun"))
 
-	if d[:3] == n[:3]:
+	if offset == 0:
 		# same day
 		date = _("Today")
-	elif d[0] == n[0] and d[7] == n[7] - 1 and inPast:
-		# won't work on New Year's day
+	elif offset == -1 and inPast:
 		date = _("Yesterday")
-	elif ((t - nt) < 7 * 86400) and (nt < t) and not inPast:
+	elif 0 < offset < 7 and not inPast:
 		# same week (must be future)
 		date = dayOfWeek[d[6]]
 	elif d[0] == n[0]:
@@ -75,6 +76,10 @@ def FuzzyTime(t, inPast=False):
 	return date, timeres
 
 
+def FuzzyTime(t, inPast=False):
+	return timeFormats.memo(("FuzzyTime", inPast), MINUTE, t, _fuzzyTime, inPast)
+
+
 def getTimers(session):
 	rt = session.nav.RecordTimer
 	epg = EPG()
@@ -254,6 +259,7 @@ def getTimers(session):
 
 
 def addTimer(session, serviceref, begin, end, name, description, disabled, justplay, afterevent, dirname, tags, repeated, recordingtype, vpsinfo=None, logentries=None, eit=0, always_zap=-1, pipzap=-1, allow_duplicate=1, autoadjust=-1):
+	dataVersions.bump("timers")
 	rt = session.nav.RecordTimer
 
 	if not dirname:
@@ -351,6 +357,7 @@ def addTimer(session, serviceref, begin, end, name, description, disabled, justp
 
 
 def addTimerByEventId(session, eventid, serviceref, justplay, dirname, tags, vpsinfo, always_zap, afterevent, pipzap, allow_duplicate, autoadjust, recordingtype):
+	dataVersions.bump("timers")
 	epg = EPG()
 	event = epg.getEventById(serviceref, eventid)
 	if event is None:
@@ -393,6 +400,7 @@ def addTimerByEventId(session, eventid, serviceref, justplay, dirname, tags, vps
 # !!! This new function must be tested !!!!
 # TODO: exception handling
 def editTimer(session, serviceref, begin, end, name, description, disabled, justplay, afterEvent, dirname, tags, repeated, channelOld, beginOld, endOld, recordingtype, vpsinfo, always_zap, pipzap, allow_duplicate, autoadjust):
+	dataVersions.bump("timers")
 	channelOld_str = ':'.join(str(channelOld).split(':')[:11])
 	rt = session.nav.RecordTimer
 	for timer in rt.timer_list + rt.processed_timers:
@@ -493,6 +501,7 @@ def editTimer(session, serviceref, begin, end, name, description, disabled, just
 
 
 def removeTimer(session, serviceref, begin, end, eit):
+	dataVersions.bump("timers")
 	serviceref_str = ':'.join(str(serviceref).split(':')[:11])
 	rt = session.nav.RecordTimer
 	for timer in rt.timer_list + rt.processed_timers:
@@ -517,6 +526,7 @@ def removeTimer(session, serviceref, begin, end, eit):
 
 
 def toggleTimerStatus(session, serviceref, begin, end):
+	dataVersions.bump("timers")
 	serviceref = unquote(serviceref)
 	serviceref_str = ':'.join(str(serviceref).split(':')[:11])
 	rt = session.nav.RecordTimer
@@ -562,6 +572,7 @@ def toggleTimerStatus(session, serviceref, begin, end):
 
 
 def cleanupTimer(session):
+	dataVersions.bump("timers")
 	session.nav.RecordTimer.cleanup()
 	return {
 		"result": True,
@@ -578,6 +589,7 @@ def writeTimerList(session):
 
 
 def recordNow(session, infinite):
+	dataVersions.bump("timers")
 	rt = session.nav.RecordTimer
 	serviceref = session.nav.getCurrentlyPlayingServiceReference().toString()
 
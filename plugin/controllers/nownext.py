@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+##########################################################################
+# OpenWebif: NowNext
+##########################################################################
+# Copyright (C) 2011 - 2020 E2OpenPlugins
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston MA 02110-1301, USA.
+##########################################################################
+
+"""
+Tracker of the now and next events of the requested services.
+
+The now/next state of a service only changes when its now event ends, so
+instead of querying the EPG cache for all services on every request, the
+services are kept in a heap ordered by the end of their now event and a
+single reactor timer fires at the earliest boundary. Only the services
+whose now event has ended are looked up again; as broadcasters update
+running events, every service is looked up at least every
+:py:data:`RECHECK_INTERVAL` seconds as well. Everything is looked up
+again when the EPG has been loaded or cleared.
+
+Each change increments the tracker version and is stamped with it, so a
+client passing the version of its last response only gets the services
+changed since then. The version starts at the start time in milliseconds,
+so versions of a previous run are lower than all stamps and the client
+gets all services again. Services not requested for :py:data:`IDLE_TIME`
+seconds are dropped.
+"""
+
+import time
+from heapq import heappush, heappop
+
+from enigma import eEPGCache
+from twisted.internet import reactor
+
+from Plugins.Extensions.OpenWebif.controllers.dataversion import dataVersions
+
+#: fields of the tracked events
+NOWNEXT_FIELDS = 'IBDTS'
+
+#: max. seconds between two lookups of a service
+RECHECK_INTERVAL = 600
+
+#: seconds after which services not requested any more are dropped
+IDLE_TIME = 3600
+
+
+class NowNextTracker(object):
+	"""
+	See module documentation.
+	"""
+
+	def __init__(self):
+		self.version = int(time.time() * 1000)
+		self.services = {}
+		self.lookups = 0
+		self.boundaries = 0
+		self._lastUsed = {}
+		self._heap = []
+		self._timer = None
+		self._epgVersion = None
+
+	def _lookup(self, sRef, now):
+		self.lookups += 1
+		current = following = None
+		for event in eEPGCache.getInstance().lookupEvent([NOWNEXT_FIELDS, (sRef, 0, -1), (sRef, 1, -1)]) or []:
+			if not event[0] or event[1] is None:
+				continue
+			if event[1] <= now < event[1] + (event[2] or 0):
+				current = current or event
+			elif event[1] > now and following is None:
+				following = event
+		return current, following
+
+	def _update(self, sRef, now, version):
+		current, following = self._lookup(sRef, now)
+		entry = self.services.get(sRef)
+		changed = entry is None or entry["now"] != current or entry["next"] != following
+		if changed:
+			entry = self.services[sRef] = {"now": current, "next": following, "version": version}
+		if current is not None:
+			end = current[1] + (current[2] or 0)
+		elif following is not None:
+			end = following[1]
+		else:
+			end = now + RECHECK_INTERVAL
+		entry["end"] = end = min(end, now + RECHECK_INTERVAL)
+		heappush(self._heap, (end, sRef))
+		return changed
+
+	def _refresh(self, sRefs, now):
+		version = self.version + 1
+		changed = False
+		for sRef in sRefs:
+			if self._update(sRef, now, version):
+				changed = True
+		if changed:
+			self.version = version
+
+	def _schedule(self):
+		if self._timer is not None and self._timer.active():
+			self._timer.cancel()
+		self._timer = None
+		if self._heap:
+			self._timer = reactor.callLater(max(0, self._heap[0][0] - time.time()) + 1, self._boundary)
+
+	def _boundary(self):
+		self._timer = None
+		self.boundaries += 1
+		now = time.time()
+		due = []
+		heap = self._heap
+		while heap and heap[0][0] <= now:
+			end, sRef = heappop(heap)
+			entry = self.services.get(sRef)
+			if entry is None or entry["end"] != end:
+				# outdated heap item
+				continue
+			if now - self._lastUsed.get(sRef, 0) > IDLE_TIME:
+				del self.services[sRef]
+				self._lastUsed.pop(sRef, None)
+				continue
+			due.append(sRef)
+		if due:
+			self._refresh(due, now)
+		self._schedule()
+
+	def _checkEPG(self, now):
+		epgVersion = dataVersions.get("epg")[0]
+		if epgVersion == self._epgVersion:
+			return False
+		self._epgVersion = epgVersion
+		self._heap = []
+		self._refresh(list(self.services.keys()), now)
+		return True
+
+	def getChanges(self, sRefs, since=0):
+		"""
+		Args:
+			sRefs: list of service references
+			since: tracker version of the last response for the same
+				services (0 for all)
+		Returns:
+			current version, list of (service reference, now event, next
+			event) changed since *since* with the events as tuples of
+			:py:data:`NOWNEXT_FIELDS` or None
+		"""
+		now = time.time()
+		reloaded = self._checkEPG(now)
+		if since > self.version:
+			# the clock has been set back since the start
+			since = 0
+		new = [sRef for sRef in sRefs if sRef not in self.services]
+		if new:
+			self._refresh(new, now)
+		for sRef in sRefs:
+			self._lastUsed[sRef] = now
+		if new or reloaded or self._timer is None:
+			self._schedule()
+		changes = []
+		for sRef in sRefs:
+			entry = self.services[sRef]
+			if entry["version"] > since:
+				changes.append((sRef, entry["now"], entry["next"]))
+		return self.version, changes
+
+	def getNow(self, sRef):
+		"""
+		Returns:
+			now event of the tracked service *sRef* or None
+		"""
+		entry = self.services.get(sRef)
+		return entry and entry["now"]
+
+	def getStats(self):
+		return {
+			"version": self.version,
+			"services": len(self.services),
+			"lookups": self.lookups,
+			"boundaries": self.boundaries,
+			"nextboundary": int(self._heap[0][0]) if self._heap else None
+		}
+
+
+nowNextTracker = NowNextTracker()
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+##########################################################################
+# OpenWebif: PiconIndex
+##########################################################################
+# Copyright (C) 2011 - 2020 E2OpenPlugins
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston MA 02110-1301, USA.
+##########################################################################
+
+"""
+Index of the picon directory.
+
+Resolving the picon of a service tries up to ten file names. Instead of
+probing the (often USB) picon directory for each of them, the names of
+all picons are read once into a set. The directory is scanned again when
+its modification time changes and when partitions are added or removed,
+which may change the picon directory itself.
+
+Resolved picon URLs are memoized per service reference; they also depend
+on service names and alternatives, so they are dropped when the bouquets
+version changes. Both are checked at most every :py:data:`CHECK_INTERVAL`
+seconds.
+"""
+
+from __future__ import print_function
+import os
+import time
+
+from Plugins.Extensions.OpenWebif.controllers.defaults import PICON_PATH, getPiconPath
+from Plugins.Extensions.OpenWebif.controllers.dataversion import dataVersions
+from Plugins.Extensions.OpenWebif.controllers.utilities import error
+
+#: seconds between two checks of the directory modification time
+CHECK_INTERVAL = 30
+
+#: extension of picon files
+PICON_EXT = ".png"
+
+#: upper limit of memoized URLs; the memo is dropped when reached
+MAX_ENTRIES = 16384
+
+
+def _mtime(path):
+	try:
+		return os.stat(path).st_mtime
+	except OSError:
+		return None
+
+
+class PiconIndex(object):
+	"""
+	See module documentation.
+	"""
+
+	def __init__(self, path=None):
+		self.path = path
+		self.names = frozenset()
+		self.scans = 0
+		self.hits = 0
+		self.misses = 0
+		self._mtime = None
+		self._checked = 0
+		self._urls = {}
+		self._bouquetsVersion = None
+		if path:
+			self.scan()
+
+	def refresh(self):
+		"""
+		Look up the picon directory again, e.g. after a partition change.
+
+		Returns:
+			picon directory or None
+		"""
+		self.path = getPiconPath()
+		self.scan()
+		return self.path
+
+	def scan(self):
+		names = []
+		mtime = None
+		if self.path:
+			mtime = _mtime(self.path)
+			try:
+				names = [name for name in os.listdir(self.path) if name.endswith(PICON_EXT)]
+			except OSError as e:
+				error("cannot read '%s': %s" % (self.path, e), "PiconIndex")
+		self.names = frozenset(names)
+		self._mtime = mtime
+		self._checked = time.time()
+		self._urls.clear()
+		self.scans += 1
+
+	def _check(self):
+		now = time.time()
+		if now - self._checked < CHECK_INTERVAL:
+			return
+		self._checked = now
+		if self.path and _mtime(self.path) != self._mtime:
+			self.scan()
+		bouquetsVersion = dataVersions.get("bouquets")
+		if bouquetsVersion != self._bouquetsVersion:
+			self._bouquetsVersion = bouquetsVersion
+			self._urls.clear()
+
+	def getVersion(self):
+		"""
+		Returns:
+			hashable value which changes along with the picon directory
+		"""
+		self._check()
+		return self.path, self._mtime, self.scans
+
+	def exists(self, name):
+		"""
+		Returns:
+			whether the picon directory contains *name*
+		"""
+		return name in self.names
+
+	def memo(self, key, fnc, *args):
+		"""
+		Memoized `fnc(*args)`; *key* must identify the arguments.
+		"""
+		self._check()
+		try:
+			value = self._urls[key]
+			self.hits += 1
+			return value
+		except KeyError:
+			self.misses += 1
+		value = fnc(*args)
+		if len(self._urls) >= MAX_ENTRIES:
+			self._urls.clear()
+		self._urls[key] = value
+		return value
+
+	def getStats(self):
+		lookups = self.hits + self.misses
+		return {
+			"path": self.path,
+			"picons": len(self.names),
+			"scans": self.scans,
+			"entries": len(self._urls),
+			"hits": self.hits,
+			"misses": self.misses,
+			"hitratio": round(float(self.hits) / lookups, 3) if lookups else 0
+		}
+
+
+piconIndex = PiconIndex(PICON_PATH)
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+
+##########################################################################
+# OpenWebif: PiconSprite
+##########################################################################
+# Copyright (C) 2011 - 2020 E2OpenPlugins
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston MA 02110-1301, USA.
+##########################################################################
+
+"""
+Picon sprite sheets per bouquet.
+
+A sprite contains the picons of all services of a bouquet scaled to one
+tile size, :py:data:`SPRITE_COLUMNS` tiles per row; services sharing a
+picon share the tile. To bound the memory used while rendering and the
+image size clients have to decode, a sheet has at most
+:py:data:`SPRITE_MAX_PIXELS` pixels and large bouquets are split into
+several sheets. Along with the PNGs a JSON map of the service references
+to the sheet and tile offsets is written to :py:data:`SPRITE_PATH`.
+
+The file names contain a hash of the bouquet, the tile size, the
+bouquets version and the picon directory state, so sprites are served
+with a long max-age below `/piconsprite/`. When the bouquets or picons
+change, the sprite is rebuilt in a thread and the previous one is
+returned until then.
+
+Scaling needs the Python Imaging Library; without it sprites are not
+available and clients keep loading the single picons.
+"""
+
+from __future__ import print_function
+import os
+import json
+import time
+import hashlib
+
+import six
+from enigma import eServiceCenter, eServiceReference
+from twisted.internet import threads
+
+from Plugins.Extensions.OpenWebif.controllers.piconindex import piconIndex
+from Plugins.Extensions.OpenWebif.controllers.epgsnapshot import isMarker
+from Plugins.Extensions.OpenWebif.controllers.dataversion import dataVersions
+from Plugins.Extensions.OpenWebif.controllers.utilities import error
+
+try:
+	from PIL import Image
+except ImportError:
+	Image = None
+
+#: directory of the sprites
+SPRITE_PATH = "/tmp/openwebif-sprites"  # nosec
+
+#: tiles per row
+SPRITE_COLUMNS = 16
+
+#: default and limits of the tile size (the usual picon size at most)
+SPRITE_SIZE = (100, 60)
+SPRITE_MIN_SIZE = 16
+SPRITE_MAX_WIDTH = 220
+SPRITE_MAX_HEIGHT = 132
+
+#: max. pixels of a sheet (16 MiB as RGBA)
+SPRITE_MAX_PIXELS = 2048 * 2048
+
+
+def _hash(*values):
+	return hashlib.sha1(six.ensure_binary("|".join(repr(v) for v in values))).hexdigest()[:16]  # nosec
+
+
+def tilesPerSheet(width, height):
+	"""
+	Returns:
+		number of *width* x *height* tiles of a sheet, whole rows of
+		:py:data:`SPRITE_COLUMNS` tiles
+	"""
+	rows = max(1, SPRITE_MAX_PIXELS // (width * height * SPRITE_COLUMNS))
+	return rows * SPRITE_COLUMNS
+
+
+def renderSprite(filenames, width, height, target):
+	"""
+	Paste the picons *filenames* scaled to *width* x *height* into sheets
+	written to *target* % sheet number; does not touch enigma and may run
+	in a thread. One sheet is held in memory at a time.
+
+	Returns:
+		list of the tile positions (sheet, x, y) in the order of
+		*filenames*, None for picons which cannot be read
+	"""
+	perSheet = tilesPerSheet(width, height)
+	offsets = []
+	for sheet, first in enumerate(range(0, max(1, len(filenames)), perSheet)):
+		names = filenames[first:first + perSheet]
+		rows = (len(names) + SPRITE_COLUMNS - 1) // SPRITE_COLUMNS
+		sprite = Image.new("RGBA", (width * max(1, min(len(names), SPRITE_COLUMNS)), height * max(1, rows)), (0, 0, 0, 0))
+		for i, filename in enumerate(names):
+			x = (i % SPRITE_COLUMNS) * width
+			y = (i // SPRITE_COLUMNS) * height
+			try:
+				picon = Image.open(filename).convert("RGBA")
+				picon.thumbnail((width, height), Image.ANTIALIAS if hasattr(Image, "ANTIALIAS") else Image.LANCZOS)
+			except (IOError, OSError, ValueError):
+				offsets.append(None)
+				continue
+			sprite.paste(picon, (x + (width - picon.size[0]) // 2, y + (height - picon.size[1]) // 2))
+			offsets.append((sheet, x, y))
+		filename = target % sheet
+		with open(filename + ".tmp", "wb") as f:
+			sprite.save(f, "PNG", optimize=True)
+		os.rename(filename + ".tmp", filename)
+		sprite = None
+	return offsets
+
+
+class PiconSprites(object):
+	"""
+	See module documentation.
+	"""
+
+	def __init__(self, path=SPRITE_PATH):
+		self.path = path
+		self.available = Image is not None
+		self.builds = 0
+		self.failures = 0
+		self.lastBuildTime = 0
+		self._current = {}
+		self._building = set()
+
+	def _bouquetPicons(self, bRef):
+		# runs in the main loop, getPicon uses enigma
+		from Plugins.Extensions.OpenWebif.controllers.models.services import getPicon
+		content = eServiceCenter.getInstance().list(eServiceReference(bRef))
+		picons = []
+		for sRef in (content and content.getContent('S', True)) or []:
+			if isMarker(sRef):
+				continue
+			url = getPicon(sRef, None, False)
+			if url and url.startswith("/picon/"):
+				picons.append((sRef, piconIndex.path + url[7:]))
+		return picons
+
+	def _load(self, name):
+		try:
+			with open(os.path.join(self.path, name + ".json")) as f:
+				return json.load(f)
+		except (IOError, OSError, ValueError):
+			return None
+
+	def get(self, bRef, width, height):
+		"""
+		Returns:
+			sprite description (sheet urls, tile size, map of service
+			references to sheet and tile offsets) or None if it is being
+			built
+		"""
+		if not self.available:
+			return None
+		key = _hash(bRef, width, height)
+		name = "%s-%s" % (key, _hash(dataVersions.get("bouquets"), piconIndex.getVersion()))
+		current = self._current.get(key)
+		if current is None or current["name"] != name:
+			info = self._load(name)
+			if info is not None:
+				self._current[key] = current = info
+			else:
+				self.build(bRef, width, height, key, name)
+		return current
+
+	def build(self, bRef, width, height, key, name):
+		if name in self._building:
+			return
+		self._building.add(name)
+		started = time.time()
+		try:
+			if not os.path.isdir(self.path):
+				os.makedirs(self.path)
+			picons = self._bouquetPicons(bRef)
+		except Exception as e:
+			self._building.discard(name)
+			self.failures += 1
+			error("cannot list the picons of '%s': %s" % (bRef, e), "PiconSprite")
+			return
+		filenames = sorted(set(filename for sRef, filename in picons))
+
+		def done(offsets):
+			tiles = dict(zip(filenames, offsets))
+			sheets = (len(filenames) + tilesPerSheet(width, height) - 1) // tilesPerSheet(width, height)
+			info = {
+				"name": name,
+				"urls": ["/piconsprite/%s-%d.png" % (name, sheet) for sheet in range(max(1, sheets))],
+				"width": width,
+				"height": height,
+				"generated": int(time.time()),
+				"picons": dict((sRef, tiles[filename]) for sRef, filename in picons if tiles[filename] is not None)
+			}
+			target = os.path.join(self.path, name + ".json")
+			with open(target + ".tmp", "w") as f:
+				json.dump(info, f)
+			os.rename(target + ".tmp", target)
+			self._current[key] = info
+			self._building.discard(name)
+			self.builds += 1
+			self.lastBuildTime = time.time() - started
+			self._removeOld(key, name)
+
+		def failed(err):
+			self._building.discard(name)
+			self.failures += 1
+			error("cannot build the sprite of '%s': %s" % (bRef, err.getErrorMessage()), "PiconSprite")
+
+		d = threads.deferToThread(renderSprite, filenames, width, height, os.path.join(self.path, name + "-%d.png"))
+		d.addCallback(done)
+		d.addErrback(failed)
+
+	def _removeOld(self, key, name):
+		for filename in os.listdir(self.path):
+			if filename.startswith(key + "-") and not filename.startswith(name):
+				try:
+					os.remove(os.path.join(self.path, filename))
+				except OSError:
+					pass
+
+	def getStats(self):
+		return {
+			"available": self.available,
+			"sprites": len(self._current),
+			"building": len(self._building),
+			"builds": self.builds,
+			"failures": self.failures,
+			"buildtime": round(self.lastBuildTime, 2)
+		}
+
+
+piconSprites = PiconSprites()
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+##########################################################################
+# OpenWebif: Profiler
+##########################################################################
+# Copyright (C) 2011 - 2020 E2OpenPlugins
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston MA 02110-1301, USA.
+##########################################################################
+
+"""
+On demand profiling of request handlers.
+
+Once started, the synchronous part of the next N matching requests
+(handler and template rendering) runs under `cProfile`. The stats of
+such a session are aggregated and kept in a ring of the last
+:py:data:`PROFILE_RING_SIZE` sessions.
+"""
+
+import time
+import marshal
+import pstats
+import cProfile
+from collections import deque
+
+#: number of finished profiling sessions kept
+PROFILE_RING_SIZE = 8
+
+#: upper limit for the number of requests of one session
+PROFILE_MAX_REQUESTS = 500
+
+#: sort keys accepted by :py:meth:`RequestProfiler.top`
+SORT_KEYS = ("cumulative", "tottime", "ncalls")
+
+
+class ProfileSession(object):
+	def __init__(self, sid, count, handler):
+		self.id = sid
+		self.count = count
+		self.handler = handler
+		self.started = time.time()
+		self.finished = None
+		self.requests = []
+		self.stats = None
+
+	def add(self, profile, uri, took):
+		if self.stats is None:
+			self.stats = pstats.Stats(profile)
+		else:
+			self.stats.add(profile)
+		self.requests.append({"uri": uri, "time": round(took, 4)})
+
+	def toDict(self):
+		return {
+			"id": self.id,
+			"handler": self.handler,
+			"count": self.count,
+			"started": int(self.started),
+			"finished": self.finished and int(self.finished),
+			"requests": self.requests
+		}
+
+
+class RequestProfiler(object):
+	"""
+	See module documentation.
+	"""
+
+	def __init__(self):
+		self.current = None
+		self.ring = deque(maxlen=PROFILE_RING_SIZE)
+		self._nextId = 1
+
+	def start(self, count, handler=None):
+		"""
+		Profile the next *count* requests, optionally only those of
+		*handler* (e.g. `P_epgmulti` or `epgmulti`).
+		"""
+		if handler and not handler.startswith("P_"):
+			handler = "P_" + handler
+		self.stop()
+		self.current = ProfileSession(self._nextId, max(1, min(count, PROFILE_MAX_REQUESTS)), handler)
+		self._nextId += 1
+		return self.current
+
+	def stop(self):
+		session = self.current
+		if session is not None:
+			self.current = None
+			session.finished = time.time()
+			if session.stats is not None:
+				self.ring.append(session)
+		return session
+
+	def wants(self, handler):
+		session = self.current
+		if session is None or handler == "P_profile":
+			return False
+		return session.handler is None or session.handler == handler
+
+	def run(self, handler, uri, fnc, *args):
+		"""
+		Call *fnc* with *args* under the profiler if the running session
+		wants *handler*, otherwise just call it.
+		"""
+		if not self.wants(handler):
+			return fnc(*args)
+		session = self.current
+		profile = cProfile.Profile()
+		start = time.time()
+		try:
+			return profile.runcall(fnc, *args)
+		finally:
+			session.add(profile, uri, time.time() - start)
+			if len(session.requests) >= session.count:
+				self.stop()
+
+	def getSession(self, sid=None):
+		"""
+		Finished session *sid* or the latest one.
+		"""
+		if sid is None:
+			return self.ring[-1] if self.ring else None
+		for session in self.ring:
+			if session.id == sid:
+				return session
+		return None
+
+	def top(self, session, limit=30, sort="cumulative"):
+		"""
+		Returns:
+			list of the *limit* functions with the highest *sort* value
+		"""
+		if sort not in SORT_KEYS:
+			sort = "cumulative"
+		field = {"ncalls": 1, "tottime": 2, "cumulative": 3}[sort]
+		rows = []
+		for (filename, line, name), (cc, nc, tt, ct, callers) in session.stats.stats.items():
+			rows.append((nc, tt, ct, filename, line, name))
+		rows.sort(key=lambda r: r[field - 1], reverse=True)
+		return [{
+			"function": name,
+			"file": filename,
+			"line": line,
+			"ncalls": nc,
+			"tottime": round(tt, 6),
+			"cumtime": round(ct, 6)
+		} for nc, tt, ct, filename, line, name in rows[:limit]]
+
+	def dump(self, session):
+		"""
+		Returns:
+			stats in the format written by :py:meth:`pstats.Stats.dump_stats`
+		"""
+		return marshal.dumps(session.stats.stats)
+
+	def getStatus(self):
+		return {
+			"running": self.current and self.current.toDict(),
+			"sessions": [s.toDict() for s in self.ring]
+		}
+
+
+requestProfiler = RequestProfiler()
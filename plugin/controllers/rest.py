@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
-import json
 import copy
+import time
 
 from twisted.web import resource
 
+from Plugins.Extensions.OpenWebif.controllers.serializer import writeJSON
+from Plugins.Extensions.OpenWebif.controllers.metrics import metrics, addTiming
+
 #: CORS - HTTP headers the client may use
 CORS_ALLOWED_CLIENT_HEADERS = [
     'Content-Type',
@@ -25,20 +28,19 @@ CORS_DEFAULT = {
 }
 
 
-def json_response(request, data, indent=1):
+def json_response(request, data, indent=None):
     """
-    Create a JSON representation for *data* and set HTTP headers indicating
+    Stream a JSON representation for *data* and set HTTP headers indicating
     that JSON encoded data is returned.
 
     Args:
         request (twisted.web.server.Request): HTTP request object
         data: response content
-        indent: indentation level or None
+        indent: indentation level or None for compact output
     Returns:
-        JSON representation of *data* with appropriate HTTP headers
+        server.NOT_DONE_YET
     """
-    request.setHeader("content-type", "application/json; charset=utf-8")
-    return json.dumps(data, indent=indent)
+    return writeJSON(request, data, indent)
 
 
 class RESTControllerSkeleton(resource.Resource):
@@ -56,6 +58,22 @@ class RESTControllerSkeleton(resource.Resource):
                 http_verbs.append(verb)
         self._cors_header['Access-Control-Allow-Methods'] = ','.join(http_verbs)
 
+    def render(self, request):
+        """
+        Dispatch to the render_* method and record the request metrics.
+
+        Args:
+            request (twisted.web.server.Request): HTTP request object
+        Returns:
+            HTTP response with headers
+        """
+        metrics.track(request, self.__class__.__name__, "render_" + request.method.decode("ascii", "replace"))
+        start = time.time()
+        try:
+            return resource.Resource.render(self, request)
+        finally:
+            addTiming(request, "handler", time.time() - start)
+
     def render_OPTIONS(self, request):
         """
         Render response for an HTTP OPTIONS request.
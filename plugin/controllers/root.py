@@ -39,7 +39,11 @@ from Plugins.Extensions.OpenWebif.controllers.BQE import BQEController
 from Plugins.Extensions.OpenWebif.controllers.transcoding import TranscodingController
 from Plugins.Extensions.OpenWebif.controllers.wol import WOLSetupController, WOLClientController
 from Plugins.Extensions.OpenWebif.controllers.file import FileController
-from Plugins.Extensions.OpenWebif.controllers.defaults import PICON_PATH, getPublicPath, VIEWS_PATH, setMobile, refreshPiconPath
+from Plugins.Extensions.OpenWebif.controllers.staticfile import PrecompressedFile
+from Plugins.Extensions.OpenWebif.controllers.exportcache import ExportFile, EXPORT_PATH
+from Plugins.Extensions.OpenWebif.controllers.piconsprite import SPRITE_PATH
+from Plugins.Extensions.OpenWebif.controllers.defaults import getPublicPath, VIEWS_PATH, setMobile
+from Plugins.Extensions.OpenWebif.controllers.piconindex import piconIndex
 from Plugins.Extensions.OpenWebif.controllers.utilities import getUrlArg
 
 
@@ -56,14 +60,16 @@ class RootController(BaseController):
 		self.putGZChild("ajax", AjaxController(session))
 		self.putChild2("file", FileController())
 		self.putChild2("grab", grabScreenshot(session))
+		self.putChild2("export", ExportFile(six.ensure_binary(EXPORT_PATH)))
+		self.putChild2("piconsprite", PrecompressedFile(six.ensure_binary(SPRITE_PATH)))
 		if os.path.exists(getPublicPath('mobile')):
 			self.putChild2("mobile", MobileController(session))
-			self.putChild2("m", static.File(getPublicPath() + "/mobile"))
+			self.putChild2("m", PrecompressedFile(getPublicPath() + "/mobile"))
 		for static_val in ('js', 'css', 'static', 'images', 'fonts'):
-			self.putChild2(static_val, static.File(six.ensure_binary(getPublicPath() + '/' + static_val)))
+			self.putChild2(static_val, PrecompressedFile(six.ensure_binary(getPublicPath() + '/' + static_val)))
 		for static_val in ('modern', 'themes', 'webtv', 'vxg'):
 			if os.path.exists(getPublicPath(static_val)):
-				self.putChild2(static_val, static.File(six.ensure_binary(getPublicPath() + '/' + static_val)))
+				self.putChild2(static_val, PrecompressedFile(six.ensure_binary(getPublicPath() + '/' + static_val)))
 
 		if os.path.exists('/usr/bin/shellinaboxd'):
 			if os.path.exists('/etc/vtiversion.info'):
@@ -77,8 +83,8 @@ class RootController(BaseController):
 		self.putChild2("transcoding", TranscodingController())
 		self.putChild2("wol", WOLClientController())
 		self.putChild2("wolsetup", WOLSetupController(session))
-		if PICON_PATH:
-			self.setPiconChild(PICON_PATH)
+		if piconIndex.path:
+			self.setPiconChild(piconIndex.path)
 		try:
 			from Plugins.Extensions.OpenWebif.controllers.NET import NetController
 			self.putChild2("net", NetController(session))
@@ -91,9 +97,8 @@ class RootController(BaseController):
 
 # TODO : test !!
 	def onPartitionChange(self, why, part):
-		refreshPiconPath()
-		if PICON_PATH:
-			self.setPiconChild(PICON_PATH)
+		if piconIndex.refresh():
+			self.setPiconChild(piconIndex.path)
 
 	def setPiconChild(self, pp):
 		self.putChild2("picon", static.File(six.ensure_binary(pp)))
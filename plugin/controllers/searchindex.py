@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+
+##########################################################################
+# OpenWebif: SearchIndex
+##########################################################################
+# Copyright (C) 2011 - 2020 E2OpenPlugins
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston MA 02110-1301, USA.
+##########################################################################
+
+"""
+Inverted full text index.
+
+Texts are folded (lower case, diacritics removed) and split into words.
+Titles and descriptions are indexed separately, the postings are arrays
+of document ids. Documents are grouped by a key (e.g. the service) which
+is replaced as a whole; removed documents are skipped until the postings
+are compacted.
+
+Queries match every word as a prefix and require all words to match.
+Hits are ranked by relevance (title before description, whole words
+before prefixes), then upcoming before past and by begin time.
+"""
+
+import re
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+
+#: weights of the matched fields
+TITLE_WEIGHT = 3
+TEXT_WEIGHT = 1
+
+#: bonus if a query word matches a whole word
+EXACT_BONUS = 1
+
+#: words shorter than this are not expanded as prefixes
+MIN_PREFIX = 2
+
+#: upper limit of words a query word is expanded to
+MAX_EXPANSIONS = 256
+
+#: letters not decomposed by NFKD
+FOLD_MAP = {
+	u"ß": u"ss", u"æ": u"ae", u"ø": u"o", u"œ": u"oe", u"ł": u"l", u"đ": u"d", u"ð": u"d", u"þ": u"th", u"ı": u"i"
+}
+
+_words = re.compile(r"\w+", re.UNICODE)
+
+
+def fold(text):
+	"""
+	Returns:
+		*text* in lower case without diacritics
+	"""
+	if isinstance(text, bytes):
+		text = text.decode("utf-8", "ignore")
+	text = text.lower()
+	try:
+		text.encode("ascii")
+		return text
+	except UnicodeEncodeError:
+		pass
+	text = unicodedata.normalize("NFKD", text)
+	return u"".join(FOLD_MAP.get(c, c) for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text):
+	"""
+	Returns:
+		list of the distinct folded words of *text* in order
+	"""
+	if not text:
+		return []
+	seen = set()
+	words = []
+	for word in _words.findall(fold(text)):
+		if word not in seen:
+			seen.add(word)
+			words.append(word)
+	return words
+
+
+def prepareDocuments(documents):
+	"""
+	Tokenize documents for :py:meth:`SearchIndex.setPreparedGroup`; does
+	not touch an index and may run in a thread.
+
+	Args:
+		documents: iterable of (payload, begin, duration, title, text)
+	Returns:
+		list of (payload, begin, duration, title words, text words)
+	"""
+	return [(payload, begin, duration, tokenize(title), tokenize(text)) for payload, begin, duration, title, text in documents]
+
+
+class SearchIndex(object):
+	"""
+	See module documentation.
+	"""
+
+	def __init__(self):
+		self.clear()
+
+	def clear(self):
+		self._docs = {}
+		self._groups = {}
+		self._title = {}
+		self._text = {}
+		self._sorted = []
+		self._newWords = []
+		self._removed = 0
+		self._nextId = 0
+
+	def __len__(self):
+		return len(self._docs)
+
+	def _post(self, postings, word, docId):
+		ids = postings.get(word)
+		if ids is None:
+			if word not in self._title and word not in self._text:
+				self._newWords.append(word)
+			ids = postings[word] = array('i')
+		ids.append(docId)
+
+	def setGroup(self, key, documents):
+		"""
+		Replace the documents of *key*.
+
+		Args:
+			key: group, e.g. service reference
+			documents: iterable of (payload, begin, duration, title, text)
+		"""
+		self.setPreparedGroup(key, prepareDocuments(documents))
+
+	def setPreparedGroup(self, key, documents):
+		"""
+		Replace the documents of *key* by documents returned by
+		:py:func:`prepareDocuments`.
+		"""
+		for docId in self._groups.pop(key, ()):
+			del self._docs[docId]
+			self._removed += 1
+		ids = []
+		docs = self._docs
+		title = self._title
+		text = self._text
+		post = self._post
+		for payload, begin, duration, titleWords, textWords in documents:
+			docId = self._nextId
+			self._nextId += 1
+			docs[docId] = (key, payload, begin or 0, duration or 0)
+			ids.append(docId)
+			for word in titleWords:
+				if word in title:
+					title[word].append(docId)
+				else:
+					post(title, word, docId)
+			for word in textWords:
+				if word in text:
+					text[word].append(docId)
+				else:
+					post(text, word, docId)
+		if ids:
+			self._groups[key] = ids
+		if self._removed > len(self._docs):
+			self.compact()
+
+	def removeGroup(self, key):
+		self.setGroup(key, ())
+
+	def groups(self):
+		return list(self._groups.keys())
+
+	def groupSize(self, key):
+		return len(self._groups.get(key, ()))
+
+	def compact(self):
+		"""
+		Drop removed documents from the postings.
+		"""
+		docs = self._docs
+		for postings in (self._title, self._text):
+			for word in list(postings.keys()):
+				ids = array('i', [docId for docId in postings[word] if docId in docs])
+				if ids:
+					postings[word] = ids
+				else:
+					del postings[word]
+		self._sorted = sorted(set(self._title) | set(self._text))
+		self._newWords = []
+		self._removed = 0
+
+	def _expand(self, word):
+		# words starting with *word* and whether there are more of them
+		if self._newWords:
+			# mostly sorted already, merged in linear time
+			self._sorted = sorted(self._sorted + self._newWords)
+			self._newWords = []
+		if len(word) < MIN_PREFIX:
+			return [word], False
+		words = self._sorted
+		i = bisect_left(words, word)
+		ret = []
+		while i < len(words) and words[i].startswith(word):
+			if len(ret) == MAX_EXPANSIONS:
+				return ret, True
+			ret.append(words[i])
+			i += 1
+		return ret, False
+
+	def _match(self, word, fulltext):
+		candidates, truncated = self._expand(word)
+		scores = {}
+		docs = self._docs
+		fields = ((self._title, TITLE_WEIGHT), (self._text, TEXT_WEIGHT)) if fulltext else ((self._title, TITLE_WEIGHT), )
+		for candidate in candidates:
+			bonus = EXACT_BONUS if candidate == word else 0
+			for postings, weight in fields:
+				for docId in postings.get(candidate, ()):
+					if docId in docs:
+						score = weight + bonus
+						if scores.get(docId, 0) < score:
+							scores[docId] = score
+		return scores, truncated
+
+	def search(self, query, fulltext=False, accept=None, offset=0, limit=None, now=None):
+		"""
+		Args:
+			query: search words
+			fulltext: also search the descriptions
+			accept: optional function called with (key, payload, begin)
+				returning whether a hit is wanted
+			offset: number of hits skipped
+			limit: max. number of hits returned
+			now: time stamp for the time ranking (default: current time)
+		Returns:
+			total number of hits, list of (key, payload) of the requested
+			page in rank order and whether hits are missing because a query
+			word matches the beginning of more than
+			:py:data:`MAX_EXPANSIONS` words
+		"""
+		words = tokenize(query)
+		if not words:
+			return 0, [], False
+		matches = []
+		truncated = False
+		for word in words:
+			scores, wordTruncated = self._match(word, fulltext)
+			matches.append(scores)
+			truncated = truncated or wordTruncated
+		matches.sort(key=len)
+		scores = matches[0]
+		for other in matches[1:]:
+			if not scores:
+				break
+			scores = dict((docId, score + other[docId]) for docId, score in scores.items() if docId in other)
+		if now is None:
+			now = time.time()
+		docs = self._docs
+		hits = []
+		for docId, score in scores.items():
+			key, payload, begin, duration = docs[docId]
+			if accept is None or accept(key, payload, begin):
+				hits.append((-score, begin + duration < now, begin, docId))
+		hits.sort()
+		end = None if limit is None else offset + limit
+		return len(hits), [docs[h[3]][:2] for h in hits[offset:end]], truncated
+
+	def getStats(self):
+		return {
+			"documents": len(self._docs),
+			"groups": len(self._groups),
+			"words": len(set(self._title) | set(self._text)),
+			"removed": self._removed
+		}
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+
+##########################################################################
+# OpenWebif: Serializer
+##########################################################################
+# Copyright (C) 2011 - 2020 E2OpenPlugins
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston MA 02110-1301, USA.
+##########################################################################
+
+"""
+JSON encoding and streaming JSON responses.
+
+The fastest installed JSON library is used (see :py:data:`JSON_BACKENDS`)
+with the stdlib `json` module as fallback for everything the fast
+encoder rejects. With the incremental stdlib / simplejson encoders the
+result of a request handler is encoded piecewise. The other backends
+encode lists with more than :py:data:`FAST_LIST_ITEMS` items (at the top
+level or within top level objects) item by item and everything else in
+one call, so large results are not held in memory twice. Either way the
+response is written in chunks of about :py:data:`JSON_CHUNK_SIZE` bytes
+whenever the transport asks for more data.
+"""
+
+from __future__ import print_function
+import json
+import time
+
+import six
+from zope.interface import implementer
+from twisted.internet.interfaces import IPullProducer
+from twisted.web import http, server
+
+from Plugins.Extensions.OpenWebif.controllers.utilities import error
+from Plugins.Extensions.OpenWebif.controllers.metrics import addTiming
+
+#: number of bytes collected before a chunk is written
+JSON_CHUNK_SIZE = 16384
+
+#: separators used for compact output
+COMPACT_SEPARATORS = (",", ":")
+
+#: lists longer than this are encoded item by item by the fast backends
+FAST_LIST_ITEMS = 64
+
+#: JSON libraries in order of preference
+JSON_BACKENDS = ("orjson", "ujson", "rapidjson", "simplejson", "json")
+
+
+def _stdlibEncoder(module):
+	def encoder(indent):
+		if indent is None:
+			return module.JSONEncoder(separators=COMPACT_SEPARATORS)
+		return module.JSONEncoder(indent=indent)
+	return encoder
+
+
+def _loadBackend(name):
+	"""
+	Returns:
+		(dumpb function or None for the incremental encoders, encoder
+		factory or None)
+	"""
+	if name == "orjson":
+		import orjson
+
+		def dumpb(data, indent):
+			option = orjson.OPT_NON_STR_KEYS
+			if indent:
+				option |= orjson.OPT_INDENT_2
+			return orjson.dumps(data, option=option)
+		return dumpb, None
+	elif name == "ujson":
+		import ujson
+
+		def dumpb(data, indent):
+			return six.ensure_binary(ujson.dumps(data, indent=indent or 0, escape_forward_slashes=False))
+		return dumpb, None
+	elif name == "rapidjson":
+		import rapidjson
+
+		def dumpb(data, indent):
+			return six.ensure_binary(rapidjson.dumps(data, indent=indent))
+		return dumpb, None
+	elif name == "simplejson":
+		import simplejson
+		return None, _stdlibEncoder(simplejson)
+	return None, _stdlibEncoder(json)
+
+
+def _selectBackend():
+	for name in JSON_BACKENDS:
+		try:
+			return (name, ) + _loadBackend(name)
+		except ImportError:
+			continue
+
+
+JSON_BACKEND, _fastDumpb, _encoder = _selectBackend()
+if _encoder is None:
+	_encoder = _stdlibEncoder(json)
+
+
+class Encoded(object):
+	"""
+	Already encoded JSON document.
+
+	Handlers may return an instance instead of the data itself, e.g. for
+	results which are cached anyway, so they are not encoded again for
+	every request.
+	"""
+	__slots__ = ("data", )
+
+	def __init__(self, data):
+		self.data = data
+
+	def __len__(self):
+		return len(self.data)
+
+
+def getIndent(request):
+	"""
+	Indentation requested by the client via the `indent` URL argument.
+
+	Returns:
+		indentation level or None for compact output
+	"""
+	value = request.args.get(b"indent")
+	if not value:
+		return None
+	try:
+		return max(0, int(value[0]))
+	except ValueError:
+		return 1
+
+
+def encode(data, indent=None):
+	"""
+	Encode *data* as JSON in one piece.
+
+	Args:
+		data: response content
+		indent: indentation level or None for compact output
+	Returns:
+		bytes
+	"""
+	if isinstance(data, Encoded):
+		return data.data
+	if _fastDumpb is not None:
+		try:
+			return _fastDumpb(data, indent)
+		except (TypeError, ValueError, OverflowError):
+			pass
+	return six.ensure_binary(_encoder(indent).encode(data))
+
+
+def dumps(data, indent=None):
+	"""
+	Like :py:func:`encode` but returns a native string.
+	"""
+	return six.ensure_str(encode(data, indent))
+
+
+def preEncode(data):
+	"""
+	Encode *data* (compact) for reuse in several responses.
+
+	Returns:
+		:py:class:`Encoded` instance
+	"""
+	return Encoded(encode(data))
+
+
+def _fastIterencode(data, depth=0):
+	"""
+	Encode *data* (compact) piecewise with the fast backend.
+
+	Yields:
+		bytes
+	"""
+	if isinstance(data, dict) and depth < 2 and all(isinstance(key, six.string_types) for key in data):
+		separator = b"{"
+		for key, value in data.items():
+			yield separator + encode(key) + b":"
+			separator = b","
+			for part in _fastIterencode(value, depth + 1):
+				yield part
+		yield b"}" if data else b"{}"
+	elif isinstance(data, (list, tuple)) and len(data) > FAST_LIST_ITEMS:
+		separator = b"["
+		for item in data:
+			yield separator + encode(item)
+			separator = b","
+		yield b"]"
+	else:
+		yield encode(data)
+
+
+@implementer(IPullProducer)
+class JSONProducer(object):
+	"""
+	Pull producer writing the JSON representation of *data* to *request*.
+	"""
+
+	def __init__(self, request, data, indent=None, chunksize=JSON_CHUNK_SIZE):
+		self.request = request
+		self.chunksize = chunksize
+		self._pending = None
+		self._done = False
+		if isinstance(data, Encoded):
+			self._iter = None
+			self._data = data.data
+			self._offset = 0
+		elif _fastDumpb is not None and indent is None:
+			self._iter = _fastIterencode(data)
+		else:
+			self._iter = _encoder(indent).iterencode(data)
+
+	def _nextChunk(self):
+		start = time.time()
+		try:
+			return self._encodeChunk()
+		finally:
+			addTiming(self.request, "serialization", time.time() - start)
+
+	def _encodeChunk(self):
+		if self._iter is None:
+			chunk = self._data[self._offset:self._offset + self.chunksize]
+			self._offset += len(chunk)
+			return chunk
+
+		parts = []
+		size = 0
+		for part in self._iter:
+			parts.append(six.ensure_binary(part))
+			size += len(part)
+			if size >= self.chunksize:
+				break
+		return b"".join(parts)
+
+	def start(self):
+		"""
+		Encode the first chunk, set the headers and start producing.
+
+		Errors within the first chunk (i.e. before anything has been
+		written) result in an HTTP 500 JSON error response.
+		"""
+		request = self.request
+		request.setHeader("content-type", "application/json; charset=utf-8")
+		try:
+			self._pending = self._nextChunk()
+		except Exception as exc:
+			request.setResponseCode(http.INTERNAL_SERVER_ERROR)
+			request.write(encode({"result": False, "request": six.ensure_str(request.path), "exception": repr(exc)}))
+			request.finish()
+			return server.NOT_DONE_YET
+		request.registerProducer(self, False)
+		return server.NOT_DONE_YET
+
+	def resumeProducing(self):
+		if self._done:
+			return
+		try:
+			if self._pending is not None:
+				chunk, self._pending = self._pending, None
+			else:
+				chunk = self._nextChunk()
+		except Exception as exc:
+			# headers are gone, the client can only detect the broken response
+			error("cannot encode response for '%s': %r" % (self.request.uri, exc), "Serializer")
+			self._done = True
+			self.request.unregisterProducer()
+			self.request.channel.loseConnection()
+			return
+
+		if chunk:
+			self.request.write(chunk)
+		else:
+			self._done = True
+			self.request.unregisterProducer()
+			self.request.finish()
+
+	def stopProducing(self):
+		self._done = True
+		self._iter = None
+		self._data = None
+
+
+def writeJSON(request, data, indent=None):
+	"""
+	Stream *data* as JSON to *request*.
+
+	Args:
+		request (twisted.web.server.Request): HTTP request object
+		data: response content
+		indent: indentation level or None for compact output
+	Returns:
+		server.NOT_DONE_YET
+	"""
+	return JSONProducer(request, data, indent).start()
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+##########################################################################
+# OpenWebif: StaticFile
+##########################################################################
+# Copyright (C) 2011 - 2020 E2OpenPlugins
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston MA 02110-1301, USA.
+##########################################################################
+
+"""
+Static files with precompressed variants.
+
+For every compressible file a `.gz` (and a `.br` if the brotli module is
+installed) sibling is created once in the background. Requests are
+answered with the best variant the client accepts, provided it carries
+the modification time of the file itself. Variants are stamped with it
+when written, as package upgrades may install files older than the
+variants of the previous version; stale variants are refreshed.
+"""
+
+from __future__ import print_function
+import os
+import gzip
+
+import six
+from twisted.web import static
+from twisted.internet import threads
+
+from Plugins.Extensions.OpenWebif.controllers.utilities import error
+
+try:
+	import brotli
+except ImportError:
+	brotli = None
+
+#: extensions of files worth compressing
+COMPRESSIBLE_EXTENSIONS = (".js", ".css", ".html", ".htm", ".svg", ".json", ".xml", ".txt", ".map", ".ttf", ".eot")
+
+#: smaller files are served as they are
+COMPRESS_MIN_SIZE = 1024
+
+#: max-age sent for static files (seconds)
+STATIC_MAX_AGE = 86400
+
+#: variants in order of preference: (content-encoding, file extension)
+VARIANTS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _isCompressible(filename):
+	return filename.endswith(COMPRESSIBLE_EXTENSIONS)
+
+
+def _isFresh(filename, source):
+	try:
+		return os.stat(filename).st_mtime == os.stat(source).st_mtime
+	except OSError:
+		return False
+
+
+def _write(filename, data, st):
+	with open(filename + ".tmp", "wb") as f:
+		f.write(data)
+	os.utime(filename + ".tmp", (st.st_atime, st.st_mtime))
+	os.rename(filename + ".tmp", filename)
+
+
+def compressFile(source):
+	"""
+	Create or refresh the compressed variants of *source*.
+
+	Returns:
+		number of variants written
+	"""
+	written = 0
+	# taken before reading, the variants carry the mtime of the data they contain
+	st = os.stat(source)
+	if st.st_size < COMPRESS_MIN_SIZE:
+		return written
+	data = None
+	for encoding, ext in VARIANTS:
+		if encoding == "br" and brotli is None:
+			continue
+		if _isFresh(source + ext, source):
+			continue
+		if data is None:
+			with open(source, "rb") as f:
+				data = f.read()
+		if encoding == "br":
+			_write(source + ext, brotli.compress(data), st)
+		else:
+			# mtime=0 keeps the output identical for identical input
+			with open(source + ext + ".tmp", "wb") as raw:
+				with gzip.GzipFile(filename="", mode="wb", compresslevel=9, fileobj=raw, mtime=0) as f:
+					f.write(data)
+			os.utime(source + ext + ".tmp", (st.st_atime, st.st_mtime))
+			os.rename(source + ext + ".tmp", source + ext)
+		written += 1
+	return written
+
+
+def compressTree(root):
+	"""
+	Create the missing or stale compressed variants below *root*.
+	"""
+	written = 0
+	for dirpath, dirnames, filenames in os.walk(root):
+		for fn in filenames:
+			if not _isCompressible(fn):
+				continue
+			try:
+				written += compressFile(os.path.join(dirpath, fn))
+			except (IOError, OSError) as e:
+				error("cannot compress '%s': %s" % (os.path.join(dirpath, fn), e), "StaticFile")
+	return written
+
+
+def precompress(roots):
+	"""
+	Compress the static trees *roots* in a thread.
+	"""
+	def compressAll():
+		return sum(compressTree(root) for root in roots if os.path.isdir(root))
+
+	def done(written):
+		if written:
+			print("[OpenWebif] [StaticFile] %d compressed files written" % written)
+
+	d = threads.deferToThread(compressAll)
+	d.addCallback(done)
+	d.addErrback(lambda err: error(err.getErrorMessage(), "StaticFile"))
+	return d
+
+
+class PrecompressedFile(static.File):
+	"""
+	:py:class:`twisted.web.static.File` serving the precompressed variant
+	the client accepts.
+	"""
+	contentEncodings = dict(static.File.contentEncodings)
+	contentEncodings[".br"] = "br"
+
+	#: max-age sent with the files (seconds)
+	maxAge = STATIC_MAX_AGE
+
+	def _acceptedVariant(self, request):
+		accept = request.getHeader(b"accept-encoding")
+		if not accept:
+			return None
+		accepted = [six.ensure_str(x).split(";")[0].strip() for x in accept.split(b",")]
+		source = six.ensure_str(self.path)
+		for encoding, ext in VARIANTS:
+			if encoding not in accepted:
+				continue
+			variant = source + ext
+			if _isFresh(variant, source):
+				return variant
+			if os.path.exists(variant):
+				# source has been changed
+				threads.deferToThread(compressFile, source).addErrback(lambda err: None)
+				return None
+		return None
+
+	def render_GET(self, request):
+		self.restat(False)
+		if not self.exists() or self.isdir() or not _isCompressible(six.ensure_str(self.basename())):
+			if self.exists() and not self.isdir():
+				request.setHeader(b"cache-control", b"public, max-age=%d" % self.maxAge)
+			return static.File.render_GET(self, request)
+
+		request.setHeader(b"vary", b"Accept-Encoding")
+		request.setHeader(b"cache-control", b"public, max-age=%d" % self.maxAge)
+		variant = self._acceptedVariant(request)
+		if variant is None:
+			return static.File.render_GET(self, request)
+		f = static.File(variant, defaultType=self.defaultType)
+		f.type = self.type
+		f.encoding = self.contentEncodings[variant[variant.rfind("."):]]
+		return f.render_GET(request)
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+
+##########################################################################
+# OpenWebif: TemplateCache
+##########################################################################
+# Copyright (C) 2011 - 2020 E2OpenPlugins
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston MA 02110-1301, USA.
+##########################################################################
+
+from __future__ import print_function
+import os
+import time
+# Python 3.12+ compatibility: imp module removed, use importlib
+try:
+	import importlib.util
+	HAS_IMPORTLIB = True
+except ImportError:
+	HAS_IMPORTLIB = False
+	import imp  # Fallback for older Python versions
+
+from Cheetah.Template import Template
+from twisted.internet import reactor, threads
+
+from Plugins.Extensions.OpenWebif.controllers.defaults import getViewsPath, VIEWS_PATH
+from Plugins.Extensions.OpenWebif.controllers.utilities import LRUCache, error
+from Plugins.Extensions.OpenWebif.controllers.viewcompiler import compileViews, loadManifest
+
+#: maximum number of template classes kept in memory
+TEMPLATE_CACHE_SIZE = 128
+
+#: view file extensions in order of preference
+TEMPLATE_EXTENSIONS = (".pyo", ".pyc", ".py", ".tmpl")
+
+#: views loaded by the warm-up pass after the web server has been started
+HOT_VIEWS = ("main", "ajax/channels", "ajax/multiepg", "ajax/timers", "ajax/movies")
+
+
+class TemplateCache(object):
+	"""
+	Process wide cache of compiled view classes.
+
+	Entries are keyed by the resolved view file (which differs between the
+	classic and the responsive interface, see
+	:py:func:`controllers.defaults.getViewsPath`) and are reloaded once the
+	file modification time changes. Rendering a cached view only creates a
+	new template instance.
+	"""
+
+	def __init__(self, maxsize=TEMPLATE_CACHE_SIZE):
+		self._classes = LRUCache(maxsize)
+		self._resolved = {}
+		self._timings = {}
+		self.reloads = 0
+		self.started = False
+
+	def resolve(self, path):
+		"""
+		Find the view file to be used for *path*.
+
+		Args:
+			path: view path without extension, e.g. `ajax/channels`
+		Returns:
+			(filename, stat result) tuple or (None, None)
+		"""
+		base = getViewsPath(path)
+		filename = self._resolved.get(base)
+		if filename is not None:
+			try:
+				return filename, os.stat(filename)
+			except OSError:
+				del self._resolved[base]
+
+		for ext in TEMPLATE_EXTENSIONS:
+			try:
+				st = os.stat(base + ext)
+			except OSError:
+				continue
+			self._resolved[base] = base + ext
+			return base + ext, st
+		return None, None
+
+	def _compile(self, filename, module):
+		if filename.endswith(".tmpl"):
+			return Template.compile(file=filename)
+
+		if HAS_IMPORTLIB:
+			spec = importlib.util.spec_from_file_location(module, filename)
+			template = importlib.util.module_from_spec(spec)
+			spec.loader.exec_module(template)
+		elif filename.endswith(".py"):
+			template = imp.load_source(module, filename)
+		else:
+			template = imp.load_compiled(module, filename)
+		return getattr(template, module, None)
+
+	def _lookup(self, path, module):
+		filename, st = self.resolve(path)
+		if filename is None:
+			return None
+
+		key = (filename, module)
+		entry = self._classes.get(key)
+		if entry is not None:
+			if entry[0] == st.st_mtime:
+				return entry
+			self.reloads += 1
+
+		start = time.time()
+		try:
+			cls = self._compile(filename, module)
+		except Exception as e:
+			error("cannot load template '%s': %s" % (filename, e), "TemplateCache")
+			raise
+		self._timing(filename)["load"] = round(time.time() - start, 4)
+		entry = (st.st_mtime, cls, filename.endswith(".tmpl"), filename)
+		self._classes.set(key, entry)
+		return entry
+
+	def _timing(self, filename):
+		name = os.path.relpath(filename, VIEWS_PATH).rsplit(".", 1)[0]
+		return self._timings.setdefault(name, {})
+
+	def getTemplateClass(self, path, module):
+		"""
+		Return the (cached) template class for *path* or None if the view
+		does not exist.
+
+		Args:
+			path: view path without extension, e.g. `ajax/channels`
+			module: name of the template class within the compiled view
+		"""
+		entry = self._lookup(path, module)
+		return entry and entry[1]
+
+	def render(self, path, module, args):
+		"""
+		Render the view *path* with the given search list data.
+
+		Returns:
+			rendered output or None if the view doesn't exist
+		"""
+		entry = self._lookup(path, module)
+		if entry is None or not callable(entry[1]):
+			return None
+		timing = self._timing(entry[3])
+		start = time.time()
+		if entry[2]:
+			out = str(entry[1](searchList=[args]))
+		else:
+			out = str(entry[1](searchList=args))
+		if "firstrender" not in timing:
+			timing["firstrender"] = round(time.time() - start, 4)
+		return out
+
+	def clear(self):
+		self._classes.clear()
+		self._resolved.clear()
+
+	def getStats(self):
+		stats = self._classes.stats()
+		stats["reloads"] = self.reloads
+		return stats
+
+	def getReport(self):
+		"""
+		Per view timings in seconds: `compile` (ahead-of-time compilation,
+		taken from the manifest), `load` (import or runtime compilation)
+		and `firstrender`.
+
+		Returns:
+			list of dicts, slowest first render first
+		"""
+		views = {}
+		for rel, entry in loadManifest(VIEWS_PATH).items():
+			if "compile" in entry:
+				views[rel[:-5]] = {"compile": entry["compile"]}
+		for name, timing in self._timings.items():
+			views.setdefault(name, {}).update(timing)
+		report = []
+		for name in sorted(views):
+			item = {"view": name}
+			item.update(views[name])
+			report.append(item)
+		report.sort(key=lambda x: x.get("firstrender", 0) + x.get("load", 0), reverse=True)
+		return report
+
+	def warmUp(self, views=HOT_VIEWS):
+		"""
+		Load the given views, one per reactor iteration, so that
+		requests are still served in between.
+		"""
+		views = list(views)
+
+		def loadNext():
+			if not views:
+				print("[OpenWebif] [TemplateCache] warm-up done")
+				return
+			path = views.pop(0)
+			try:
+				self.getTemplateClass(path, path.split("/")[-1])
+			except Exception as e:
+				error("warm-up of '%s' failed: %s" % (path, e), "TemplateCache")
+			reactor.callLater(0, loadNext)
+		loadNext()
+
+	def startup(self):
+		"""
+		Compile changed views in a thread, then run the warm-up pass.
+		Subsequent calls (e.g. on a web server restart) do nothing.
+		"""
+		if self.started:
+			return None
+		self.started = True
+
+		def compiled(result):
+			print("[OpenWebif] [TemplateCache] %d views compiled, %d unchanged, %d failed" % (result["compiled"], result["unchanged"], len(result["failed"])))
+			if result["compiled"]:
+				self.clear()
+			self.warmUp()
+
+		def failed(err):
+			error("view compilation failed: %s" % err.getErrorMessage(), "TemplateCache")
+			self.warmUp()
+
+		d = threads.deferToThread(compileViews, VIEWS_PATH)
+		d.addCallbacks(compiled, failed)
+		return d
+
+
+templateCache = TemplateCache()
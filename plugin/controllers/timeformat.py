@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+##########################################################################
+# OpenWebif: TimeFormat
+##########################################################################
+# Copyright (C) 2011 - 2020 E2OpenPlugins
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston MA 02110-1301, USA.
+##########################################################################
+
+"""
+Memoized formatting of time stamps.
+
+EPG, timer and movie lists format the same few start and end times over
+and over. Formatted values are cached per time bucket: a format which
+only shows the date is the same for a whole quarter hour (UTC offsets are
+multiples of 15 minutes), one showing hours and minutes for a whole
+minute, and only formats showing seconds are cached per second.
+
+Values relative to today ("Today", "Yesterday", ...) are cached as well,
+so the whole cache is dropped at midnight, when the time zone has been
+changed and when the language is changed. At most
+:py:data:`MAX_ENTRIES` values are kept, the least recently used ones are
+dropped first.
+"""
+
+import re
+import time
+from datetime import date
+
+from .utilities import LRUCache
+
+#: bucket sizes in seconds; the date is the same for a quarter hour in
+#: every time zone
+SECOND = 1
+MINUTE = 60
+DATE_RESOLUTION = 900
+
+#: upper limit of cached values
+MAX_ENTRIES = 8192
+
+#: strftime directives changing every second
+SECOND_DIRECTIVES = frozenset("cSTXrs+")
+
+#: strftime directives which are the same for a whole day
+DATE_DIRECTIVES = frozenset("aAbBhCdDeFgGjmuUVwWyYxnt%")
+
+_directive = re.compile(r"%[-_0^#]?[EO]?(.)")
+
+
+def resolutionOf(fmt):
+	"""
+	Returns:
+		bucket size (:py:data:`SECOND`, :py:data:`MINUTE` or
+		:py:data:`DATE_RESOLUTION`) for which the strftime format *fmt*
+		yields the same text
+	"""
+	resolution = DATE_RESOLUTION
+	for directive in _directive.findall(fmt):
+		if directive in SECOND_DIRECTIVES:
+			return SECOND
+		if directive not in DATE_DIRECTIVES:
+			resolution = MINUTE
+	return resolution
+
+
+class TimeFormatCache(object):
+	"""
+	See module documentation.
+	"""
+
+	def __init__(self):
+		self._values = LRUCache(maxsize=MAX_ENTRIES)
+		self._resolutions = {}
+		self._today = None
+		self._validUntil = 0
+		self._configured = False
+		self.invalidations = 0
+
+	def setup(self):
+		"""
+		Drop the cache whenever the language or the time zone is changed.
+		"""
+		if not self._configured:
+			from Components.config import config
+			self._configured = True
+			config.osd.language.addNotifier(self.clear, initial_call=False)
+			# the time zone settings differ between the images
+			for name in ("area", "val"):
+				try:
+					getattr(config.timezone, name).addNotifier(self.clear, initial_call=False)
+				except (AttributeError, KeyError):
+					pass
+
+	def clear(self, *args):
+		self._values.clear()
+		self._validUntil = 0
+		self.invalidations += 1
+
+	def _check(self):
+		now = time.time()
+		if now < self._validUntil:
+			return
+		if self._validUntil:
+			self.clear()
+		lt = time.localtime(now)
+		self._today = date(lt[0], lt[1], lt[2]).toordinal()
+		self._validUntil = time.mktime((lt[0], lt[1], lt[2] + 1, 0, 0, 0, 0, 0, -1))
+
+	def memo(self, kind, resolution, t, fnc, *args):
+		"""
+		Value of `fnc(t, *args)`, cached per *kind* and *resolution*
+		bucket of *t*.
+
+		Args:
+			kind: hashable key of the formatting function and its arguments
+			resolution: bucket size in seconds for which `fnc` yields the
+				same value
+			t: time stamp
+		"""
+		self._check()
+		key = (kind, int(t) // resolution)
+		value = self._values.get(key)
+		if value is None:
+			value = fnc(t, *args)
+			self._values.set(key, value)
+		return value
+
+	def resolution(self, fmt):
+		"""
+		Memoized :py:func:`resolutionOf`.
+		"""
+		resolution = self._resolutions.get(fmt)
+		if resolution is None:
+			resolution = self._resolutions[fmt] = resolutionOf(fmt)
+		return resolution
+
+	def strftime(self, fmt, t):
+		"""
+		Cached `time.strftime(fmt, time.localtime(t))`.
+		"""
+		return self.memo(fmt, self.resolution(fmt), t, _strftime, fmt)
+
+	def dayOffset(self, t):
+		"""
+		Returns:
+			number of days from today to the local date of *t* (-1 is
+			yesterday, 1 tomorrow)
+		"""
+		return self.memo(("day", ), DATE_RESOLUTION, t, _ordinal) - self._today
+
+	def getStats(self):
+		ret = self._values.stats()
+		ret["invalidations"] = self.invalidations
+		return ret
+
+
+def _strftime(t, fmt):
+	return time.strftime(fmt, time.localtime(t))
+
+
+def _ordinal(t):
+	return date.fromtimestamp(t).toordinal()
+
+
+timeFormats = TimeFormatCache()
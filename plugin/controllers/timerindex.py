@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+##########################################################################
+# OpenWebif: TimerIndex
+##########################################################################
+# Copyright (C) 2011 - 2020 E2OpenPlugins
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston MA 02110-1301, USA.
+##########################################################################
+
+"""
+Index of the record timers by service for the EPG views.
+
+The timers of a service are sorted by begin; alongside the running
+maximum of their end times is kept. The first timer covering a time span
+is the first one whose running maximum end reaches the end of the span,
+provided it begins before the span, so both are found by bisection.
+
+The index is rebuilt when the timers counter changes (bumped by the timer
+functions of OpenWebif and on timer state changes) or the number of timers
+changes. The modification time of timers.xml is only looked at every
+:py:data:`CHECK_INTERVAL` seconds, as the index is consulted once per event
+of an EPG response.
+"""
+
+import time
+from bisect import bisect_left, bisect_right
+
+import NavigationInstance
+
+from Plugins.Extensions.OpenWebif.controllers.dataversion import dataVersions
+
+#: seconds between two checks of the timers version including timers.xml
+CHECK_INTERVAL = 10
+
+
+class ServiceTimers(object):
+	"""
+	Timers of one service sorted by begin.
+	"""
+	__slots__ = ("begins", "maxEnds", "timers")
+
+	def __init__(self, timers):
+		self.timers = sorted(timers, key=lambda timer: timer.begin)
+		self.begins = [timer.begin for timer in self.timers]
+		self.maxEnds = []
+		maxEnd = None
+		for timer in self.timers:
+			if maxEnd is None or timer.end > maxEnd:
+				maxEnd = timer.end
+			self.maxEnds.append(maxEnd)
+
+	def covering(self, begin, end):
+		"""
+		Returns:
+			first timer (by begin) running from *begin* to *end* or None
+		"""
+		hi = bisect_right(self.begins, begin)
+		i = bisect_left(self.maxEnds, end, 0, hi)
+		return self.timers[i] if i < hi else None
+
+
+class TimerIndex(object):
+	"""
+	See module documentation.
+	"""
+
+	def __init__(self):
+		self._version = None
+		self._fileVersion = None
+		self._checked = 0
+		self._pending = {}
+		self._all = {}
+		self.builds = 0
+		self.lookups = 0
+
+	def _partition(self, timers):
+		services = {}
+		for timer in timers:
+			services.setdefault(str(timer.service_ref), []).append(timer)
+		return dict((sRef, ServiceTimers(serviceTimers)) for sRef, serviceTimers in services.items())
+
+	def _check(self):
+		recordTimer = NavigationInstance.instance.RecordTimer
+		now = time.time()
+		if now - self._checked >= CHECK_INTERVAL or now < self._checked:
+			self._checked = now
+			self._fileVersion = dataVersions.get("timers")
+		version = (self._fileVersion, dataVersions.getCounter("timers"), len(recordTimer.timer_list), len(recordTimer.processed_timers))
+		if version != self._version:
+			self._version = version
+			self._pending = self._partition(recordTimer.timer_list)
+			self._all = self._partition(recordTimer.timer_list + recordTimer.processed_timers)
+			self.builds += 1
+
+	def invalidate(self):
+		self._version = None
+		self._checked = 0
+
+	def covering(self, sRef, begin, end, processed=False):
+		"""
+		Args:
+			sRef: service reference as returned by `str(timer.service_ref)`
+			begin: time stamp
+			end: time stamp
+			processed: also look at the finished timers
+		Returns:
+			first timer of *sRef* running from *begin* to *end* or None
+		"""
+		self._check()
+		self.lookups += 1
+		serviceTimers = (self._all if processed else self._pending).get(sRef)
+		return serviceTimers and serviceTimers.covering(begin, end)
+
+	def getStats(self):
+		return {
+			"builds": self.builds,
+			"lookups": self.lookups,
+			"services": len(self._all),
+			"timers": sum(len(serviceTimers.timers) for serviceTimers in self._all.values())
+		}
+
+
+timerIndex = TimerIndex()
@@ -4,6 +4,7 @@ from __future__ import print_function
 import re
 import six
 import sys
+from collections import OrderedDict
 try:  # this is only for the testsuite
 	from Plugins.Extensions.OpenWebif.controllers.defaults import DEBUG_ENABLED
 except Exception:
@@ -356,6 +357,92 @@ def getEventInfoProvider(moviedb):
 	return providerData
 
 
+class LRUCache(object):
+	"""
+	Bounded mapping which drops the least recently used entries once more
+	than *maxsize* entries are stored. If a *weigh* function is given, the
+	summed weight of all values is kept below *maxweight* as well.
+
+	>>> cache = LRUCache(maxsize=2)
+	>>> cache.set('a', 1)
+	>>> cache.set('b', 2)
+	>>> cache.get('a')
+	1
+	>>> cache.set('c', 3)
+	>>> 'b' in cache
+	False
+	>>> cache.stats()['evictions']
+	1
+	"""
+
+	def __init__(self, maxsize=128, maxweight=None, weigh=None):
+		self.maxsize = maxsize
+		self.maxweight = maxweight
+		self.weigh = weigh
+		self.weight = 0
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self._data = OrderedDict()
+
+	def __len__(self):
+		return len(self._data)
+
+	def __contains__(self, key):
+		return key in self._data
+
+	def get(self, key, default=None):
+		try:
+			value = self._data.pop(key)
+		except KeyError:
+			self.misses += 1
+			return default
+		self._data[key] = value
+		self.hits += 1
+		return value
+
+	def set(self, key, value):
+		self.pop(key)
+		self._data[key] = value
+		if self.weigh is not None:
+			self.weight += self.weigh(value)
+		while self._data and (len(self._data) > self.maxsize or (self.maxweight is not None and self.weight > self.maxweight)):
+			oldest = next(iter(self._data))
+			self.pop(oldest)
+			self.evictions += 1
+
+	def pop(self, key, default=None):
+		try:
+			value = self._data.pop(key)
+		except KeyError:
+			return default
+		if self.weigh is not None:
+			self.weight -= self.weigh(value)
+		return value
+
+	def keys(self):
+		return list(self._data.keys())
+
+	def clear(self):
+		self._data.clear()
+		self.weight = 0
+
+	def stats(self):
+		lookups = self.hits + self.misses
+		ret = {
+			"entries": len(self._data),
+			"maxsize": self.maxsize,
+			"hits": self.hits,
+			"misses": self.misses,
+			"evictions": self.evictions,
+			"hitratio": round(float(self.hits) / lookups, 3) if lookups else 0.0
+		}
+		if self.weigh is not None:
+			ret["weight"] = self.weight
+			ret["maxweight"] = self.maxweight
+		return ret
+
+
 def error(text, context=""):
 	if context:
 		print("[OpenWebif] [%s] Error: %s" % (context, text))
@@ -0,0 +1,176 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+##########################################################################
+# OpenWebif: ViewCompiler
+##########################################################################
+# Copyright (C) 2011 - 2020 E2OpenPlugins
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston MA 02110-1301, USA.
+##########################################################################
+
+"""
+Ahead-of-time compilation of the Cheetah views.
+
+Every `.tmpl` below the views directory is compiled to a python module
+next to it. A manifest records size, mtime and SHA1 of each source so
+that only changed views are compiled again. This module only depends on
+Cheetah and may be run at build time::
+
+	python viewcompiler.py [-f] plugin/controllers/views
+"""
+
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import hashlib
+
+from Cheetah.Template import Template
+
+#: name of the manifest file within the views directory
+MANIFEST_NAME = "manifest.json"
+
+#: compiled outputs which take precedence over the `.tmpl` at runtime
+COMPILED_EXTENSIONS = (".pyo", ".pyc", ".py")
+
+
+def sourceHash(filename):
+	sha = hashlib.sha1()  # nosec
+	with open(filename, "rb") as f:
+		sha.update(f.read())
+	return sha.hexdigest()
+
+
+def loadManifest(root):
+	try:
+		with open(os.path.join(root, MANIFEST_NAME)) as f:
+			return json.load(f)
+	except (IOError, OSError, ValueError):
+		return {}
+
+
+def saveManifest(root, manifest):
+	filename = os.path.join(root, MANIFEST_NAME)
+	with open(filename + ".tmp", "w") as f:
+		json.dump(manifest, f, indent=1, sort_keys=True)
+	os.rename(filename + ".tmp", filename)
+
+
+def _isCompiled(base):
+	for ext in COMPILED_EXTENSIONS:
+		if os.path.exists(base + ext):
+			return True
+	return False
+
+
+def _isCurrent(entry, st, filename, base):
+	if not entry or not _isCompiled(base):
+		return False
+	if entry.get("size") == st.st_size and entry.get("mtime") == int(st.st_mtime):
+		return True
+	return entry.get("sha1") == sourceHash(filename)
+
+
+def compileView(filename):
+	"""
+	Compile a single view.
+
+	Args:
+		filename: path of the `.tmpl` file
+	Returns:
+		(seconds spent, SHA1 of the source)
+	"""
+	base = filename[:-5]
+	name = os.path.basename(base)
+	start = time.time()
+	code = Template.compile(file=filename, returnAClass=False, moduleName=name, className=name)
+	if not isinstance(code, bytes):
+		code = code.encode("utf-8")
+	with open(base + ".py.tmp", "wb") as f:
+		f.write(code)
+	os.rename(base + ".py.tmp", base + ".py")
+	# stale byte code would be preferred over the new module
+	for ext in (".pyo", ".pyc"):
+		if os.path.exists(base + ext):
+			os.remove(base + ext)
+	return time.time() - start, sourceHash(filename)
+
+
+def compileViews(root, force=False, verbose=False):
+	"""
+	Compile all changed views below *root* and update the manifest.
+
+	Args:
+		root: views directory
+		force: compile unchanged views, too
+		verbose: print each compiled view
+	Returns:
+		dict with the number of compiled and unchanged views and the
+		list of views which failed to compile
+	"""
+	manifest = loadManifest(root)
+	result = {"compiled": 0, "unchanged": 0, "failed": []}
+	seen = set()
+
+	for dirpath, dirnames, filenames in os.walk(root):
+		dirnames.sort()
+		for fn in sorted(filenames):
+			if not fn.endswith(".tmpl"):
+				continue
+			filename = os.path.join(dirpath, fn)
+			rel = os.path.relpath(filename, root).replace(os.sep, "/")
+			seen.add(rel)
+			st = os.stat(filename)
+			entry = manifest.get(rel)
+			if not force and _isCurrent(entry, st, filename, filename[:-5]):
+				entry["size"] = st.st_size
+				entry["mtime"] = int(st.st_mtime)
+				result["unchanged"] += 1
+				continue
+			try:
+				took, sha = compileView(filename)
+			except Exception as e:
+				print("[OpenWebif] [ViewCompiler] cannot compile '%s': %s" % (rel, e))
+				result["failed"].append(rel)
+				continue
+			if verbose:
+				print("[OpenWebif] [ViewCompiler] %s: %.3fs" % (rel, took))
+			manifest[rel] = {
+				"sha1": sha,
+				"size": st.st_size,
+				"mtime": int(st.st_mtime),
+				"compile": round(took, 4)
+			}
+			result["compiled"] += 1
+
+	for rel in list(manifest.keys()):
+		if rel not in seen:
+			del manifest[rel]
+	saveManifest(root, manifest)
+	return result
+
+
+if __name__ == "__main__":
+	args = sys.argv[1:]
+	force = "-f" in args
+	args = [a for a in args if a != "-f"]
+	if len(args) != 1:
+		print("usage: %s [-f] <views directory>" % sys.argv[0])
+		sys.exit(2)
+	res = compileViews(args[0], force=force, verbose=True)
+	print("[OpenWebif] [ViewCompiler] %d compiled, %d unchanged, %d failed" % (res["compiled"], res["unchanged"], len(res["failed"])))
+	sys.exit(1 if res["failed"] else 0)
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+##########################################################################
+# OpenWebif: Watchdog
+##########################################################################
+# Copyright (C) 2011 - 2020 E2OpenPlugins
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston MA 02110-1301, USA.
+##########################################################################
+
+"""
+Detection of stalls of the enigma2 main loop.
+
+A periodic timer on the reactor records when the main loop has last been
+responsive. A helper thread checks this time stamp; once the main loop
+has been blocked for longer than the threshold it captures the stack of
+the main thread. The stall is recorded together with the URI of the
+request being handled at that time when the main loop runs again.
+"""
+
+from __future__ import print_function
+import sys
+import time
+import threading
+import traceback
+
+from twisted.internet import task
+from Components.config import config
+
+from Plugins.Extensions.OpenWebif.controllers.utilities import error
+
+#: seconds between two ticks of the main loop timer
+TICK_INTERVAL = 0.1
+
+#: number of stalls kept (the longest ones)
+MAX_STALLS = 20
+
+#: stack frames kept per stall
+MAX_FRAMES = 30
+
+
+class StallWatchdog(object):
+	"""
+	See module documentation.
+	"""
+
+	def __init__(self):
+		self.threshold = 0.25
+		self.running = False
+		self.requestUri = None
+		self.stalls = []
+		self.count = 0
+		self.maxLag = 0
+		self._lastTick = 0
+		self._pending = None
+		self._tick = None
+		self._thread = None
+		self._mainThreadId = None
+		self._generation = 0
+		self._configured = False
+		self._lock = threading.Lock()
+
+	def setup(self):
+		"""
+		Start or stop the watchdog according to the settings, now and
+		whenever they are changed.
+		"""
+		if not self._configured:
+			self._configured = True
+			config.OpenWebif.stall_watchdog.addNotifier(self._configChanged)
+			config.OpenWebif.stall_threshold.addNotifier(self._configChanged, initial_call=False)
+
+	def _configChanged(self, configElement=None):
+		if config.OpenWebif.stall_watchdog.value:
+			self.start(config.OpenWebif.stall_threshold.value / 1000.0)
+		else:
+			self.stop()
+
+	def start(self, threshold):
+		"""
+		Start watching; must be called from the main loop.
+
+		Args:
+			threshold: stall threshold in seconds
+		"""
+		self.threshold = threshold
+		if self.running:
+			return
+		self.running = True
+		self._mainThreadId = threading.current_thread().ident
+		self._lastTick = time.time()
+		self._tick = task.LoopingCall(self._onTick)
+		self._tick.start(TICK_INTERVAL, now=False)
+		self._generation += 1
+		self._thread = threading.Thread(target=self._watch, args=(self._generation, ), name="OpenWebifWatchdog")
+		self._thread.daemon = True
+		self._thread.start()
+
+	def stop(self):
+		self.running = False
+		if self._tick is not None and self._tick.running:
+			self._tick.stop()
+		self._tick = None
+
+	def _onTick(self):
+		now = time.time()
+		lag = now - self._lastTick - TICK_INTERVAL
+		self._lastTick = now
+		if lag > self.maxLag:
+			self.maxLag = lag
+		with self._lock:
+			pending, self._pending = self._pending, None
+		if pending is not None:
+			pending["duration"] = round(lag + TICK_INTERVAL, 3)
+			self._record(pending)
+
+	def _record(self, stall):
+		self.count += 1
+		print("[OpenWebif] [Watchdog] main loop stalled for %.3fs (%s)" % (stall["duration"], stall["uri"]))
+		self.stalls.append(stall)
+		self.stalls.sort(key=lambda s: s["duration"], reverse=True)
+		del self.stalls[MAX_STALLS:]
+
+	def _watch(self, generation):
+		while self.running and generation == self._generation:
+			time.sleep(TICK_INTERVAL / 2)
+			blocked = time.time() - self._lastTick - TICK_INTERVAL
+			if blocked < self.threshold or self._pending is not None:
+				continue
+			try:
+				stall = self._capture()
+			except Exception as e:
+				error("cannot capture stack: %s" % e, "Watchdog")
+				continue
+			with self._lock:
+				# the main loop may have been resumed meanwhile
+				if time.time() - self._lastTick - TICK_INTERVAL >= self.threshold:
+					self._pending = stall
+
+	def _capture(self):
+		frame = sys._current_frames().get(self._mainThreadId)
+		stack = []
+		if frame is not None:
+			for filename, line, name, text in traceback.extract_stack(frame)[-MAX_FRAMES:]:
+				stack.append("%s:%d %s: %s" % (filename, line, name, text or ""))
+		return {
+			"time": int(time.time()),
+			"uri": self.requestUri,
+			"stack": stack
+		}
+
+	def getReport(self):
+		return {
+			"running": self.running,
+			"threshold": self.threshold,
+			"count": self.count,
+			"maxlag": round(self.maxLag, 3),
+			"stalls": self.stalls
+		}
+
+	def reset(self):
+		self.stalls = []
+		self.count = 0
+		self.maxLag = 0
+
+
+stallWatchdog = StallWatchdog()
@@ -28,7 +28,7 @@ from Components.config import config as comp_config
 from Screens.InfoBar import InfoBar
 
 from .models.info import getInfo, getCurrentTime, getStatusInfo, getFrontendStatus, testPipStatus
-from .models.services import getCurrentService, getBouquets, getServices, getSubServices, getSatellites, getBouquetEpg, getBouquetNowNextEpg, getMultiChannelNowNextEpg, getSearchEpg, getSimilarEpg, getChannelEpg, getNowNextEpg, getAllServices, getPlayableServices, getPlayableService, getParentalControlList, getEvent, getServiceRef, getPicon
+from .models.services import getCurrentService, getBouquets, getServices, getSubServices, getSatellites, getBouquetEpg, getBouquetNowNextEpg, getNowNextChanges, getMultiChannelNowNextEpg, getSearchEpg, getSimilarEpg, getEpgGrid, GRID_CHANNELS, GRID_MINUTES, GRID_MAX_CHANNELS, GRID_MAX_MINUTES, getChannelEpg, getNowNextEpg, getAllServices, getPlayableServices, getPlayableService, getParentalControlList, getEvent, getServiceRef, getPicon
 from .models.volume import getVolumeStatus, setVolumeUp, setVolumeDown, setVolumeMute, setVolume
 from .models.audiotrack import getAudioTracks, setAudioTrack
 from .models.control import zapService, remoteControl, setPowerState, getStandbyState
@@ -36,7 +36,7 @@ from .models.locations import getLocations, getCurrentLocation, addLocation, rem
 from .models.timers import getTimers, addTimer, addTimerByEventId, editTimer, removeTimer, toggleTimerStatus, cleanupTimer, writeTimerList, recordNow, tvbrowser, getSleepTimer, setSleepTimer, getPowerTimer, setPowerTimer, getVPSChannels
 from .models.message import sendMessage, getMessageAnswer
 from .models.movies import getMovieList, removeMovie, getMovieInfo, moveMovie, renameMovie, getAllMovies, getMovieDetails
-from .models.config import getSettings, addCollapsedMenu, removeCollapsedMenu, saveConfig, getConfigs, getConfigsSections, getUtcOffset
+from .models.config import getSettings, addCollapsedMenu, removeCollapsedMenu, saveConfig, getConfigs, getConfigsSections
 from .models.stream import getStream, getTS, getStreamSubservices, GetSession
 from .models.servicelist import reloadServicesLists
 from .models.mediaplayer import mediaPlayerAdd, mediaPlayerRemove, mediaPlayerPlay, mediaPlayerCommand, mediaPlayerCurrent, mediaPlayerList, mediaPlayerLoad, mediaPlayerSave, mediaPlayerFindFile
@@ -46,8 +46,24 @@ from .i18n import _
 from .base import BaseController
 from .stream import StreamController
 from .utilities import getUrlArg
-from .defaults import PICON_PATH
-from .epg import EPG
+from .epg import EPG, eventCache
+from .templatecache import templateCache
+from .serializer import JSON_BACKEND
+from .dataversion import dataVersions
+from .timeformat import timeFormats
+from .epgsnapshot import epgSnapshot
+from .epgsearch import epgSearchIndex
+from .xmltv import xmltvChunks, StreamProducer, XMLTV_DAYS, XMLTV_MAX_DAYS
+from .exportcache import exportCache
+from .timerindex import timerIndex
+from .fragmentcache import fragmentCache
+from .nownext import nowNextTracker
+from .bouquetindex import bouquetIndex
+from .piconindex import piconIndex
+from .piconsprite import piconSprites, SPRITE_SIZE, SPRITE_MIN_SIZE, SPRITE_MAX_WIDTH, SPRITE_MAX_HEIGHT
+from .metrics import metrics
+from .profiler import requestProfiler
+from .watchdog import stallWatchdog
 
 
 def whoami(request):
@@ -71,6 +87,18 @@ class WebController(BaseController):
 	https://dream.reichholf.net/e2web/.
 	"""
 
+	ETAG_VERSIONS = {
+		"getservices": ("bouquets", ),
+		"getallservices": ("bouquets", ),
+		"timerlist": ("timers", ),
+		"movielist": ("movies", ),
+		"epgnownext": ("epg", "bouquets", "service"),
+		"epgnow": ("epg", "bouquets"),
+		"epgnext": ("epg", "bouquets"),
+		"epgservicenow": ("epg", ),
+		"epgservicenext": ("epg", ),
+	}
+
 	def __init__(self, session, path=""):
 		BaseController.__init__(self, path=path, session=session)
 		self.putChild(b"stream", StreamController(session))
@@ -1498,9 +1526,50 @@ class WebController(BaseController):
 				pass
 		return getBouquetEpg(getUrlArg(request, "bRef"), begintime, endtime, self.isJson)
 
+	def P_epggrid(self, request):
+		"""
+		Request handler for the `epggrid` endpoint.
+		Events of a range of channels of a bouquet within a time window,
+		e.g. the visible part of a multi EPG grid, including the timer
+		status of every event.
+
+		.. note::
+
+			Not available in *Enigma2 WebInterface API*.
+
+		Args:
+			request (twisted.web.server.Request): HTTP request object
+		Returns:
+			HTTP response with headers
+
+		.. http:get:: /api/epggrid
+
+			:query string bRef: bouquet reference
+			:query int first: position of the first channel (default 0)
+			:query int count: number of channels (default 20, max. 100)
+			:query int time: begin of the time window (default now)
+			:query int minutes: length of the time window (default 180, max. 1440)
+		"""
+		res = self.testMandatoryArguments(request, ["bRef"])
+		if res:
+			return res
+		first = 0
+		count = GRID_CHANNELS
+		begintime = -1
+		minutes = GRID_MINUTES
+		try:
+			first = max(0, int(getUrlArg(request, "first", first)))
+			count = min(max(1, int(getUrlArg(request, "count", count))), GRID_MAX_CHANNELS)
+			begintime = int(getUrlArg(request, "time", begintime))
+			minutes = min(max(1, int(getUrlArg(request, "minutes", minutes))), GRID_MAX_MINUTES)
+		except ValueError:
+			pass
+		return getEpgGrid(getUrlArg(request, "bRef"), first, count, begintime, minutes)
+
 	def P_epgxmltv(self, request):
 		"""
 		Request handler for the `epgxmltv` endpoint.
+		The XMLTV document is streamed one service at a time.
 
 		.. note::
 
@@ -1508,20 +1577,29 @@ class WebController(BaseController):
 
 		Args:
 			request (twisted.web.server.Request): HTTP request object
-			bRef: mandatory, method uses epgmulti
+			bRef: mandatory, bouquet reference; may be given several times
 			lang: mandatory, needed for xmltv and Enigma2 has no parameter for epg language
+			days: number of days (default 7, max. 14)
+			time: optional begin time stamp (default now)
+			gzip: 1 for a gzip compressed file
 		Returns:
 			HTTP response with headers
 		"""
 		res = self.testMandatoryArguments(request, ["bRef", "lang"])
 		if res:
 			return res
-		ret = self.P_epgmulti(request)
-		bRef = getUrlArg(request, "bRef")
-		ret["services"] = getServices(bRef, True, False)["services"]
-		ret["lang"] = getUrlArg(request, "lang")
-		ret["offset"] = getUtcOffset()
-		return ret
+		bRefs = [ensure_str(bRef) for bRef in request.args[b"bRef"]]
+		days = XMLTV_DAYS
+		begin = -1
+		try:
+			days = min(max(float(getUrlArg(request, "days", XMLTV_DAYS)), 0.1), XMLTV_MAX_DAYS)
+			begin = int(getUrlArg(request, "time", -1))
+		except ValueError:
+			pass
+		chunks = xmltvChunks(bRefs, getUrlArg(request, "lang"), days, begin)
+		if getUrlArg(request, "gzip") == "1":
+			return StreamProducer(request, chunks, "application/gzip", compress=True, filename="epg.xml.gz")
+		return StreamProducer(request, chunks, "application/xml; charset=utf-8")
 
 	# http://enigma2/api/epgnow?bRef=1%3A7%3A1%3A0%3A0%3A0%3A0%3A0%3A0%3A0%3A%20FROM%20BOUQUET%20"userbouquet.favourites.tv"%20ORDER%20BY%20bouquet
 	# http://enigma2/web/epgnow?bRef=1%3A7%3A1%3A0%3A0%3A0%3A0%3A0%3A0%3A0%3A%20FROM%20BOUQUET%20"userbouquet.favourites.tv"%20ORDER%20BY%20bouquet
@@ -1558,6 +1636,38 @@ class WebController(BaseController):
 		ret["info"] = info
 		return ret
 
+	def P_epgnownextchanges(self, request):
+		"""
+		Request handler for the `epgnownextchanges` endpoint.
+		Now and next events of the services of a bouquet which changed
+		since the version of a previous response, and the progress of all
+		now events.
+
+		.. note::
+
+			Not available in *Enigma2 WebInterface API*.
+
+		Args:
+			request (twisted.web.server.Request): HTTP request object
+		Returns:
+			HTTP response with headers
+
+		.. http:get:: /api/epgnownextchanges
+
+			:query string bRef: bouquet reference
+			:query int since: `version` of the previous response for the same bouquet (default 0: all services)
+		"""
+		res = self.testMandatoryArguments(request, ["bRef"])
+		if res:
+			return res
+		since = 0
+		try:
+			since = max(0, int(getUrlArg(request, "since", since)))
+		except ValueError:
+			pass
+		self.suppresslog = True
+		return getNowNextChanges(getUrlArg(request, "bRef"), since, self.isJson)
+
 	def P_epgmultichannelnownext(self, request):
 		res = self.testMandatoryArguments(request, ["sRefs"])
 		if res:
@@ -1588,6 +1698,22 @@ class WebController(BaseController):
 			request (twisted.web.server.Request): HTTP request object
 		Returns:
 			HTTP response with headers
+
+		.. http:get:: /api/epgsearch
+
+			:query string search: search words
+			:query int endtime: only events beginning before (optional)
+			:query string full: also search the descriptions (optional)
+			:query string bouquetsonly: only services of the TV bouquets, ranked by relevance (optional)
+			:query int limit: max. number of events returned (optional); `total` is the number of all hits
+			:query int offset: number of events skipped (optional, with limit)
+
+			With bouquetsonly the index of the bouquet services is searched
+			(up to 150000 events, the nearest of each service first);
+			`truncated` is true when a search word is the beginning of so
+			many words that hits are missing. Until the index is built and
+			without bouquetsonly the EPG cache is searched, which returns at
+			most 128 events.
 		"""
 		search = getUrlArg(request, "search")
 		if search != None:
@@ -1600,7 +1726,17 @@ class WebController(BaseController):
 			fulldesc = False
 			if b"full" in list(request.args.keys()):
 				fulldesc = True
-			return getSearchEpg(search, endtime, fulldesc, False, self.isJson)
+			bouquetsonly = b"bouquetsonly" in request.args
+			# paged results with ?limit=N[&offset=M]
+			offset = 0
+			limit = getUrlArg(request, "limit")
+			if limit is not None:
+				try:
+					limit = max(1, int(limit))
+					offset = max(0, int(getUrlArg(request, "offset", "0")))
+				except ValueError:
+					limit = None
+			return getSearchEpg(search, endtime, fulldesc, bouquetsonly, self.isJson, offset, limit)
 		else:
 			res = self.testMandatoryArguments(request, ["eventid"])
 			if res:
@@ -2267,6 +2403,157 @@ class WebController(BaseController):
 			"message": "EPG data cleared"
 		}
 
+	def P_cachestats(self, request):
+		"""
+		Request handler for the `cachestats` endpoint.
+		Report size and hit ratio of the internal caches.
+
+		.. note::
+
+			Not available in *Enigma2 WebInterface API*.
+
+		Args:
+			request (twisted.web.server.Request): HTTP request object
+		Returns:
+			HTTP response with headers
+		"""
+		self.suppresslog = True
+		return {
+			"result": True,
+			"jsonbackend": JSON_BACKEND,
+			"versions": dataVersions.getStats(),
+			"templates": templateCache.getStats(),
+			"fragments": fragmentCache.getStats(),
+			"timeformats": timeFormats.getStats(),
+			"epgsnapshot": epgSnapshot.getStats(),
+			"epgsearch": epgSearchIndex.getStats(),
+			"exports": exportCache.getStats(),
+			"timerindex": timerIndex.getStats(),
+			"picons": piconIndex.getStats(),
+			"piconsprites": piconSprites.getStats(),
+			"nownext": nowNextTracker.getStats(),
+			"events": eventCache.getStats(),
+			"bouquetindex": bouquetIndex.getStats()
+		}
+
+	def P_metrics(self, request):
+		"""
+		Request handler for the `metrics` endpoint.
+		Per handler call counts, status codes and histograms of handler,
+		template and serialization time and response size in Prometheus
+		text format.
+
+		.. note::
+
+			Not available in *Enigma2 WebInterface API*.
+
+		Args:
+			request (twisted.web.server.Request): HTTP request object
+		Returns:
+			HTTP response with headers
+		"""
+		self.suppresslog = True
+		self.isCustom = True
+		request.setHeader("content-type", "text/plain; version=0.0.4; charset=utf-8")
+		return metrics.exposition()
+
+	def P_profile(self, request):
+		"""
+		Request handler for the `profile` endpoint.
+		Profile the next requests with cProfile and report the results.
+
+		.. note::
+
+			Not available in *Enigma2 WebInterface API*.
+
+		Args:
+			request (twisted.web.server.Request): HTTP request object
+				:query int start: profile the next *start* requests
+				:query string handler: only profile this handler, e.g. `P_epgmulti`
+				:query int stop: stop the running session
+				:query int id: session to report, default is the latest
+				:query int top: number of functions to report (default 30)
+				:query string sort: `cumulative` (default), `tottime` or `ncalls`
+				:query string format: `pstats` for a binary dump to be read with the pstats module
+		Returns:
+			HTTP response with headers
+		"""
+		self.suppresslog = True
+		start = getUrlArg(request, "start")
+		if start is not None:
+			try:
+				count = int(start)
+			except ValueError:
+				return {"result": False, "message": "start must be a number"}
+			session = requestProfiler.start(count, getUrlArg(request, "handler"))
+			return {"result": True, "running": session.toDict()}
+		if getUrlArg(request, "stop") is not None:
+			requestProfiler.stop()
+			return dict(result=True, **requestProfiler.getStatus())
+
+		sid = getUrlArg(request, "id")
+		if sid is None and not requestProfiler.ring:
+			return dict(result=True, **requestProfiler.getStatus())
+		try:
+			session = requestProfiler.getSession(sid and int(sid))
+			limit = int(getUrlArg(request, "top", "30"))
+		except ValueError:
+			session = None
+		if session is None:
+			return {"result": False, "message": "no such profiling session"}
+
+		if getUrlArg(request, "format") == "pstats":
+			self.isCustom = True
+			request.setHeader("content-type", "application/octet-stream")
+			request.setHeader("content-disposition", 'attachment; filename="openwebif-%d.pstats"' % session.id)
+			return requestProfiler.dump(session)
+
+		ret = session.toDict()
+		ret["result"] = True
+		ret["functions"] = requestProfiler.top(session, limit, getUrlArg(request, "sort", "cumulative"))
+		return ret
+
+	def P_stalls(self, request):
+		"""
+		Request handler for the `stalls` endpoint.
+		Report the longest stalls of the enigma2 main loop with the stack
+		of the blocking code and the request being handled.
+		The watchdog is enabled with `config.OpenWebif.stall_watchdog`.
+
+		.. note::
+
+			Not available in *Enigma2 WebInterface API*.
+
+		Args:
+			request (twisted.web.server.Request): HTTP request object
+				:query int reset: clear the recorded stalls
+		Returns:
+			HTTP response with headers
+		"""
+		self.suppresslog = True
+		if getUrlArg(request, "reset") == "1":
+			stallWatchdog.reset()
+		return dict(result=True, **stallWatchdog.getReport())
+
+	def P_templatereport(self, request):
+		"""
+		Request handler for the `templatereport` endpoint.
+		Report compile, load and first render time of the views.
+
+		.. note::
+
+			Not available in *Enigma2 WebInterface API*.
+
+		Args:
+			request (twisted.web.server.Request): HTTP request object
+		Returns:
+			HTTP response with headers
+		"""
+		return {
+			"result": True,
+			"views": templateCache.getReport()
+		}
+
 	def P_getsubtitles(self, request):
 		"""
 		Request handler for the `getsubtitles` endpoint.
@@ -2477,7 +2764,7 @@ class WebController(BaseController):
 		pp = getPicon(sRef, path, False)
 		if pp is not None:
 			if path is None:
-				path = PICON_PATH
+				path = piconIndex.path
 			link = pp
 			pp = pp.replace("/picon/", path)
 		if json == 'true':
@@ -2489,6 +2776,43 @@ class WebController(BaseController):
 			self.isImage = True
 			return pp
 
+	def P_piconsprite(self, request):
+		"""
+		Request handler for the `piconsprite` endpoint.
+		Sprite sheets of the picons of a bouquet and the sheet and tile
+		offsets of its services.
+
+		.. note::
+
+			Not available in *Enigma2 WebInterface API*.
+
+		Args:
+			request (twisted.web.server.Request): HTTP request object
+		Returns:
+			HTTP response with headers
+
+		.. http:get:: /api/piconsprite
+
+			:query string bRef: bouquet reference
+			:query int width: tile width (default 100)
+			:query int height: tile height (default 60)
+		"""
+		res = self.testMandatoryArguments(request, ["bRef"])
+		if res:
+			return res
+		width, height = SPRITE_SIZE
+		try:
+			width = min(max(int(getUrlArg(request, "width", width)), SPRITE_MIN_SIZE), SPRITE_MAX_WIDTH)
+			height = min(max(int(getUrlArg(request, "height", height)), SPRITE_MIN_SIZE), SPRITE_MAX_HEIGHT)
+		except ValueError:
+			pass
+		sprite = piconSprites.get(getUrlArg(request, "bRef"), width, height)
+		if sprite is None:
+			return {"result": False, "pending": piconSprites.available}
+		ret = dict(sprite)
+		ret["result"] = True
+		return ret
+
 
 class ApiController(WebController):
 	def __init__(self, session, path=""):
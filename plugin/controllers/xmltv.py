@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+##########################################################################
+# OpenWebif: XMLTV
+##########################################################################
+# Copyright (C) 2011 - 2020 E2OpenPlugins
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston MA 02110-1301, USA.
+##########################################################################
+
+"""
+Streaming XMLTV export.
+
+:py:func:`xmltvChunks` generates the document piecewise: the channels of
+all requested bouquets first, then the programmes of one service at a
+time, so only the events of a single service are held in memory.
+:py:class:`StreamProducer` writes such a generator to a request whenever
+the transport asks for more data, optionally gzip compressed.
+"""
+
+from __future__ import print_function
+import re
+import time
+import zlib
+
+import six
+from zope.interface import implementer
+from twisted.internet.interfaces import IPullProducer
+from twisted.web import http, server
+from xml.sax.saxutils import escape, quoteattr
+from enigma import eEPGCache, eServiceCenter, eServiceReference
+
+from Plugins.Extensions.OpenWebif.controllers.epgevent import convertGenre
+from Plugins.Extensions.OpenWebif.controllers.epgsnapshot import isMarker
+from Plugins.Extensions.OpenWebif.controllers.utilities import error
+
+#: number of bytes collected before a chunk is written
+STREAM_CHUNK_SIZE = 32768
+
+#: default and max. number of days exported
+XMLTV_DAYS = 7
+XMLTV_MAX_DAYS = 14
+
+#: fields of the per service EPG queries
+XMLTV_FIELDS = 'IBDTSEW'
+
+XMLTV_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n<tv source-info-url="https://github.com/E2OpenPlugins/e2openplugin-OpenWebif" source-info-name="OpenWebif">\n'
+XMLTV_FOOTER = '</tv>\n'
+
+# characters not allowed in XML 1.0
+_invalid = re.compile(u"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _text(value):
+	return escape(_invalid.sub(u"", six.ensure_text(value or "", errors="ignore")))
+
+
+def _time(t):
+	return time.strftime("%Y%m%d%H%M%S +0000", time.gmtime(t))
+
+
+def getXMLTVServices(bRefs):
+	"""
+	Returns:
+		list of (service reference, name) of the bouquets *bRefs* without
+		markers and duplicates
+	"""
+	serviceHandler = eServiceCenter.getInstance()
+	seen = set()
+	services = []
+	for bRef in bRefs:
+		content = serviceHandler.list(eServiceReference(bRef))
+		for sRef, name in (content and content.getContent('SN', True)) or []:
+			if sRef not in seen and not isMarker(sRef):
+				seen.add(sRef)
+				services.append((sRef, name))
+	return services
+
+
+def xmltvChunks(bRefs, lang, days=XMLTV_DAYS, begin=-1):
+	"""
+	Generate the XMLTV document for the services of the bouquets *bRefs*.
+
+	Args:
+		bRefs: list of bouquet references
+		lang: language of the titles and descriptions
+		days: number of days exported
+		begin: time stamp of the first event (-1 for now)
+	Yields:
+		unicode strings
+	"""
+	services = getXMLTVServices(bRefs)
+	lang = quoteattr(six.ensure_text(lang))
+	minutes = int(days * 1440)
+	yield six.ensure_text(XMLTV_HEADER)
+	for sRef, name in services:
+		yield u'\t<channel id=%s>\n\t\t<display-name>%s</display-name>\n\t</channel>\n' % (quoteattr(six.ensure_text(sRef)), _text(name))
+
+	epgcache = eEPGCache.getInstance()
+	for sRef, name in services:
+		channel = quoteattr(six.ensure_text(sRef))
+		parts = []
+		for eventId, start, duration, title, shortDescription, longDescription, genreData in epgcache.lookupEvent([XMLTV_FIELDS, (sRef, 0, begin, minutes)]) or []:
+			if not eventId or start is None:
+				continue
+			parts.append(u'\t<programme start="%s" stop="%s" channel=%s>\n\t\t<title lang=%s>%s</title>\n' % (_time(start), _time(start + (duration or 0)), channel, lang, _text(title)))
+			if shortDescription:
+				parts.append(u'\t\t<sub-title lang=%s>%s</sub-title>\n' % (lang, _text(shortDescription)))
+			if longDescription:
+				parts.append(u'\t\t<desc lang=%s>%s</desc>\n' % (lang, _text(longDescription)))
+			genre, genreId = convertGenre(genreData)
+			if genreId:
+				parts.append(u'\t\t<category lang=%s id="%d">%s</category>\n' % (lang, genreId, _text(genre)))
+			parts.append(u'\t</programme>\n')
+		if parts:
+			yield u"".join(parts)
+	yield six.ensure_text(XMLTV_FOOTER)
+
+
+@implementer(IPullProducer)
+class StreamProducer(object):
+	"""
+	Pull producer writing the text chunks of a generator to *request*.
+	"""
+
+	def __init__(self, request, chunks, contentType, compress=False, filename=None, chunksize=STREAM_CHUNK_SIZE):
+		self.request = request
+		self.chunks = chunks
+		self.contentType = contentType
+		self.filename = filename
+		self.chunksize = chunksize
+		self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+		self._pending = None
+		self._done = False
+
+	def _nextChunk(self):
+		parts = []
+		size = 0
+		for part in self.chunks:
+			part = six.ensure_binary(part)
+			if self._compressor is not None:
+				part = self._compressor.compress(part)
+			parts.append(part)
+			size += len(part)
+			if size >= self.chunksize:
+				return b"".join(parts)
+		if self._compressor is not None:
+			parts.append(self._compressor.flush())
+			self._compressor = None
+		return b"".join(parts)
+
+	def start(self):
+		"""
+		Generate the first chunk, set the headers and start producing.
+
+		Errors within the first chunk result in an HTTP 500 response.
+		"""
+		request = self.request
+		try:
+			self._pending = self._nextChunk()
+		except Exception as exc:
+			error("cannot create response for '%s': %r" % (request.uri, exc), "XMLTV")
+			request.setResponseCode(http.INTERNAL_SERVER_ERROR)
+			request.setHeader("content-type", "text/plain")
+			request.write(six.ensure_binary("Error: %r" % exc))
+			request.finish()
+			return server.NOT_DONE_YET
+		request.setHeader("content-type", self.contentType)
+		if self.filename:
+			request.setHeader("content-disposition", 'attachment; filename="%s"' % self.filename)
+		request.registerProducer(self, False)
+		return server.NOT_DONE_YET
+
+	def resumeProducing(self):
+		if self._done:
+			return
+		try:
+			if self._pending is not None:
+				chunk, self._pending = self._pending, None
+			else:
+				chunk = self._nextChunk()
+		except Exception as exc:
+			# headers are gone, the client can only detect the broken response
+			error("cannot create response for '%s': %r" % (self.request.uri, exc), "XMLTV")
+			self._done = True
+			self.request.unregisterProducer()
+			self.request.channel.loseConnection()
+			return
+
+		if chunk:
+			self.request.write(chunk)
+		else:
+			self._done = True
+			self.request.unregisterProducer()
+			self.request.finish()
+
+	def stopProducing(self):
+		self._done = True
+		self.chunks = None
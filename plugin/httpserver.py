@@ -31,6 +31,11 @@ from twisted.web import server, http, resource
 from twisted.internet.error import CannotListenError
 
 from Plugins.Extensions.OpenWebif.controllers.root import RootController
+from Plugins.Extensions.OpenWebif.controllers.templatecache import templateCache
+from Plugins.Extensions.OpenWebif.controllers.staticfile import precompress
+from Plugins.Extensions.OpenWebif.controllers.watchdog import stallWatchdog
+from Plugins.Extensions.OpenWebif.controllers.timeformat import timeFormats
+from Plugins.Extensions.OpenWebif.controllers.defaults import getPublicPath
 from Plugins.Extensions.OpenWebif.sslcertificate import SSLCertificateGenerator, KEY_FILE, CERT_FILE, CA_FILE, CHAIN_FILE
 from socket import has_ipv6
 from OpenSSL import SSL
@@ -328,6 +333,15 @@ def HttpdStart(session):
 			except CannotListenError:
 				print("[OpenWebif] port 80 busy")
 
+		# compile changed views and load the most used ones before the first request
+		templateCache.startup()
+		# create missing or stale .gz / .br variants of the static files
+		precompress([getPublicPath()])
+		# report main loop stalls if enabled (config.OpenWebif.stall_watchdog)
+		stallWatchdog.setup()
+		# drop formatted times when the language is changed
+		timeFormats.setup()
+
 
 def HttpdStop(session):
 	StopServer(session).doStop()
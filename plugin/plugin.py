@@ -106,6 +106,8 @@ config.OpenWebif.epg_encoding = ConfigSelection(default='utf-8', choices=['utf-8
 config.OpenWebif.displayTracebacks = ConfigYesNo(default=False)
 config.OpenWebif.playiptvdirect = ConfigYesNo(default=True)
 config.OpenWebif.verbose_debug_enabled = ConfigYesNo(default=False)
+config.OpenWebif.stall_watchdog = ConfigYesNo(default=False)
+config.OpenWebif.stall_threshold = ConfigInteger(default=250, limits=(50, 10000))
 
 setDebugEnabled(config.OpenWebif.verbose_debug_enabled.value)
 
@@ -0,0 +1,106 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+"""
+Unit Test for the data versions behind ETags and caches.
+"""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from enigma_stubs import isolatedModules, stubModule, setupPackage, ConfigItem, ConfigSection
+
+config = ConfigSection(usage=ConfigSection(default_path=ConfigItem("/nonexistent")))
+with isolatedModules():
+	stubModule("NavigationInstance", instance=None)
+	stubModule("Components").__path__ = []
+	stubModule("Components.config", config=config)
+	setupPackage()
+	stubModule("Plugins.Extensions.OpenWebif.controllers.defaults", OPENWEBIFVER="test")
+	from Plugins.Extensions.OpenWebif.controllers import dataversion
+	from Plugins.Extensions.OpenWebif.controllers.dataversion import DataVersions
+
+
+class Request(object):
+	def __init__(self, uri, **args):
+		self.uri = uri
+		self.args = dict((key.encode(), [value.encode()]) for key, value in args.items())
+
+
+def touch(filename, data=b"", mtime=None):
+	with open(filename, "ab") as f:
+		f.write(data)
+	if mtime is not None:
+		os.utime(filename, (mtime, mtime))
+
+
+class TestDataVersions(unittest.TestCase):
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.versions = DataVersions()
+
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+
+	def test_counter_and_probe(self):
+		state = [1]
+		self.versions.register("x", lambda request: state[0])
+		version = self.versions.get("x")
+		self.versions.bump("x")
+		self.assertNotEqual(version, self.versions.get("x"))
+		version = self.versions.get("x")
+		state[0] = 2
+		self.assertNotEqual(version, self.versions.get("x"))
+
+	def test_etag(self):
+		self.versions.register("x")
+		request = Request("/api/x?a=1")
+		etag = self.versions.getETag(request, ["x"])
+		self.assertEqual(etag, self.versions.getETag(request, ["x"]))
+		self.assertNotEqual(etag, self.versions.getETag(Request("/api/x?a=2"), ["x"]))
+		self.assertNotEqual(etag, self.versions.getETag(request, ["x"], extra="de"))
+		self.versions.bump("x")
+		self.assertNotEqual(etag, self.versions.getETag(request, ["x"]))
+		# counters start at 0 again after a restart
+		self.assertNotEqual(etag, DataVersions().getETag(request, ["x"]))
+
+	def test_bouquets_probe(self):
+		names = ("lamedb", "bouquets.tv", "userbouquet.a.tv", "settings")
+		for name in names:
+			touch(os.path.join(self.dir, name), mtime=1000)
+		dataversion.BOUQUET_DIR = self.dir
+		dataversion.BOUQUET_FILES = (os.path.join(self.dir, "lamedb"), os.path.join(self.dir, "bouquets.tv"))
+		version = dataversion._bouquetsProbe(None)
+		# settings, timers and epg.dat are written to the same directory
+		touch(os.path.join(self.dir, "settings"), b"x", mtime=2000)
+		touch(os.path.join(self.dir, "epg.dat"), mtime=2000)
+		os.utime(self.dir, (3000, 3000))
+		self.assertEqual(version, dataversion._bouquetsProbe(None))
+		touch(os.path.join(self.dir, "userbouquet.a.tv"), b"x", mtime=2000)
+		self.assertNotEqual(version, dataversion._bouquetsProbe(None))
+		version = dataversion._bouquetsProbe(None)
+		touch(os.path.join(self.dir, "userbouquet.b.tv"), mtime=1000)
+		os.utime(self.dir, (4000, 4000))
+		self.assertNotEqual(version, dataversion._bouquetsProbe(None))
+
+	def test_movies_probe(self):
+		recording = os.path.join(self.dir, "recording.ts")
+		touch(recording, b"x" * 10, mtime=1000)
+		os.utime(self.dir, (1000, 1000))
+		request = Request("/api/movielist", dirname=self.dir)
+		version = dataversion._moviesProbe(request)
+		# a growing recording does not change the directory
+		touch(recording, b"x" * 10, mtime=1000)
+		os.utime(self.dir, (1000, 1000))
+		self.assertNotEqual(version, dataversion._moviesProbe(request))
+		version = dataversion._moviesProbe(request)
+		self.assertEqual(version, dataversion._moviesProbe(request))
+		touch(recording + ".cuts", b"x", mtime=time.time())
+		self.assertNotEqual(version, dataversion._moviesProbe(request))
+		self.assertTrue(dataversion._moviesProbe(Request("/api/movielist", dirname=os.path.join(self.dir, "missing"))) is None)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,162 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+"""
+Stand-ins for the enigma2 and twisted modules, so that controllers can be
+imported and tested outside of a receiver.
+"""
+import os
+import sys
+import types
+from contextlib import contextmanager
+
+PLUGIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../plugin')
+
+# names registered by stubModule within isolatedModules
+_stubbed = set()
+
+
+def stubModule(name, **attributes):
+	"""
+	Register a module *name* with *attributes* in `sys.modules`.
+	"""
+	module = types.ModuleType(name)
+	module.__dict__.update(attributes)
+	sys.modules[name] = module
+	_stubbed.add(name)
+	return module
+
+
+@contextmanager
+def isolatedModules():
+	"""
+	Stub and import the modules under test within this block; when it is
+	left, the stubs and the plugin modules are removed from `sys.modules`
+	again. The imported modules keep their stubs, and the next test module
+	(when the testsuite runs in one process) starts from scratch.
+	"""
+	saved = dict(sys.modules)
+	_stubbed.clear()
+	try:
+		yield
+	finally:
+		for name in list(sys.modules):
+			if name in _stubbed or name == "Plugins" or name.startswith("Plugins."):
+				if name in saved:
+					sys.modules[name] = saved[name]
+				else:
+					del sys.modules[name]
+		_stubbed.clear()
+
+
+def setupPackage():
+	"""
+	Make the controllers importable as
+	`Plugins.Extensions.OpenWebif.controllers` without running the plugin.
+	"""
+	if "Plugins.Extensions.OpenWebif.controllers" in sys.modules:
+		return
+	stubModule("Plugins").__path__ = []
+	stubModule("Plugins.Extensions").__path__ = []
+	stubModule("Plugins.Extensions.OpenWebif").__path__ = [PLUGIN_PATH]
+	stubModule("Plugins.Extensions.OpenWebif.controllers").__path__ = [os.path.join(PLUGIN_PATH, "controllers")]
+
+
+class DelayedCall(object):
+	def __init__(self, clock, when, fnc, args):
+		self.clock = clock
+		self.when = when
+		self.fnc = fnc
+		self.args = args
+		self.cancelled = False
+		self.called = False
+
+	def active(self):
+		return not (self.cancelled or self.called)
+
+	def cancel(self):
+		self.cancelled = True
+
+
+class Clock(object):
+	"""
+	Replaces the `time` module and the reactor of a controller; time only
+	passes with :py:meth:`advance`.
+	"""
+
+	def __init__(self, now=1000000.0):
+		self.now = now
+		self.calls = []
+
+	def time(self):
+		return self.now
+
+	def callLater(self, delay, fnc, *args):
+		call = DelayedCall(self, self.now + delay, fnc, args)
+		self.calls.append(call)
+		return call
+
+	def pending(self):
+		return [call for call in self.calls if call.active()]
+
+	def advance(self, seconds):
+		"""
+		Let *seconds* pass and run the calls which became due, in order.
+		"""
+		end = self.now + seconds
+		while True:
+			due = [call for call in self.pending() if call.when <= end]
+			if not due:
+				break
+			call = min(due, key=lambda c: c.when)
+			self.now = max(self.now, call.when)
+			call.called = True
+			call.fnc(*call.args)
+		self.now = end
+
+
+class DataVersions(object):
+	"""
+	Counters of `controllers.dataversion.DataVersions` without probes.
+	"""
+
+	def __init__(self):
+		self.counters = {}
+
+	def bump(self, name):
+		self.counters[name] = self.counters.get(name, 0) + 1
+
+	def get(self, name, request=None):
+		return (self.counters.get(name, 0), None)
+
+	def getCounter(self, name):
+		return self.counters.get(name, 0)
+
+
+def stubDataVersions():
+	"""
+	Returns:
+		:py:class:`DataVersions` registered as
+		`controllers.dataversion.dataVersions`
+	"""
+	setupPackage()
+	dataVersions = DataVersions()
+	stubModule("Plugins.Extensions.OpenWebif.controllers.dataversion", dataVersions=dataVersions)
+	return dataVersions
+
+
+class ConfigItem(object):
+	def __init__(self, value=None):
+		self.value = value
+		self.notifiers = []
+
+	def addNotifier(self, notifier, initial_call=True):
+		self.notifiers.append(notifier)
+
+
+class ConfigSection(object):
+	def __init__(self, **items):
+		self.__dict__.update(items)
+
+	def dict(self):
+		return self.__dict__
@@ -0,0 +1,110 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+"""
+Unit Test for the columnar EPG snapshot of the multi EPG.
+"""
+import time
+import unittest
+
+from enigma_stubs import isolatedModules, stubModule, stubDataVersions, setupPackage
+
+
+class EPGEvent(object):
+	@staticmethod
+	def fromFields(layout, fields):
+		return fields
+
+
+with isolatedModules():
+	stubModule("enigma", eEPGCache=None, eServiceCenter=None, eServiceReference=None)
+	stubModule("twisted").__path__ = []
+	stubModule("twisted.internet", reactor=None)
+	stubModule("Screens").__path__ = []
+	stubModule("Screens.ChannelSelection", service_types_tv="1:7:1", service_types_radio="1:7:2")
+	dataVersions = stubDataVersions()
+	setupPackage()
+	stubModule("Plugins.Extensions.OpenWebif.controllers.epgevent", EPGEvent=EPGEvent, getFieldLayout=lambda fields: fields)
+	stubModule("Plugins.Extensions.OpenWebif.controllers.utilities", error=print)
+	from Plugins.Extensions.OpenWebif.controllers.epgsnapshot import Snapshot, EPGSnapshot, isMarker, SNAPSHOT_HOURS
+
+T = 1000000
+
+
+class TestSnapshot(unittest.TestCase):
+	def setUp(self):
+		self.snapshot = Snapshot(T, 0, None)
+		# unsorted, with an event without id
+		self.snapshot.addService("s", "S", [
+			(2, T + 100, 100, "two", "b"),
+			(1, T, 100, "one", "a"),
+			(3, T + 300, 50, "three", ""),
+			(0, T + 400, 50, "none", ""),
+		])
+		self.snapshot.addService("e", "E", [])
+		self.snapshot.finish()
+
+	def ids(self, sRef, positions):
+		return [self.snapshot.events[sRef].eventId[i] for i in positions]
+
+	def test_window_edges(self):
+		# events ending at the begin or beginning at the end do not overlap
+		self.assertEqual([2], self.ids("s", self.snapshot.window("s", T + 100, T + 200)))
+		self.assertEqual([1, 2], self.ids("s", self.snapshot.window("s", T + 99, T + 101)))
+		self.assertEqual([], self.ids("s", self.snapshot.window("s", T + 200, T + 300)))
+		self.assertEqual([3], self.ids("s", self.snapshot.window("s", T + 200, T + 301)))
+		self.assertEqual([1, 2, 3], self.ids("s", self.snapshot.window("s", T - 1000, T + 1000)))
+		self.assertEqual([], self.snapshot.window("e", T, T + 1000))
+
+	def test_row(self):
+		self.assertEqual((2, T + 100, "two", "b", "s", "S", 100), self.snapshot.row("s", 1))
+
+	def test_replace(self):
+		self.snapshot.replace("s", T + 100, T + 300, [(5, T + 150, 50, "five", ""), (4, T + 100, 50, "four", "a")])
+		self.assertEqual([1, 4, 5, 3], list(self.snapshot.events["s"].eventId))
+		self.assertEqual((4, T + 100, "four", "a", "s", "S", 50), self.snapshot.row("s", 1))
+		# known strings are reused
+		self.assertEqual(self.snapshot.events["s"].shortDescription[0], self.snapshot.events["s"].shortDescription[1])
+		self.snapshot.replace("s", T + 300, T + 1000, [])
+		self.assertEqual([1, 4, 5], list(self.snapshot.events["s"].eventId))
+		self.assertEqual(3, len(self.snapshot))
+
+	def test_marker(self):
+		self.assertTrue(isMarker("1:64:0:0:0:0:0:0:0:0::Marker"))
+		self.assertFalse(isMarker("1:0:19:2B66:3F3:1:C00000:0:0:0:"))
+
+
+class TestMultiChannelEvents(unittest.TestCase):
+	def setUp(self):
+		now = int(time.time())
+		self.snapshot = Snapshot(now - 60, dataVersions.get("epg")[0], dataVersions.get("bouquets"))
+		self.snapshot.addService("s", "S", [(1, now - 60, 600, "one", ""), (2, now + 540, 600, "two", "")])
+		self.snapshot.finish()
+		self.epgSnapshot = EPGSnapshot()
+		self.epgSnapshot.current = self.snapshot
+		# no builds or refreshes
+		self.epgSnapshot.building = True
+		self.now = now
+
+	def test_hit(self):
+		events = self.epgSnapshot.getMultiChannelEvents(["s", "1:64:0:0:0:0:0:0:0:0::Marker"], -1, 30)
+		self.assertEqual([1, 2], [e[0] for e in events])
+		self.assertEqual(1, self.epgSnapshot.hits)
+
+	def test_misses(self):
+		# unknown service, before the build and after the covered hours
+		self.assertTrue(self.epgSnapshot.getMultiChannelEvents(["1:0:1:1:1:1:C00000:0:0:0:"], -1, 30) is None)
+		self.assertTrue(self.epgSnapshot.getMultiChannelEvents(["s"], self.now - 3600, 30) is None)
+		self.assertTrue(self.epgSnapshot.getMultiChannelEvents(["s"], self.now + SNAPSHOT_HOURS * 3600, 30) is None)
+		self.assertEqual(3, self.epgSnapshot.misses)
+
+	def test_widen(self):
+		self.assertEqual(SNAPSHOT_HOURS, self.epgSnapshot.hours)
+		self.epgSnapshot.getMultiChannelEvents(["s"], self.now + 3 * 86400, 1440)
+		# the next build covers the query until it is rebuilt
+		self.assertTrue(self.epgSnapshot.hours * 3600 >= 4 * 86400 + 3600)
+		self.assertTrue(self.epgSnapshot.hours <= 4 * 24 + 2)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+"""
+Unit Test for the cache of rendered HTML fragments.
+"""
+import unittest
+
+from enigma_stubs import isolatedModules, stubModule, stubDataVersions, ConfigItem, ConfigSection
+
+config = ConfigSection(
+	osd=ConfigSection(language=ConfigItem("de_DE")),
+	OpenWebif=ConfigSection(
+		theme=ConfigItem("original"),
+		webcache=ConfigSection(mepgmode=ConfigItem(1))
+	)
+)
+with isolatedModules():
+	stubModule("Components").__path__ = []
+	stubModule("Components.config", config=config)
+	dataVersions = stubDataVersions()
+	from Plugins.Extensions.OpenWebif.controllers.fragmentcache import FragmentCache, getContext, FRAGMENT_CACHE_BYTES
+
+
+class Request(object):
+	def __init__(self, args):
+		self.args = args
+
+
+class TestFragmentCache(unittest.TestCase):
+	def setUp(self):
+		self.cache = FragmentCache()
+
+	def test_key(self):
+		context = getContext()
+		key = self.cache.getKey(Request({b"a": [b"1"], b"b": [b"2"]}), "channels", ("epg", "bouquets"), context)
+		# the order of the arguments does not matter
+		self.assertEqual(key, self.cache.getKey(Request({b"b": [b"2"], b"a": [b"1"]}), "channels", ("epg", "bouquets"), context))
+		self.assertNotEqual(key, self.cache.getKey(Request({b"a": [b"1"]}), "channels", ("epg", "bouquets"), context))
+		self.assertNotEqual(key, self.cache.getKey(Request({b"a": [b"1"], b"b": [b"2"]}), "bouquets", ("epg", "bouquets"), context))
+		dataVersions.bump("bouquets")
+		self.assertNotEqual(key, self.cache.getKey(Request({b"a": [b"1"], b"b": [b"2"]}), "channels", ("epg", "bouquets"), context))
+
+	def test_context(self):
+		context = getContext()
+		self.assertEqual(context, getContext())
+		config.OpenWebif.webcache.mepgmode.value = 2
+		self.assertNotEqual(context, getContext())
+		context = getContext()
+		config.osd.language.value = "en_GB"
+		self.assertNotEqual(context, getContext())
+
+	def test_get_set(self):
+		key = self.cache.getKey(Request({}), "timers", ("timers", ), getContext())
+		self.assertTrue(self.cache.get(key) is None)
+		self.cache.set(key, b"<div/>")
+		self.assertEqual(b"<div/>", self.cache.get(key))
+		stats = self.cache.getStats()
+		self.assertEqual(1, stats["hits"])
+		self.assertEqual(1, stats["misses"])
+		self.cache.clear()
+		self.assertTrue(self.cache.get(key) is None)
+
+	def test_size_bound(self):
+		fragment = b"x" * (FRAGMENT_CACHE_BYTES // 3)
+		for page in ("a", "b", "c", "d"):
+			self.cache.set((page, ), fragment)
+		self.assertTrue(self.cache.get(("a", )) is None)
+		self.assertEqual(fragment, self.cache.get(("d", )))
+		self.assertTrue(self.cache.getStats()["entries"] <= 3)
+
+
+if __name__ == '__main__':
+	unittest.main()
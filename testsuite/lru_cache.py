@@ -0,0 +1,47 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+"""
+Unit Test for the LRU cache used by the template and EPG caches.
+"""
+import os
+import sys
+import unittest
+
+# hack: alter include path in such ways that utilities library is included
+sys.path.append(os.path.join(os.path.dirname(__file__), '../plugin'))
+
+from controllers.utilities import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+	def test_evict_oldest(self):
+		cache = LRUCache(2)
+		cache.set("a", 1)
+		cache.set("b", 2)
+		self.assertEqual(1, cache.get("a"))
+		cache.set("c", 3)
+		self.assertFalse("b" in cache)
+		self.assertEqual(["a", "c"], list(cache.keys()))
+		self.assertEqual(1, cache.stats()["evictions"])
+
+	def test_counters(self):
+		cache = LRUCache(4)
+		self.assertEqual(None, cache.get("x"))
+		cache.set("x", 42)
+		self.assertEqual(42, cache.get("x"))
+		stats = cache.stats()
+		self.assertEqual(1, stats["hits"])
+		self.assertEqual(1, stats["misses"])
+		self.assertEqual(0.5, stats["hitratio"])
+
+	def test_weight(self):
+		cache = LRUCache(10, maxweight=5, weigh=len)
+		cache.set("a", "abc")
+		cache.set("b", "abc")
+		self.assertFalse("a" in cache)
+		self.assertEqual(3, cache.stats()["weight"])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,43 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+"""
+Unit Test for the request metrics histograms and their Prometheus text
+representation.
+"""
+import os
+import sys
+import unittest
+
+# hack: alter include path in such ways that metrics library is included
+sys.path.append(os.path.join(os.path.dirname(__file__), '../plugin'))
+
+from controllers.metrics import Histogram, Metrics, HandlerMetrics
+
+
+class TestHistogram(unittest.TestCase):
+	def test_buckets_are_cumulative(self):
+		h = Histogram((1, 10))
+		for value in (0.5, 1, 5, 20):
+			h.observe(value)
+		lines = h.exposition("x", 'handler="a"')
+		self.assertEqual([
+			'x_bucket{handler="a",le="1"} 2',
+			'x_bucket{handler="a",le="10"} 3',
+			'x_bucket{handler="a",le="+Inf"} 4',
+			'x_sum{handler="a"} 26.5',
+			'x_count{handler="a"} 4'], lines)
+
+	def test_exposition(self):
+		m = Metrics()
+		hm = m._handlers[("ApiController", "P_getservices")] = HandlerMetrics()
+		hm.status[200] = 3
+		hm.timings["handler"].observe(0.02)
+		text = m.exposition()
+		self.assertTrue('openwebif_requests_total{controller="ApiController",handler="P_getservices",code="200"} 3' in text)
+		self.assertTrue('openwebif_handler_seconds_count{controller="ApiController",handler="P_getservices"} 1' in text)
+		self.assertFalse("openwebif_template_seconds_count" in text)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,144 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+"""
+Unit Test for the now/next tracker.
+"""
+import unittest
+
+from enigma_stubs import isolatedModules, stubModule, stubDataVersions, Clock
+
+clock = Clock()
+
+
+class EPGCache(object):
+	"""
+	Events by service; answers now (type 0) and next (type 1) lookups at
+	the time of the clock.
+	"""
+
+	def __init__(self):
+		self.events = {}
+		self.lookups = []
+
+	def lookupEvent(self, criteria):
+		ret = []
+		now = clock.time()
+		for sRef, kind, begin in criteria[1:]:
+			self.lookups.append(sRef)
+			events = sorted(self.events.get(sRef, []), key=lambda e: e[1])
+			running = [e for e in events if e[1] <= now < e[1] + e[2]]
+			upcoming = [e for e in events if e[1] > now]
+			if kind == 0 and running:
+				ret.append(running[0])
+			elif kind == 1 and upcoming:
+				ret.append(upcoming[0])
+		return ret
+
+
+epgcache = EPGCache()
+with isolatedModules():
+	stubModule("enigma", eEPGCache=type("eEPGCache", (), {"getInstance": staticmethod(lambda: epgcache)}))
+	stubModule("twisted").__path__ = []
+	stubModule("twisted.internet", reactor=clock)
+	dataVersions = stubDataVersions()
+	from Plugins.Extensions.OpenWebif.controllers import nownext
+	from Plugins.Extensions.OpenWebif.controllers.nownext import NowNextTracker, RECHECK_INTERVAL, IDLE_TIME
+
+nownext.time = clock
+
+NOW = clock.time()
+
+
+def event(eventId, begin, duration, title):
+	return (eventId, int(begin), duration, title, "")
+
+
+class TestNowNextTracker(unittest.TestCase):
+	def setUp(self):
+		clock.now = NOW
+		clock.calls = []
+		epgcache.lookups = []
+		epgcache.events = {
+			"a": [event(1, NOW - 600, 1800, "A1"), event(2, NOW + 1200, 1800, "A2"), event(3, NOW + 3000, 1800, "A3")],
+			"b": [event(11, NOW - 60, 300, "B1"), event(12, NOW + 240, 300, "B2"), event(13, NOW + 540, 300, "B3")],
+		}
+		self.tracker = NowNextTracker()
+
+	def titles(self, changes):
+		return dict((sRef, (current and current[3], following and following[3])) for sRef, current, following in changes)
+
+	def test_initial(self):
+		version, changes = self.tracker.getChanges(["a", "b"])
+		self.assertEqual({"a": ("A1", "A2"), "b": ("B1", "B2")}, self.titles(changes))
+		self.assertEqual([], self.tracker.getChanges(["a", "b"], version)[1])
+		self.assertEqual("B1", self.tracker.getNow("b")[3])
+
+	def test_boundary(self):
+		version, changes = self.tracker.getChanges(["a", "b"])
+		# one timer for the earliest end, one second after it
+		self.assertEqual([NOW + 241], [call.when for call in clock.pending()])
+		del epgcache.lookups[:]
+		clock.advance(241)
+		# only the service whose event ended is looked up again
+		self.assertEqual(["b", "b"], epgcache.lookups)
+		newVersion, changes = self.tracker.getChanges(["a", "b"], version)
+		self.assertTrue(newVersion > version)
+		self.assertEqual({"b": ("B2", "B3")}, self.titles(changes))
+		self.assertEqual([NOW + 541], [call.when for call in clock.pending()])
+		clock.advance(300)
+		self.assertEqual({"b": ("B3", None)}, self.titles(self.tracker.getChanges(["a", "b"], newVersion)[1]))
+		# the clients at the first version get both changes at once
+		self.assertEqual({"b": ("B3", None)}, self.titles(self.tracker.getChanges(["a", "b"], version)[1]))
+
+	def test_gap(self):
+		epgcache.events["c"] = [event(21, NOW + 100, 60, "C1")]
+		version, changes = self.tracker.getChanges(["c"])
+		self.assertEqual({"c": (None, "C1")}, self.titles(changes))
+		clock.advance(101)
+		self.assertEqual({"c": ("C1", None)}, self.titles(self.tracker.getChanges(["c"], version)[1]))
+
+	def test_recheck(self):
+		version, changes = self.tracker.getChanges(["a"])
+		# A1 ends in 20 minutes, the service is looked up after 10 minutes
+		self.assertEqual([NOW + RECHECK_INTERVAL + 1], [call.when for call in clock.pending()])
+		epgcache.events["a"][1] = event(2, NOW + 1200, 1800, "A2 (updated)")
+		clock.advance(RECHECK_INTERVAL)
+		self.assertEqual([], self.tracker.getChanges(["a"], version)[1])
+		clock.advance(1)
+		self.assertEqual({"a": ("A1", "A2 (updated)")}, self.titles(self.tracker.getChanges(["a"], version)[1]))
+
+	def test_since_across_restarts(self):
+		version, changes = self.tracker.getChanges(["a", "b"])
+		clock.advance(5)
+		restarted = NowNextTracker()
+		self.assertTrue(restarted.version > version)
+		# a version of the previous run returns all services
+		self.assertEqual({"a": ("A1", "A2"), "b": ("B1", "B2")}, self.titles(restarted.getChanges(["a", "b"], version)[1]))
+		# as does a version newer than the tracker's
+		self.assertEqual(2, len(restarted.getChanges(["a", "b"], restarted.version + 1000)[1]))
+
+	def test_new_services(self):
+		version, changes = self.tracker.getChanges(["a"])
+		version, changes = self.tracker.getChanges(["a", "b"], version)
+		self.assertEqual({"b": ("B1", "B2")}, self.titles(changes))
+
+	def test_epg_reload(self):
+		version, changes = self.tracker.getChanges(["a", "b"])
+		epgcache.events["a"] = []
+		self.assertEqual([], self.tracker.getChanges(["a", "b"], version)[1])
+		dataVersions.bump("epg")
+		self.assertEqual({"a": (None, None)}, self.titles(self.tracker.getChanges(["a", "b"], version)[1]))
+
+	def test_idle(self):
+		self.tracker.getChanges(["a", "b"])
+		# only "a" is requested any more
+		for i in range((IDLE_TIME + RECHECK_INTERVAL) // 300 + 1):
+			clock.advance(300)
+			self.tracker.getChanges(["a"])
+		self.assertEqual(1, self.tracker.getStats()["services"])
+		self.assertTrue(self.tracker.getNow("b") is None)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+"""
+Unit Test for the EPG full text index.
+"""
+import os
+import sys
+import unittest
+
+# hack: alter include path in such ways that searchindex library is included
+sys.path.append(os.path.join(os.path.dirname(__file__), '../plugin'))
+
+from controllers.searchindex import SearchIndex, fold, tokenize, MAX_EXPANSIONS
+
+NOW = 1000000
+
+
+class TestSearchIndex(unittest.TestCase):
+	def setUp(self):
+		self.index = SearchIndex()
+		self.index.setGroup("svc1", [
+			(1, NOW + 100, 60, u"Tatort", u"Krimi aus Münster"),
+			(2, NOW - 7200, 60, u"Tagesschau", u"Nachrichten"),
+			(3, NOW + 3600, 60, u"Crème brûlée", u"Kochsendung über Desserts"),
+		])
+		self.index.setGroup("svc2", [
+			(4, NOW + 200, 60, u"Der Münster-Tatort", u"Wiederholung"),
+			(5, NOW + 50, 60, u"Wetter", u"Tatort Wetter"),
+		])
+
+	def test_fold(self):
+		self.assertEqual(u"creme brulee", fold(u"Crème Brûlée"))
+		self.assertEqual(u"strasse", fold(u"Straße"))
+		self.assertEqual([u"der", u"munster", u"tatort"], tokenize(u"Der Münster-Tatort"))
+
+	def test_title_search(self):
+		total, hits, truncated = self.index.search(u"tatort", now=NOW)
+		self.assertEqual(2, total)
+		self.assertEqual([("svc1", 1), ("svc2", 4)], hits)
+
+	def test_fulltext_ranking(self):
+		total, hits, truncated = self.index.search(u"tatort", fulltext=True, now=NOW)
+		self.assertEqual(3, total)
+		self.assertEqual(("svc2", 5), hits[-1])
+
+	def test_prefix_and_diacritics(self):
+		self.assertEqual([("svc1", 3)], self.index.search(u"crem brul", now=NOW)[1])
+		self.assertEqual([("svc2", 4)], self.index.search(u"Münster tat", now=NOW)[1])
+
+	def test_and(self):
+		self.assertEqual(0, self.index.search(u"tatort wetter", now=NOW)[0])
+		self.assertEqual([("svc2", 5)], self.index.search(u"tatort wetter", fulltext=True, now=NOW)[1])
+
+	def test_past_ranked_last(self):
+		self.index.setGroup("svc3", [(6, NOW + 500, 60, u"Tagesschau", u"")])
+		self.assertEqual([("svc3", 6), ("svc1", 2)], self.index.search(u"tagesschau", now=NOW)[1])
+
+	def test_pagination_and_filter(self):
+		total, hits, truncated = self.index.search(u"ta", fulltext=True, offset=1, limit=2, now=NOW)
+		self.assertEqual(4, total)
+		self.assertEqual(2, len(hits))
+		total, hits, truncated = self.index.search(u"tatort", accept=lambda key, payload, begin: key == "svc2", now=NOW)
+		self.assertEqual([("svc2", 4)], hits)
+
+	def test_replace_group(self):
+		self.index.setGroup("svc1", [(7, NOW, 60, u"Tatort", u"")])
+		self.assertEqual([("svc1", 7), ("svc2", 4)], self.index.search(u"tatort", now=NOW)[1])
+		self.index.removeGroup("svc2")
+		self.index.compact()
+		self.assertEqual([("svc1", 7)], self.index.search(u"tatort", now=NOW)[1])
+		self.assertEqual(0, self.index.getStats()["removed"])
+
+	def test_truncated(self):
+		self.assertFalse(self.index.search(u"ta", now=NOW)[2])
+		self.index.setGroup("svc3", [(100 + i, NOW, 60, u"tax%03d" % i, u"") for i in range(MAX_EXPANSIONS)])
+		# tagesschau, tatort and the tax words
+		total, hits, truncated = self.index.search(u"ta", now=NOW)
+		self.assertTrue(truncated)
+		self.assertTrue(total < MAX_EXPANSIONS + 3)
+		self.assertFalse(self.index.search(u"tax", now=NOW)[2])
+		self.assertEqual((1, [("svc3", 100)], False), self.index.search(u"tax000", now=NOW))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+"""
+Unit Test for the time format cache.
+"""
+import os
+import sys
+import time
+import unittest
+
+# hack: alter include path in such ways that timeformat library is included
+sys.path.append(os.path.join(os.path.dirname(__file__), '../plugin'))
+
+from controllers.timeformat import TimeFormatCache, resolutionOf, SECOND, MINUTE, DATE_RESOLUTION, MAX_ENTRIES
+
+
+class TestTimeFormatCache(unittest.TestCase):
+	def test_resolution(self):
+		self.assertEqual(DATE_RESOLUTION, resolutionOf("%a %-d %b"))
+		self.assertEqual(DATE_RESOLUTION, resolutionOf("%d.%m.%Y"))
+		self.assertEqual(MINUTE, resolutionOf("%R"))
+		self.assertEqual(MINUTE, resolutionOf("%H:%M"))
+		self.assertEqual(SECOND, resolutionOf("%c"))
+		self.assertEqual(SECOND, resolutionOf("%H:%M:%S"))
+
+	def test_strftime(self):
+		cache = TimeFormatCache()
+		t = int(time.time()) // 60 * 60
+		for fmt in ("%H:%M", "%d.%m.%Y", "%c"):
+			for offset in (0, 1, 59):
+				self.assertEqual(time.strftime(fmt, time.localtime(t + offset)), cache.strftime(fmt, t + offset))
+		stats = cache.getStats()
+		self.assertEqual(4, stats["hits"])
+		self.assertEqual(5, stats["misses"])
+
+	def test_day_offset(self):
+		cache = TimeFormatCache()
+		now = time.time()
+		lt = time.localtime(now)
+		noon = time.mktime((lt[0], lt[1], lt[2], 12, 0, 0, 0, 0, -1))
+		self.assertEqual(0, cache.dayOffset(now))
+		self.assertEqual(-1, cache.dayOffset(noon - 86400))
+		self.assertEqual(1, cache.dayOffset(noon + 86400))
+		self.assertEqual(7, cache.dayOffset(noon + 7 * 86400))
+
+	def test_clear(self):
+		cache = TimeFormatCache()
+		cache.strftime("%H:%M", 0)
+		cache.clear()
+		self.assertEqual(0, cache.getStats()["entries"])
+		self.assertEqual(1, cache.getStats()["invalidations"])
+
+	def test_bounded(self):
+		cache = TimeFormatCache()
+		t = int(time.time()) // 60 * 60
+		cache.strftime("%H:%M", t)
+		for offset in range(MAX_ENTRIES + 10):
+			cache.strftime("%H:%M:%S", t + offset)
+			# recently used values are kept
+			cache.strftime("%H:%M", t)
+		stats = cache.getStats()
+		self.assertEqual(MAX_ENTRIES, stats["entries"])
+		self.assertEqual(0, stats["invalidations"])
+		self.assertEqual(MAX_ENTRIES + 10, stats["hits"])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,131 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+"""
+Unit Test for the per service timer index of the EPG views.
+"""
+import unittest
+
+from enigma_stubs import isolatedModules, stubModule, stubDataVersions, Clock
+
+with isolatedModules():
+	navigation = stubModule("NavigationInstance", instance=None)
+	dataVersions = stubDataVersions()
+	from Plugins.Extensions.OpenWebif.controllers import timerindex
+	from Plugins.Extensions.OpenWebif.controllers.timerindex import ServiceTimers, TimerIndex, CHECK_INTERVAL
+
+clock = Clock()
+timerindex.time = clock
+
+
+class Timer(object):
+	def __init__(self, service_ref, begin, end):
+		self.service_ref = service_ref
+		self.begin = begin
+		self.end = end
+
+	def __repr__(self):
+		return "Timer(%s, %d, %d)" % (self.service_ref, self.begin, self.end)
+
+
+class RecordTimer(object):
+	def __init__(self):
+		self.timer_list = []
+		self.processed_timers = []
+
+
+class Navigation(object):
+	def __init__(self):
+		self.RecordTimer = RecordTimer()
+
+
+def covering(timers, begin, end):
+	# reference: first timer by begin running from begin to end
+	for timer in sorted(timers, key=lambda t: t.begin):
+		if timer.begin <= begin and timer.end >= end:
+			return timer
+	return None
+
+
+class TestServiceTimers(unittest.TestCase):
+	def setUp(self):
+		self.long = Timer("s", 100, 1000)
+		self.short = Timer("s", 200, 300)
+		self.late = Timer("s", 500, 1200)
+		self.timers = ServiceTimers([self.late, self.short, self.long])
+
+	def test_edges(self):
+		# begin and end are inclusive
+		self.assertTrue(self.timers.covering(100, 1000) is self.long)
+		self.assertTrue(self.timers.covering(99, 1000) is None)
+		self.assertTrue(self.timers.covering(500, 1200) is self.late)
+		self.assertTrue(self.timers.covering(500, 1201) is None)
+		self.assertTrue(self.timers.covering(200, 300) is self.long)
+
+	def test_running_maximum(self):
+		# the short timer begins after the long one, which still covers
+		self.assertEqual([100, 200, 500], self.timers.begins)
+		self.assertEqual([1000, 1000, 1200], self.timers.maxEnds)
+		self.assertTrue(self.timers.covering(900, 1100) is self.late)
+		self.assertTrue(self.timers.covering(50, 60) is None)
+		self.assertTrue(self.timers.covering(1300, 1400) is None)
+
+	def test_against_scan(self):
+		timers = [Timer("s", b, b + d) for b, d in ((0, 50), (10, 500), (20, 30), (40, 100), (300, 400), (310, 20), (600, 60))]
+		index = ServiceTimers(timers)
+		for begin in range(-10, 700, 7):
+			for end in range(begin, 720, 11):
+				self.assertTrue(index.covering(begin, end) is covering(timers, begin, end), (begin, end))
+
+	def test_empty(self):
+		self.assertTrue(ServiceTimers([]).covering(0, 10) is None)
+
+
+class TestTimerIndex(unittest.TestCase):
+	def setUp(self):
+		navigation.instance = Navigation()
+		self.recordTimer = navigation.instance.RecordTimer
+		self.pending = Timer("a", 100, 200)
+		self.done = Timer("a", 0, 50)
+		self.recordTimer.timer_list.append(self.pending)
+		self.recordTimer.processed_timers.append(self.done)
+		self.index = TimerIndex()
+
+	def test_processed(self):
+		self.assertTrue(self.index.covering("a", 120, 180) is self.pending)
+		self.assertTrue(self.index.covering("a", 10, 40) is None)
+		self.assertTrue(self.index.covering("a", 10, 40, processed=True) is self.done)
+		self.assertTrue(self.index.covering("b", 120, 180) is None)
+
+	def test_rebuild(self):
+		self.index.covering("a", 120, 180)
+		self.index.covering("a", 130, 170)
+		self.assertEqual(1, self.index.getStats()["builds"])
+		# added timers change the length
+		other = Timer("b", 100, 200)
+		self.recordTimer.timer_list.append(other)
+		self.assertTrue(self.index.covering("b", 120, 180) is other)
+		# edited timers bump the version
+		other.end = 150
+		self.assertTrue(self.index.covering("b", 120, 180) is other)
+		dataVersions.bump("timers")
+		self.assertTrue(self.index.covering("b", 120, 180) is None)
+		self.assertEqual(3, self.index.getStats()["builds"])
+
+	def test_throttled(self):
+		probes = []
+		get = dataVersions.get
+		dataVersions.get = lambda name, request=None: probes.append(name) or get(name, request)
+		try:
+			for i in range(100):
+				self.index.covering("a", 120, 180)
+			self.assertEqual(["timers"], probes)
+			clock.advance(CHECK_INTERVAL)
+			self.index.covering("a", 120, 180)
+			self.assertEqual(["timers", "timers"], probes)
+		finally:
+			dataVersions.get = get
+
+
+if __name__ == '__main__':
+	unittest.main()